@@ -0,0 +1,202 @@
+"""Drive Agent end to end offline and report per-stage latency.
+
+Usage:
+    python benchmarks/bench_agent.py [--provider ollama|openrouter|routed] [--stream]
+                                     [--latency 0.2] [--cloud-latency 0.5] [--repeat 5]
+                                     [--load-time 3 --preload]
+
+Commands from benchmarks/recordings.jsonl are replayed through the real
+pipeline (AgentCore, backends, parsing, schema checks, executor, memory)
+against a local mock model server, with the desktop automation replaced by
+recording stubs. Needs no microphone, model or Windows desktop, so it can run
+on a Linux CI box. Prints p50/p99 per stage and overall throughput.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import headless  # noqa: E402
+
+headless.install()
+
+from logger import logger  # noqa: E402
+from tracing import tracer  # noqa: E402
+from modules.Agent import Agent  # noqa: E402
+from modules.core import AgentCore  # noqa: E402
+from mock_llm import MockLLMServer  # noqa: E402
+
+STAGES = ("input", "inference", "parse", "validate", "execute", "memory", "command")
+
+
+def load_recordings(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class StageTimer:
+    """Collects wall-clock durations per stage from wrapped callables."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def report(self) -> str:
+        lines = [f"{'stage':<10} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}"]
+        for stage in STAGES:
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            lines.append(
+                f"{stage:<10} {len(values):>6} {percentile(values, 50) * 1000:>9.2f} "
+                f"{percentile(values, 99) * 1000:>9.2f} {sum(values) / len(values) * 1000:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+def build_agent(args, server: MockLLMServer, workdir: str) -> Agent:
+    agent = Agent(
+        local=args.provider == "ollama",
+        routing_options={"enabled": args.provider == "routed", "race_simple": not args.no_race},
+        openrouter_api="benchmark",
+        input_method="text",
+        stream=args.stream,
+        fast_path=args.fast_path,
+        backend_options={"warm_up": False},
+        cache_options={"enabled": args.cache, "path": os.path.join(workdir, "responses.json")},
+        executor_options={"smart_waits": False},
+        prompt_options={"path": os.path.join(ROOT, "systemprompt.txt")},
+        longterm_options={"path": os.path.join(workdir, "longterm.log")},
+        delay_options={"path": os.path.join(workdir, "delays.json")},
+        tracing_options={"enabled": args.trace, "jsonl_path": os.path.join(workdir, "trace.jsonl")}
+    )
+    # Point the real backend(s) at the mock server
+    for backend in (agent.backend.local, agent.backend.cloud) if args.provider == "routed" else (agent.backend,):
+        backend.base_url = server.url
+    if args.preload:
+        # Same as the agent's startup warm-up, which ran before the URL pointed here
+        agent.backend.warm_up(background=True)
+    return agent
+
+
+def run(args) -> None:
+    recordings = load_recordings(args.recordings)
+    responses = {r["command"]: r["response"] for r in recordings}
+    commands = [r["command"] for r in recordings] * args.repeat
+
+    server = MockLLMServer(responses, latency=args.latency, chunk_delay=args.chunk_delay,
+                           chunk_size=args.chunk_size, delay_scale=args.delay_scale,
+                           cloud_latency=args.cloud_latency, load_time=args.load_time)
+    timer = StageTimer()
+    headless.handler_cost = args.handler_cost
+
+    with server, tempfile.TemporaryDirectory() as workdir:
+        agent = build_agent(args, server, workdir)
+        pending = deque(commands)
+        received = deque()
+
+        def replay_input():
+            if not pending:
+                return "exit"
+            command = pending.popleft()
+            received.append(time.perf_counter())
+            return command
+
+        agent.get_input = timer.wrap("input", replay_input)
+        agent.send_to_ai = timer.wrap("inference", agent.send_to_ai)
+        agent.parse_response = timer.wrap("parse", agent.parse_response)
+        agent.check_response = timer.wrap("validate", agent.check_response)
+        agent.executor.perform_step = timer.wrap("execute", agent.executor.perform_step)
+        agent.remember = timer.wrap("memory", agent.remember)
+
+        core = AgentCore(agent, queue_size=args.queue_size)
+        execute = core._execute
+
+        def execute_plan(plan):
+            execute(plan)
+            # Commands finish in the order they were read
+            timer.record("command", time.perf_counter() - received.popleft())
+
+        core._execute = execute_plan
+
+        started = time.perf_counter()
+        asyncio.run(core.run())
+        elapsed = time.perf_counter() - started
+        router_stats = agent.backend.stats() if args.provider == "routed" else None
+        agent.backend.close()
+        if agent.longterm is not None:
+            agent.longterm.close()
+        metrics = tracer.metrics_text()
+        tracer.close()
+
+    print(f"provider={args.provider} stream={args.stream} latency={args.latency * 1000:.0f}ms "
+          f"commands={len(commands)} model calls={server.requests} unmatched={server.unmatched} "
+          f"aborted={server.aborted} model loads={server.loads}")
+    if args.provider == "routed":
+        print(f"routing: {json.dumps(router_stats)}")
+    print(timer.report())
+    print(f"throughput: {len(commands) / elapsed:.2f} commands/s over {elapsed:.2f}s "
+          f"({len(headless.calls)} tool calls)")
+    if args.trace:
+        print(metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=("ollama", "openrouter", "routed"), default="ollama")
+    parser.add_argument("--stream", action="store_true", help="Stream responses and execute steps as they arrive")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock time to first token, seconds")
+    parser.add_argument("--cloud-latency", type=float, default=None, help="Mock OpenRouter latency, if different")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Mock Ollama model load time, seconds")
+    parser.add_argument("--preload", action="store_true", help="Preload the Ollama model at startup")
+    parser.add_argument("--no-race", action="store_true", help="With --provider routed, hedge simple commands instead of racing")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="Mock delay between streamed chunks, seconds")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed chunk")
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="Factor applied to step delays")
+    parser.add_argument("--handler-cost", type=float, default=0.0, help="Seconds each stub tool call takes")
+    parser.add_argument("--repeat", type=int, default=5, help="Times the recordings are replayed")
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--fast-path", action="store_true", help="Answer simple commands locally")
+    parser.add_argument("--cache", action="store_true", help="Enable the response cache")
+    parser.add_argument("--recordings", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings.jsonl"))
+    parser.add_argument("--log", action="store_true", help="Keep debug logging on, which adds file I/O")
+    parser.add_argument("--trace", action="store_true", help="Record tracing spans and print the metrics")
+    args = parser.parse_args()
+    if not args.log:
+        logger.setLevel(logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
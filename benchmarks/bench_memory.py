@@ -0,0 +1,81 @@
+"""Replay thousands of workflows through Memory and check that it stays flat.
+
+Usage:
+    python benchmarks/bench_memory.py [--workflows 20000] [--sites 500]
+
+Prints the time per command (user message, assistant response, state summary)
+and the traced memory for each slice of the replay. Both should stay level
+however long the session runs. Tracing inflates the absolute times, so
+compare slices with each other rather than with other benchmarks.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import logger  # noqa: E402
+from modules.memory import Memory  # noqa: E402
+from modules.intents import OPEN_BRAVE, OPEN_CMD  # noqa: E402
+
+
+def make_workflows(count, sites, seed=0):
+    """Build a reproducible mix of the workflows the agent produces."""
+    rng = random.Random(seed)
+    urls = [f"https://site{i}.example.com" for i in range(sites)] + ["https://open.spotify.com/search/lofi"]
+    close_brave = OPEN_CMD + [
+        {"command": "Type", "parameters": "taskkill /IM brave.exe /F", "delay": 0.8},
+        {"command": "Shortcut", "parameters": "enter", "delay": 1.2},
+    ]
+    workflows = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.55:
+            steps = OPEN_BRAVE + [{"command": "Website", "parameters": rng.choice(urls), "delay": 3}]
+        elif roll < 0.8:
+            steps = [{"command": "Volume", "parameters": rng.randint(0, 100), "delay": 1}]
+        elif roll < 0.9:
+            steps = close_brave
+        else:
+            steps = [{"command": "Shortcut", "parameters": "ctrl+t", "delay": 1}]
+        workflows.append((f"command {rng.randint(0, 999)}", {"workflow": steps}))
+    return workflows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workflows", type=int, default=20000)
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--slices", type=int, default=5)
+    parser.add_argument("--log", action="store_true", help="Keep debug logging on, which adds file I/O per step")
+    args = parser.parse_args()
+    if not args.log:
+        logger.setLevel(logging.WARNING)
+
+    workflows = make_workflows(args.workflows, args.sites)
+    memory = Memory()
+    size = max(1, len(workflows) // args.slices)
+
+    tracemalloc.start()
+    print(f"{'commands':>10} {'us/command':>12} {'traced KiB':>12} {'history':>8} {'tabs':>6}")
+    for start in range(0, len(workflows), size):
+        began = time.perf_counter()
+        for command, response in workflows[start:start + size]:
+            memory.add_user_message(command)
+            memory.get_state_summary()
+            memory.add_assistant_response(response)
+        elapsed = time.perf_counter() - began
+        current, _ = tracemalloc.get_traced_memory()
+        done = min(start + size, len(workflows))
+        per_command = elapsed / (done - start) * 1e6
+        print(f"{done:>10} {per_command:>12.1f} {current / 1024:>12.1f} "
+              f"{len(memory.conversation_history):>8} {len(memory.system_state.open_tabs):>6}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure cold start: importing the agent, constructing it, and first use of each tool.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5]
+
+Every run is a fresh interpreter, so nothing is cached between them. Tools
+whose dependencies cannot load here (pycaw off Windows, pyautogui without a
+display) are reported as unavailable instead of failing the run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, logging, os, sys, tempfile, time
+started = time.perf_counter()
+from logger import logger
+logger.setLevel(logging.WARNING)
+from modules.Agent import Agent
+imported = time.perf_counter()
+with tempfile.TemporaryDirectory() as workdir:
+    agent = Agent(
+        local=True,
+        input_method="text",
+        backend_options={"warm_up": False},
+        cache_options={"path": os.path.join(workdir, "responses.json")},
+        longterm_options={"path": os.path.join(workdir, "longterm.log")},
+        delay_options={"path": os.path.join(workdir, "delays.json")},
+        tracing_options={"jsonl_path": None},
+    )
+    constructed = time.perf_counter()
+    tools = {}
+    for command in agent.command_handlers:
+        began = time.perf_counter()
+        try:
+            agent.command_handlers[command]
+            tools[command] = time.perf_counter() - began
+        except Exception as e:
+            tools[command] = None
+    agent.longterm.close()
+print(json.dumps({"import": imported - started, "construct": constructed - imported, "tools": tools}))
+"""
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    for key in ("import", "construct"):
+        values = sorted(r[key] for r in runs)
+        print(f"{key:<12} median {values[len(values) // 2] * 1000:8.1f} ms   max {values[-1] * 1000:8.1f} ms")
+    # Only the first lookup in a process pays the module import; later tools share it
+    for command in runs[0]["tools"]:
+        values = sorted(r["tools"][command] for r in runs if r["tools"][command] is not None)
+        if not values:
+            print(f"tool {command:<8} unavailable here")
+            continue
+        print(f"tool {command:<8} median {values[len(values) // 2] * 1000:8.1f} ms   (first use)")
+
+
+if __name__ == "__main__":
+    main()
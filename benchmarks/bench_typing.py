@@ -0,0 +1,114 @@
+"""Compare the keyboard modes for typing text and URLs against a stubbed input sink.
+
+Usage:
+    python benchmarks/bench_typing.py [--event-cost 0.0005] [--call-cost 0.002]
+
+The sink records every keystroke instead of sending it, and models the cost
+of real injection: a fixed cost per call into the OS plus a cost per key
+event. chars mode also pays its real sleep between keys. Prints the time per
+text length for each mode, and checks every mode delivered the exact text.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import logger  # noqa: E402
+from modules.injector import KeyInjector, MODES  # noqa: E402
+
+SAMPLES = [
+    "cmd",
+    "brave",
+    "https://www.youtube.com",
+    "https://open.spotify.com/search/lofi%20hip%20hop",
+    "taskkill /IM brave.exe /F",
+    "Dear team, the quarterly numbers are attached. Let me know if anything looks off before Friday.",
+]
+
+
+class StubSink:
+    """Input sink that only records what would have been typed."""
+
+    name = "stub"
+
+    def __init__(self, event_cost: float, call_cost: float, fail=()):
+        """
+        Args:
+            event_cost: Seconds per key down/up pair
+            call_cost: Seconds per call into the OS input API
+            fail: Modes that raise, to exercise the fallback
+        """
+        self.event_cost = event_cost
+        self.call_cost = call_cost
+        self.fail = set(fail)
+        self.typed = []
+        self.calls = 0
+
+    def _call(self, mode: str, events: int):
+        if mode in self.fail:
+            raise OSError(f"{mode} unavailable")
+        self.calls += 1
+        time.sleep(self.call_cost + events * self.event_cost)
+
+    def write(self, text: str, interval: float):
+        for char in text:
+            self._call("chars", 1)
+            self.typed.append(char)
+            time.sleep(interval)
+
+    def send_batch(self, text: str):
+        self._call("batch", len(text))
+        self.typed.append(text)
+
+    def paste(self, text: str, settle: float, restore: bool):
+        # ctrl+v is two key events, however long the text is
+        self._call("paste", 2)
+        self.typed.append(text)
+        if restore:
+            time.sleep(settle)
+
+
+def time_mode(injector: KeyInjector, sink: StubSink, text: str, mode: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        sink.typed.clear()
+        started = time.perf_counter()
+        injector.type(text, mode)
+        best = min(best, time.perf_counter() - started)
+        if "".join(sink.typed) != text:
+            raise AssertionError(f"{mode} delivered {''.join(sink.typed)!r} instead of {text!r}")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--event-cost", type=float, default=0.0005, help="Seconds per simulated key event")
+    parser.add_argument("--call-cost", type=float, default=0.002, help="Seconds per simulated OS call")
+    parser.add_argument("--char-interval", type=float, default=0.05, help="Pause between keys in chars mode")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--log", action="store_true", help="Keep debug logging on")
+    args = parser.parse_args()
+    if not args.log:
+        logger.setLevel(logging.WARNING)
+
+    sink = StubSink(args.event_cost, args.call_cost)
+    injector = KeyInjector(sink=sink, char_interval=args.char_interval)
+    header = f"{'len':>5}  " + "  ".join(f"{mode:>9}" for mode in MODES + ("auto",)) + "  text"
+    print(header)
+    for text in SAMPLES:
+        times = [time_mode(injector, sink, text, mode, args.repeat) for mode in MODES]
+        times.append(time_mode(injector, sink, text, None, args.repeat))
+        cells = "  ".join(f"{t * 1000:>6.1f} ms" for t in times)
+        print(f"{len(text):>5}  {cells}  {text[:40]}")
+
+    # Paste and batch both unavailable: the text still arrives, key by key
+    fallback = KeyInjector(sink=StubSink(0, 0, fail=("paste", "batch")), char_interval=0)
+    assert fallback.type(SAMPLES[2], "paste") == "chars"
+    print("fallback to chars: ok")
+
+
+if __name__ == "__main__":
+    main()
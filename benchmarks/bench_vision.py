@@ -0,0 +1,105 @@
+"""Time the play button template search on a synthetic screen.
+
+Usage:
+    python benchmarks/bench_vision.py [--width 1920 --height 1080] [--scale 1.25] [--repeat 20]
+
+Pastes imgrec/ref1.png, resized to --scale as on a display with that DPI
+setting, onto a noisy full-size screen. Prints the time per poll and the
+template matches each poll runs, for the first poll (every template at every
+scale), a poll near the last hit, a poll after the button moved, and polls
+while the button is not on screen, before and after the scale is known.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless  # noqa: E402
+
+headless.install()
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from logger import logger  # noqa: E402
+from modules.vision import TemplateMatcher  # noqa: E402
+
+IMGREC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgrec")
+REFERENCES = [os.path.join(IMGREC_DIR, f"ref{i}.png") for i in range(1, 5)]
+
+
+def make_screen(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """A grayscale screen of flat panels with some noise, roughly like an app window."""
+    rng = np.random.default_rng(seed)
+    screen = np.full((height, width), 24, dtype=np.uint8)
+    for _ in range(40):
+        x, y = int(rng.integers(0, width - 50)), int(rng.integers(0, height - 50))
+        w, h = int(rng.integers(40, 400)), int(rng.integers(20, 200))
+        screen[y:y + h, x:x + w] = int(rng.integers(0, 255))
+    noise = rng.integers(0, 12, size=screen.shape, dtype=np.uint8)
+    return cv2.add(screen, noise)
+
+
+def place(screen: np.ndarray, button: np.ndarray, x: int, y: int) -> np.ndarray:
+    frame = screen.copy()
+    h, w = button.shape[:2]
+    frame[y:y + h, x:x + w] = button
+    return frame
+
+
+def poll(matcher: TemplateMatcher, frame: np.ndarray, repeat: int):
+    """Median milliseconds and template matches per poll."""
+    times = []
+    before = matcher.matches
+    for _ in range(repeat):
+        started = time.perf_counter()
+        matcher.locate(frame)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), (matcher.matches - before) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--scale", type=float, default=1.25, help="Display scale the button is rendered at")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--log", action="store_true", help="Keep debug logging on")
+    args = parser.parse_args()
+    if not args.log:
+        logger.setLevel(logging.WARNING)
+
+    reference = cv2.imread(REFERENCES[0], cv2.IMREAD_GRAYSCALE)
+    if reference is None:
+        sys.exit(f"Could not read {REFERENCES[0]}")
+    button = cv2.resize(reference, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_LINEAR)
+    screen = make_screen(args.width, args.height)
+    here = place(screen, button, args.width // 3, args.height // 2)
+    moved = place(screen, button, args.width - 2 * button.shape[1], 40)
+
+    # locate() expects an RGB screenshot
+    as_rgb = lambda gray: cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)  # noqa: E731
+    here, moved, empty = as_rgb(here), as_rgb(moved), as_rgb(screen)
+
+    rows = []
+    cold = TemplateMatcher(REFERENCES)
+    rows.append(("absent, scale unknown", *poll(cold, empty, args.repeat)))
+    rows.append(("first hit", *poll(cold, here, 1)))
+    rows.append(("hit near last match", *poll(cold, here, args.repeat)))
+    rows.append(("hit after the button moved", *poll(cold, moved, 1)))
+    rows.append(("absent, scale known", *poll(cold, empty, args.repeat)))
+    if cold.scale is None:
+        sys.exit("The button was never found")
+
+    print(f"screen {args.width}x{args.height}, button at scale {args.scale} "
+          f"(locked to {cold.scale}), {len(cold.templates)} templates")
+    print(f"{'poll':<28} {'ms':>8} {'matches':>8}")
+    for name, ms, matches in rows:
+        print(f"{name:<28} {ms:>8.2f} {matches:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Headless stand-ins for the desktop automation the agent normally drives.
+
+install() must run before modules.Agent is imported. It replaces
+modules.tools with handlers that only record their calls, and provides a
+minimal pyautogui when the real one cannot load (no display on a CI box).
+"""
+import sys
+import time
+import types
+from typing import Any, List, Tuple
+
+# (command, parameters) for every handler call, in order
+calls: List[Tuple[str, Any]] = []
+
+# Seconds each stub handler takes, to model the cost of real automation
+handler_cost = 0.0
+
+
+def _handler(name: str):
+    def handler(parameters):
+        calls.append((name, parameters))
+        if handler_cost:
+            time.sleep(handler_cost)
+    handler.__name__ = name
+    return handler
+
+
+class _BlankScreenshot:
+    """Just enough of a PIL image for the executor's thumbnail grabs."""
+
+    def __init__(self, size=(64, 36)):
+        self.size = size
+
+    def convert(self, mode):
+        return self
+
+    def resize(self, size):
+        return _BlankScreenshot(size)
+
+    def tobytes(self):
+        return bytes(self.size[0] * self.size[1])
+
+
+def _headless_pyautogui() -> types.ModuleType:
+    module = types.ModuleType("pyautogui")
+    module.screenshot = lambda *args, **kwargs: _BlankScreenshot()
+    module.getActiveWindowTitle = lambda: ""
+    for name in ("write", "press", "hotkey", "moveTo", "mouseDown", "mouseUp", "click"):
+        setattr(module, name, lambda *args, **kwargs: None)
+    return module
+
+
+def install():
+    """Register the stubs in sys.modules."""
+    try:
+        import pyautogui  # noqa: F401
+    except Exception:
+        # pyautogui needs a display; without one the stub keeps executor/vision importable
+        sys.modules["pyautogui"] = _headless_pyautogui()
+
+    tools = types.ModuleType("modules.tools")
+    tools.volume_control = _handler("Volume")
+    tools.type_text = _handler("Type")
+    tools.shortcut = _handler("Shortcut")
+    tools.play = _handler("Play")
+    tools.Website = _handler("Website")
+    tools.__all__ = ["volume_control", "type_text", "shortcut", "play", "Website"]
+    sys.modules["modules.tools"] = tools
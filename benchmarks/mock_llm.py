@@ -0,0 +1,257 @@
+"""Local stand-in for the Ollama and OpenRouter chat APIs.
+
+Answers chat requests with canned responses looked up by the user command in
+the prompt, after a configurable latency. Both providers' streaming formats
+are supported (Ollama NDJSON, OpenRouter server-sent events), so the agent's
+backends can be exercised unchanged by pointing their base_url here.
+
+The Ollama side also models residency: a model that is not loaded, or is
+asked for a different num_ctx, pays load_time first. Models unload when
+their keep_alive runs out. Responses carry Ollama's duration fields.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from modules.cache import normalize_command
+
+COMMAND_LINE = re.compile(r"User command: (.*)\s*$")
+
+FALLBACK_RESPONSE = {"command": "Error", "parameters": "Unknown command"}
+
+
+class MockLLMServer:
+    """Threaded HTTP server speaking enough of both provider APIs for the agent."""
+
+    def __init__(self, responses: Dict[str, Any], latency: float = 0.2, chunk_delay: float = 0.01,
+                 chunk_size: int = 16, delay_scale: float = 0.0, cloud_latency: Optional[float] = None,
+                 load_time: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            responses: Command text -> response object, matched after normalize_command
+            latency: Seconds before the first byte of a response (time to first token)
+            chunk_delay: Seconds between streamed chunks
+            chunk_size: Characters per streamed chunk
+            delay_scale: Factor applied to step delays in canned workflows; 0 makes execution instant
+            cloud_latency: Latency of the OpenRouter endpoint, if it should differ from Ollama's
+            load_time: Seconds Ollama takes to load a model into memory
+            host: Interface to bind
+            port: Port to bind; 0 picks a free one
+        """
+        self.responses = {normalize_command(k): v for k, v in responses.items()}
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.delay_scale = delay_scale
+        self.cloud_latency = latency if cloud_latency is None else cloud_latency
+        self.requests = 0
+        self.unmatched = 0
+        # Streams the client hung up on before the end, e.g. a cancelled hedge
+        self.aborted = 0
+        self.load_time = load_time
+        # Ollama model -> (num_ctx, monotonic time it unloads or None for never)
+        self.loaded: Dict[str, Tuple[Optional[int], Optional[float]]] = {}
+        self.loads = 0
+        # Held while a model loads, so requests arriving meanwhile wait for it like Ollama's scheduler
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def answer(self, payload: Dict[str, Any]) -> str:
+        """Return the response text for a chat payload."""
+        messages = payload.get("messages") or [{}]
+        found = COMMAND_LINE.search(messages[-1].get("content", ""))
+        key = normalize_command(found.group(1)) if found else ""
+        with self._lock:
+            self.requests += 1
+            response = self.responses.get(key)
+            if response is None:
+                self.unmatched += 1
+                response = FALLBACK_RESPONSE
+        if isinstance(response, dict) and isinstance(response.get("workflow"), list):
+            response = {"workflow": [
+                dict(step, delay=step.get("delay", 0) * self.delay_scale) if isinstance(step, dict) else step
+                for step in response["workflow"]
+            ]}
+        return json.dumps(response)
+
+    @staticmethod
+    def keep_alive_seconds(value) -> Optional[float]:
+        """Seconds a model stays loaded for an Ollama keep_alive value; None means forever."""
+        if value is None:
+            return 300.0
+        if isinstance(value, str):
+            units = {"s": 1, "m": 60, "h": 3600}
+            if value[-1:] in units:
+                return float(value[:-1]) * units[value[-1]]
+            value = float(value)
+        return None if value < 0 else float(value)
+
+    def residency(self, payload: Dict[str, Any]) -> float:
+        """Load the payload's model if needed and return the seconds spent loading."""
+        model = payload.get("model")
+        num_ctx = (payload.get("options") or {}).get("num_ctx")
+        keep_alive = self.keep_alive_seconds(payload.get("keep_alive"))
+        with self._load_lock:
+            with self._lock:
+                current = self.loaded.get(model)
+                resident = current is not None and (current[1] is None or current[1] > time.monotonic())
+                # A request without num_ctx runs with whatever context is loaded
+                reload = not resident or (num_ctx is not None and current[0] != num_ctx)
+                if reload:
+                    self.loads += 1
+                else:
+                    num_ctx = num_ctx or current[0]
+            if reload:
+                time.sleep(self.load_time)
+        with self._lock:
+            if keep_alive == 0:
+                self.loaded.pop(model, None)
+            else:
+                expires = None if keep_alive is None else time.monotonic() + keep_alive
+                self.loaded[model] = (num_ctx, expires)
+        return self.load_time if reload else 0.0
+
+    @staticmethod
+    def usage(payload: Dict[str, Any], text: str) -> Dict[str, int]:
+        """Rough token counts, about four characters per token."""
+        prompt = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        return {"prompt_tokens": prompt // 4, "completion_tokens": len(text) // 4}
+
+    def chunks(self, text: str) -> Iterator[str]:
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, body: Dict[str, Any], status: int = 200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_chunked(self, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": []})
+                else:
+                    self._send_json({"data": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/chat" and not payload.get("messages"):
+                    self._ollama_load(payload)
+                    return
+                load = server.residency(payload) if self.path == "/api/chat" else 0.0
+                text = server.answer(payload)
+                time.sleep(server.cloud_latency if self.path == "/chat/completions" else server.latency)
+                try:
+                    if self.path == "/api/chat":
+                        self._ollama(payload, text, load)
+                    elif self.path == "/chat/completions":
+                        self._openrouter(payload, text)
+                    else:
+                        self._send_json({"error": "not found"}, 404)
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._lock:
+                        server.aborted += 1
+                    self.close_connection = True
+
+            def _ollama_load(self, payload):
+                # No messages: only load (or with keep_alive 0, unload) the model
+                if server.keep_alive_seconds(payload.get("keep_alive")) == 0:
+                    with server._lock:
+                        server.loaded.pop(payload.get("model"), None)
+                    self._send_json({"model": payload.get("model"), "done": True, "done_reason": "unload"})
+                    return
+                load = server.residency(payload)
+                nanos = int(load * 1e9)
+                self._send_json({"model": payload.get("model"), "done": True, "done_reason": "load",
+                                 "total_duration": nanos, "load_duration": nanos})
+
+            def _ollama(self, payload, text, load):
+                usage = server.usage(payload, text)
+                pieces = list(server.chunks(text)) if payload.get("stream") else [text]
+                eval_seconds = max(len(pieces) * server.chunk_delay, 0.001)
+                counts = {
+                    "prompt_eval_count": usage["prompt_tokens"],
+                    "eval_count": usage["completion_tokens"],
+                    "load_duration": int(load * 1e9),
+                    "prompt_eval_duration": int(server.latency * 1e9),
+                    "eval_duration": int(eval_seconds * 1e9),
+                    "total_duration": int((load + server.latency + eval_seconds) * 1e9)
+                }
+                if not payload.get("stream"):
+                    self._send_json(dict(counts, model=payload.get("model"), message={"role": "assistant", "content": text}, done=True))
+                    return
+                self._start_chunked("application/x-ndjson")
+                for piece in pieces:
+                    self._write_chunk(json.dumps({"message": {"content": piece}, "done": False}).encode() + b"\n")
+                    time.sleep(server.chunk_delay)
+                self._write_chunk(json.dumps(dict(counts, message={"content": ""}, done=True)).encode() + b"\n")
+                self._write_chunk(b"")
+
+            def _openrouter(self, payload, text):
+                usage = server.usage(payload, text)
+                if not payload.get("stream"):
+                    self._send_json({"choices": [{"message": {"role": "assistant", "content": text}}], "usage": usage})
+                    return
+                self._start_chunked("text/event-stream")
+                for piece in server.chunks(text):
+                    event = {"choices": [{"delta": {"content": piece}}]}
+                    self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                    time.sleep(server.chunk_delay)
+                self._write_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+        return Handler
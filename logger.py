@@ -1,23 +1,213 @@
+import atexit
+import gzip
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 import os
+import queue
+import threading
+import time
 
-def setup_logger():
-    os.makedirs("logs", exist_ok=True)
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+# Loggers whose records share the queue but are written to their own files, not the log file
+RAW_LOGGER = "ai_agent.raw"
+TRACE_LOGGER = "ai_agent.trace"
+SIDE_CHANNELS = (RAW_LOGGER, TRACE_LOGGER)
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """Queue handler that caps message size before the record crosses threads."""
+
+    def __init__(self, log_queue, max_message_chars: int = 2000):
+        super().__init__(log_queue)
+        self.max_message_chars = max_message_chars
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        limit = self.max_message_chars
+        if limit and len(record.msg) > limit:
+            record.msg = f"{record.msg[:limit]}... [{len(record.msg) - limit} chars truncated]"
+            record.message = record.msg
+        return record
+
+
+class GzipLineHandler(logging.Handler):
+    """Appends each record's message as one line of a gzip file."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.stream = gzip.open(path, "at", encoding="utf-8")
+
+    def emit(self, record):
+        try:
+            self.stream.write(record.getMessage() + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            super().close()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats the list of objects in one of a record's attributes as JSON lines, e.g. a batch of trace spans."""
+
+    def __init__(self, field: str):
+        super().__init__()
+        self.field = field
+
+    def format(self, record):
+        return "\n".join(json.dumps(item, default=str) for item in getattr(record, self.field))
+
+
+class _LogWriter:
+    """Owns the queue listener that does all log file I/O on a background thread."""
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.listener = None
+        self.lock = threading.Lock()
+        # The log file and raw archive, replaced by setup_logger
+        self.handlers = []
+        # Other outputs sharing the listener, such as the trace file
+        self.outputs = []
+
+    def start(self, *handlers):
+        with self.lock:
+            self._stop()
+            for handler in self.handlers:
+                handler.close()
+            self.handlers = list(handlers)
+            self._listen()
+
+    def add_output(self, handler: logging.Handler):
+        with self.lock:
+            self._stop()
+            self.outputs.append(handler)
+            self._listen()
+
+    def remove_output(self, handler: logging.Handler):
+        with self.lock:
+            # Stopping first writes out everything queued for the output
+            self._stop()
+            if handler in self.outputs:
+                self.outputs.remove(handler)
+            handler.close()
+            self._listen()
+
+    def _listen(self):
+        self.listener = QueueListener(self.queue, *self.handlers, *self.outputs, respect_handler_level=True)
+        self.listener.start()
+
+    def _stop(self):
+        if self.listener is not None:
+            # Drains the queue before returning, so nothing logged so far is lost
+            self.listener.stop()
+            self.listener = None
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+            for handler in self.handlers + self.outputs:
+                handler.close()
+            self.handlers = []
+            self.outputs = []
+
+
+_writer = _LogWriter()
+atexit.register(_writer.stop)
+
+
+def setup_logger(level="DEBUG", path: str = "logs/log.txt", backup_count: int = 7,
+                 max_message_chars: int = 2000, raw_archive: str = None):
+    """Configure the ai_agent logger; callers only enqueue records, a listener thread writes them.
+
+    Args:
+        level: Level name or number for the log file
+        path: Log file, rotated at midnight
+        backup_count: Rotated files kept
+        max_message_chars: Longer messages are cut to this length; 0 keeps them whole
+        raw_archive: Optional gzip file receiving full raw model responses, one JSON line each
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
     logger = logging.getLogger("ai_agent")
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level if isinstance(level, int) else str(level).upper())
+    logger.propagate = False
 
     handler = TimedRotatingFileHandler(
-        "logs/log.txt", when="midnight", interval=1, backupCount=7, encoding="utf-8"
+        path, when="midnight", interval=1, backupCount=backup_count, encoding="utf-8"
     )
     handler.suffix = "%Y-%m-%d"
-    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+    formatter = logging.Formatter(LOG_FORMAT)
     handler.setFormatter(formatter)
 
-    if not logger.handlers:  # avoid duplicate handlers on reload
-        logger.addHandler(handler)
+    raw_logger = logging.getLogger(RAW_LOGGER)
+    raw_logger.propagate = False
+    for old in logger.handlers + raw_logger.handlers:
+        old.close()
+    logger.handlers = [TruncatingQueueHandler(_writer.queue, max_message_chars)]
+    raw_logger.handlers = []
+    raw_logger.disabled = not raw_archive
+
+    handler.addFilter(lambda record: record.name not in SIDE_CHANNELS)
+    handlers = [handler]
+    if raw_archive:
+        archive = GzipLineHandler(raw_archive)
+        archive.addFilter(lambda record: record.name == RAW_LOGGER)
+        raw_logger.setLevel(logging.INFO)
+        raw_logger.handlers = [QueueHandler(_writer.queue)]
+        handlers.append(archive)
+    _writer.start(*handlers)
 
     return logger
 
+
+def add_json_lines_output(path: str, name: str, field: str) -> logging.Handler:
+    """Append the items listed in the `field` attribute of name's queued records to a JSON-lines file.
+
+    The file is written by the listener thread; pass the returned handler to
+    remove_output() to flush and close it.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(JsonLinesFormatter(field))
+    handler.addFilter(lambda record: record.name == name)
+    _writer.add_output(handler)
+    return handler
+
+
+def remove_output(handler: logging.Handler):
+    _writer.remove_output(handler)
+
+
+def enqueue(name: str, **fields):
+    """Put a record carrying fields on the log queue, for an output added with add_json_lines_output()."""
+    record = logging.makeLogRecord(dict(fields, name=name, levelno=logging.INFO, levelname="INFO"))
+    _writer.queue.put_nowait(record)
+
+
+def archive_raw(kind: str, text: str, **fields):
+    """Store a full raw payload in the compressed archive, if one is configured."""
+    if raw_logger.disabled:
+        return
+    record = dict(fields, time=time.time(), kind=kind, text=text)
+    raw_logger.info("%s", json.dumps(record))
+
+
 # Expose a global logger instance
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
+raw_logger = logging.getLogger(RAW_LOGGER)
@@ -1,17 +1,8 @@
-import requests
+import argparse
 import dotenv
 import os
-import speech_recognition as sr
 import json
-import time
-import webbrowser
-import pyautogui
-import subprocess
-import glob
-from pathlib import Path
-import re
-from logger import logger
-from modules.tools import *
+from logger import logger, setup_logger
 from modules.Agent import Agent
 
 # Load environment variables
@@ -19,6 +10,14 @@ dotenv.load_dotenv()
 OPENROUTER_API = os.getenv("OPENROUTER_API_KEY")
 
 def main():
+    parser = argparse.ArgumentParser(description="AI computer control agent")
+    parser.add_argument("--warm", action="store_true",
+                        help="Load every tool (audio device, OCR, templates) in the background at startup")
+    parser.add_argument("--serve", action="store_true",
+                        help="Serve commands from several clients over HTTP instead of reading input")
+    parser.add_argument("--port", type=int, default=None, help="Port for --serve (overrides config)")
+    args = parser.parse_args()
+
     # Load config
     config = {}
     try:
@@ -28,25 +27,52 @@ def main():
         print("config.json not found, using defaults")
         logger.warning("config.json not found, using defaults")
     except Exception as e:
-        logger.error(f"Error reading config.json: {e}")
+        logger.error("Error reading config.json: %s", e)
+
+    # Log level, size caps and the raw response archive
+    setup_logger(**config.get("logging", {}))
 
     # Resolve settings with defaults
     use_local = bool(config.get("use_local_model", True))
     input_method = config.get("input_method", "text")
+    if args.serve:
+        # Commands arrive over HTTP; the microphone is not opened
+        input_method = "text"
     local_model_name = config.get("local_model_name", "gemma3:latest")
     cloud_model_name = config.get("cloud_model_name", "mistralai/mixtral-8x7b-instruct")
     http_referer = config.get("http_referer", "https://nesarpy.github.io/")
+    stream_responses = bool(config.get("stream_responses", False))
+    fast_path = bool(config.get("fast_path", True))
+    structured_output = bool(config.get("structured_output", True))
+    repair_with_model = bool(config.get("repair_with_model", True))
+    backend_options = config.get("backend", {})
+    cache_options = config.get("cache", {})
+    executor_options = config.get("executor", {})
+    voice_options = config.get("voice", {})
+    stt_options = config.get("stt", {})
+    core_options = config.get("pipeline", {})
+    prompt_options = config.get("prompt", {})
+    prefetch_options = config.get("prefetch", {})
+    longterm_options = config.get("longterm", {})
+    tracing_options = config.get("tracing", {})
+    routing_options = config.get("routing", {})
+    keyboard_options = config.get("keyboard", {})
+    delay_options = config.get("delays", {})
+    ollama_options = config.get("ollama", {})
 
     # Announce mode
-    if use_local:
+    if routing_options.get("enabled"):
+        print(f"Routing between local model {local_model_name} and OpenRouter")
+        logger.info("Routing between local model %s and OpenRouter model %s", local_model_name, cloud_model_name)
+    elif use_local:
         print(f"Using local model: {local_model_name}")
-        logger.info(f"Using local model: {local_model_name}")
+        logger.info("Using local model: %s", local_model_name)
     else:
         print("Using OpenRouter API")
         logger.info("Using OpenRouter API")
 
     print(f"Using {input_method} input method")
-    logger.info(f"Input method: {input_method}")
+    logger.info("Input method: %s", input_method)
 
     agent = Agent(
         local=use_local,
@@ -54,8 +80,40 @@ def main():
         input_method=input_method,
         local_model_name=local_model_name,
         cloud_model_name=cloud_model_name,
-        http_referer=http_referer
+        http_referer=http_referer,
+        stream=stream_responses,
+        fast_path=fast_path,
+        structured_output=structured_output,
+        repair_with_model=repair_with_model,
+        backend_options=backend_options,
+        cache_options=cache_options,
+        executor_options=executor_options,
+        voice_options=voice_options,
+        stt_options=stt_options,
+        core_options=core_options,
+        prompt_options=prompt_options,
+        prefetch_options=prefetch_options,
+        longterm_options=longterm_options,
+        tracing_options=tracing_options,
+        routing_options=routing_options,
+        keyboard_options=keyboard_options,
+        delay_options=delay_options,
+        ollama_options=ollama_options
     )
+    if args.warm:
+        agent.command_handlers.preload(background=True)
+    if args.serve:
+        from modules.server import AgentServer
+        server_options = dict(config.get("server", {}))
+        if args.port is not None:
+            server_options["port"] = args.port
+        try:
+            AgentServer(agent, **server_options).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            agent.close()
+        return
     agent.run()
 
 if __name__ == "__main__":
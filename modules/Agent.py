@@ -1,43 +1,140 @@
 import requests
 import speech_recognition as sr
 import json
-import time
-import os
-from logger import logger
-from modules.tools import *
+from logger import logger, archive_raw
+from tracing import tracer
+from modules.registry import ToolRegistry
 from modules.memory import Memory
+from modules.streaming import WorkflowStreamParser
+from modules.backends import create_backend, OllamaBackend
+from modules.router import ModelRouter
+from modules.injector import injector
+from modules.cache import ResponseCache, is_replayable, normalize_command
+from modules.executor import WorkflowExecutor
+from modules.delays import DelayModel
+from modules.voice import VoicePipeline
+from modules.stt import create_engine
+from modules.core import AgentCore
+from modules.intents import IntentMatcher
+from modules.prompt import PromptBuilder, estimate_tokens
+from modules.schema import load_workflow_schema, provider_schema, compile_schema, repair_step, repair_workflow
+from modules.prefetch import CommandPredictor, Prefetcher
+from modules.longterm import LongTermStore
+import asyncio
+import copy
+import logging
 import re
 
 class Agent:
-    def __init__(self, local=False, openrouter_api=None, input_method="voice", local_model_name="gemma3:latest", cloud_model_name="mistralai/mixtral-8x7b-instruct", http_referer="https://nesarpy.github.io/"):
+    def __init__(self, local=False, openrouter_api=None, input_method="voice", local_model_name="gemma3:latest", cloud_model_name="mistralai/mixtral-8x7b-instruct", http_referer="https://nesarpy.github.io/", stream=False, backend_options=None, cache_options=None, executor_options=None, voice_options=None, stt_options=None, core_options=None, fast_path=True, prompt_options=None, structured_output=True, repair_with_model=True, prefetch_options=None, longterm_options=None, tracing_options=None, routing_options=None, keyboard_options=None, delay_options=None, ollama_options=None):
+        # Spans and counters for every stage; cheap no-ops while disabled
+        tracer.configure(**(tracing_options or {}))
+        # How Type and Website deliver text: pasted, batched or key by key
+        injector.configure(**(keyboard_options or {}))
         self.local = local
+        self.stream = stream
         self.openrouter_api = openrouter_api
         self.input_method = input_method
         self.local_model_name = local_model_name
         self.cloud_model_name = cloud_model_name
         self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+        self.microphone = None
+        self.voice_pipeline = None
+        self.stt = None
+        if self.input_method == "voice":
+            self.microphone = sr.Microphone()
+            self.stt = create_engine(self.recognizer, on_partial=self._show_partial, **(stt_options or {}))
+            voice_options = dict(voice_options or {})
+            if voice_options.pop("continuous", True):
+                # Listens in the background so commands can be queued while a workflow runs
+                self.voice_pipeline = VoicePipeline(self.recognizer, self.microphone, engine=self.stt, **voice_options)
         self.memory = Memory()  # Initialize session memory
-        if self.local:
-            self.headers = {
-                "Content-Type": "application/json"
-            }
+        # Every past command, retrievable by keyword across sessions
+        longterm_options = dict(longterm_options or {})
+        self.longterm = LongTermStore(**longterm_options) if longterm_options.pop("enabled", True) else None
+        self.core_options = core_options or {}
+        self.prompt_builder = PromptBuilder(**(prompt_options or {}))
+        # Persistent, pooled HTTP session for the configured provider
+        backend_options = dict(backend_options or {})
+        warm_up = backend_options.pop("warm_up", True)
+        routing_options = dict(routing_options or {})
+        if routing_options.pop("enabled", False):
+            # Both providers, chosen per command and hedged against each other
+            self.backend = ModelRouter(
+                create_backend(True, local_model_name, cloud_model_name, local_options=ollama_options, **backend_options),
+                create_backend(False, local_model_name, cloud_model_name, openrouter_api=openrouter_api,
+                               http_referer=http_referer, **backend_options),
+                accept=self._acceptable,
+                **routing_options
+            )
         else:
-            self.headers = {
-                "Authorization": f"Bearer {self.openrouter_api}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": http_referer,
-                "X-Title": "AI Computer Agent"
-            }
+            self.backend = create_backend(
+                local,
+                local_model_name,
+                cloud_model_name,
+                openrouter_api=openrouter_api,
+                http_referer=http_referer,
+                local_options=ollama_options,
+                **backend_options
+            )
+        local_backend = getattr(self.backend, "local", self.backend)
+        if isinstance(local_backend, OllamaBackend):
+            # Size the context for a full prompt now, so the model preloaded below is not reloaded
+            # with a bigger num_ctx as soon as the history fills up
+            local_backend.reserve_context(
+                estimate_tokens(self.prompt_builder.system_prompt()) + self.prompt_builder.history_token_budget + 256
+            )
+        if warm_up:
+            self.backend.warm_up()
         
-        # Command mappings - simplified set for workflow execution
-        self.command_handlers = {
-            "Volume": volume_control,
-            "Type": type_text,
-            "Shortcut": shortcut,
-            "Play": play,
-            "Website": Website
-        }
+        # Command mappings - simplified set for workflow execution; each tool is imported on first use
+        self.command_handlers = ToolRegistry()
+        # Step delays learned from how long steps really took, shared by every session
+        delay_options = dict(delay_options or {})
+        self.delay_model = DelayModel(**delay_options) if delay_options.pop("enabled", True) else None
+        self.executor_options = dict(executor_options or {}, delay_model=self.delay_model)
+        self.executor = WorkflowExecutor(self.command_handlers, **self.executor_options)
+        # Shared by sessions in server mode so identical model requests run once
+        self.inflight = None
+
+        # Workflow schema from the system prompt, compiled once and sent to the provider
+        self.repair_with_model = repair_with_model
+        self.validate_workflow = None
+        self.validate_step = None
+        schema = load_workflow_schema(self.prompt_builder.system_prompt()) if structured_output else None
+        if schema is not None:
+            self.validate_workflow = compile_schema(schema)
+            self.validate_step = compile_schema(schema["properties"]["workflow"]["items"], "$.workflow[]")
+            self.backend.response_schema = provider_schema(schema)
+
+        # Deterministic commands are answered locally without a model round-trip
+        self.intents = IntentMatcher(self.command_handlers) if fast_path else None
+
+        # On-disk cache of model responses for repeated commands
+        cache_options = dict(cache_options or {})
+        self.cache = None
+        if cache_options.pop("enabled", True):
+            self.cache = ResponseCache(
+                validator=self.is_valid_response,
+                **cache_options
+            )
+
+        # Plans the likely next command while the current workflow executes
+        prefetch_options = dict(prefetch_options or {})
+        self.prefetcher = None
+        if prefetch_options.pop("enabled", False):
+            predictor = CommandPredictor(prefetch_options.pop("path", "cache/predictor.json"))
+            seed_limit = prefetch_options.pop("seed_limit", 500)
+            if self.longterm is not None and not predictor.transitions:
+                # A new predictor starts from the latest commands in long-term memory, read on first use
+                longterm = self.longterm
+                predictor.history = lambda: longterm.commands(seed_limit)
+            self.prefetcher = Prefetcher(
+                fetch=self._plan_for,
+                warm_up=lambda: self.backend.warm_up(background=False),
+                predictor=predictor,
+                **prefetch_options
+            )
     
     def extract_json(self, text):
         """Extract JSON content from text using 2-pointer method to find outermost curly brackets"""
@@ -81,24 +178,45 @@ class Agent:
             text = input("Type your command: ").strip()
             if text:
                 print(f"You typed: {text}")
-                logger.info(f"You typed: {text}")
+                logger.info("You typed: %s", text)
             return text
         except KeyboardInterrupt:
             return ""
+        except EOFError:
+            # Input was piped in and has run out
+            return "exit"
         except Exception as e:
-            logger.error(f"Error getting text input: {e}")
+            logger.error("Error getting text input: %s", e)
             return ""
     
     def listen_for_voice(self) -> str:
         """Listen for voice input and convert to text"""
+        if self.voice_pipeline is not None:
+            # Mostly waiting for the user; recognition has its own spans in the pipeline
+            try:
+                with tracer.span("listen_for_voice", mode="pipeline"):
+                    text = self.voice_pipeline.get_transcript()
+            except RuntimeError as e:
+                # Nothing will be heard any more; stopping beats waiting in silence
+                print(f"Microphone stopped working ({e}), exiting")
+                logger.error("Exiting: %s", e)
+                return "exit"
+            if text:
+                print(f"You said: {text}")
+                logger.info("You said: %s", text)
+            return text
+
         try:
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                audio = self.recognizer.listen(source)
-                
-            text = self.recognizer.recognize_google(audio)
+            with tracer.span("listen_for_voice", mode="blocking"):
+                with tracer.span("capture"):
+                    with self.microphone as source:
+                        self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                        audio = self.recognizer.listen(source)
+
+                with tracer.span("recognize", engine=self.stt.name):
+                    text = self.stt.recognize(audio)
             print(f"You said: {text}")
-            logger.info(f"You said: {text}")
+            logger.info("You said: %s", text)
             return text
             
         except sr.UnknownValueError:
@@ -106,123 +224,321 @@ class Agent:
             return ""
         except sr.RequestError as e:
             print(f"Could not request results; {e}")
-            logger.error(f"Could not request results; {e}")
+            logger.error("Could not request results; %s", e)
             return ""
     
-    def send_to_ai(self, command: str) -> dict:
-        """Send command to AI and get structured response"""
+    def _show_partial(self, text: str):
+        """Echo partial transcripts from streaming speech engines on one console line."""
+        print(f"\rHearing: {text}", end="", flush=True)
+
+    def send_to_ai(self, command: str, on_step=None) -> dict:
+        """Send command to AI and get structured response.
+
+        When streaming is enabled and on_step is given, each workflow step is
+        passed to on_step as soon as it has been fully received.
+        """
+        with tracer.span("send_to_ai", command=command) as span:
+            response = self._answer(command, on_step, span)
+            if isinstance(response, dict) and response.get("command") == "Error":
+                span.set("error", response.get("parameters"))
+            return response
+
+    def _answer(self, command: str, on_step, span) -> dict:
+        # Add user message to memory
+        self.memory.add_user_message(command)
+        state_summary = self.memory.get_state_summary()
+
+        # A confirmed prediction was already planned while the last workflow ran
+        if self.prefetcher is not None:
+            prefetched = self.prefetcher.take(command, state_summary)
+            if prefetched is not None:
+                span.set("source", "prefetch")
+                return prefetched
+
+        if self.intents is not None:
+            fast_response = self.intents.match(command, self.memory.system_state)
+            if fast_response is not None:
+                span.set("source", "fast_path")
+                return fast_response
+
+        # Repeated commands in the same session state replay the cached workflow
+        if self.cache is not None:
+            cached = self.cache.get(command, state_summary)
+            if cached is not None:
+                span.set("source", "cache")
+                return cached
+
+        span.set("source", "model")
+        streaming = self.stream and on_step is not None
+        if self.inflight is not None and not streaming:
+            # Same key as the cache: a request that would be a cache hit once stored is joined while in flight
+            key = (state_summary, normalize_command(command))
+            return self.inflight.run(key, lambda: self._ask_model(command, state_summary, None))
+        return self._ask_model(command, state_summary, on_step)
+
+    def _ask_model(self, command: str, state_summary: str, on_step) -> dict:
+        # Build messages with memory context; the system prompt is only re-read when the file changes
+        messages = self.prompt_builder.build(
+            command, state_summary, self.memory.conversation_history,
+            extra_context=self.recall(command, self.memory)
+        )
+
+        # Steps handed to on_step while streaming; once there are any, they are part of the answer
+        dispatched = []
         try:
-            # Add user message to memory
-            self.memory.add_user_message(command)
-            
-            # Read system prompt from file
-            with open('systemprompt.txt', 'r', encoding='utf-8') as f:
-                system_prompt = f.read().strip()
-        except FileNotFoundError:
-            print("systemprompt.txt not found")
-            logger.warning("systemprompt.txt not found")
-
-        if self.local:
-            model = self.local_model_name
-        else:
-            model = self.cloud_model_name
-        
-        # Build messages with memory context
-        messages = [
-            {"role": "system", "content": system_prompt + "\n\n## Current Session State\n" + self.memory.get_state_summary()}
-        ]
-        messages.extend(self.memory.get_context_messages())
-        messages.append({"role": "user", "content": f"User command: {command}"})
-        
-        data = {
-            "model": model,
-            "messages": messages
-        }
+            complete = True
+            if self.stream and on_step is not None:
+                # Parsing happens incrementally while streaming, so both are in one span
+                with tracer.span("network", backend=self.backend.name, stream=True):
+                    parsed_response, content = self._stream_from_ai(messages, on_step, dispatched)
+            else:
+                with tracer.span("network", backend=self.backend.name, stream=False):
+                    content = self.backend.chat(messages)
+                parsed_response = self.parse_response(content)
+            if dispatched:
+                # A re-planned workflow could not undo the steps that already ran, so only the tail is checked
+                parsed_response, complete = self._finish_streamed(parsed_response, dispatched)
+            else:
+                parsed_response = self.check_response(parsed_response, messages, content)
+
+            if self.cache is not None and complete and parsed_response.get("command") != "Error":
+                self.cache.put(command, state_summary, parsed_response)
+            return parsed_response
+
+        except requests.RequestException as e:
+            logger.error("API request failed: %s", e)
+            if dispatched:
+                return {"workflow": list(dispatched)}
+            return {"command": "Error", "parameters": "API request failed"}
+        except ValueError as e:
+            logger.error("Malformed response from AI: %s", e)
+            if dispatched:
+                return {"workflow": list(dispatched)}
+            return {"command": "Error", "parameters": "Invalid response format"}
 
+    def _plan_for(self, command: str, memory: Memory):
+        """Plan a command against a memory snapshot without touching the session memory."""
+        if self.intents is not None and self.intents.match(command, memory.system_state) is not None:
+            # Answered locally in microseconds, nothing to gain from prefetching
+            return None
+        state_summary = memory.get_state_summary()
+        if self.cache is not None and self.cache.get(command, state_summary) is not None:
+            return None
+        messages = self.prompt_builder.build(
+            command, state_summary, memory.conversation_history,
+            extra_context=self.recall(command, memory)
+        )
+        content = self.backend.chat(messages)
+        parsed_response = self.check_response(self.parse_response(content), messages, content)
+        if not isinstance(parsed_response, dict) or parsed_response.get("command") == "Error":
+            return None
+        return parsed_response
+
+    def recall(self, command: str, memory: Memory) -> str:
+        """Past commands related to this one, formatted for the prompt."""
+        if self.longterm is None:
+            return ""
         try:
+            return self.longterm.context_for(command, memory.conversation_history)
+        except Exception as e:
+            logger.error("Long-term memory lookup failed: %s", e)
+            return ""
 
-            if self.local:
-                response = requests.post(
-                    "http://localhost:11434/api/chat",
-                    headers={"Content-Type": "application/json"},
-                    json=data,
-                    stream=False
-                )
-                response.raise_for_status()
-                ai_response = response.json()
-                content = ai_response['message']['content']
-            else:
-                response = requests.post(
-                    url="https://openrouter.ai/api/v1/chat/completions", 
-                    headers=self.headers, 
-                    json=data,
-                    timeout=30
-                )
+    def remember(self, command: str, response: dict):
+        """Record the plan for a command in session and long-term memory."""
+        self.memory.add_assistant_response(response)
+        if self.longterm is not None and response.get("command") != "Error":
+            self.longterm.append(command, response)
 
-                response.raise_for_status()
-                ai_response = response.json()
-                content = ai_response['choices'][0]['message']['content']
+    def new_session(self) -> "Agent":
+        """Return a view of this agent with its own memory and executor.
 
+        The backend, caches, long-term memory and loaded tools stay shared.
+        """
+        session = copy.copy(self)
+        session.memory = Memory()
+        session.executor = WorkflowExecutor(self.command_handlers, **self.executor_options)
+        # Predictions follow one user's habits, and the voice front-end belongs to the process
+        session.prefetcher = None
+        session.voice_pipeline = None
+        return session
 
-            # Parse JSON response
-            try:
-                logger.debug(f"Raw response: {content}")
+    def start_prefetch(self, command: str):
+        """Speculatively plan the likely next command; memory must already hold this command's plan."""
+        if self.prefetcher is not None:
+            self.prefetcher.speculate(command, self.memory)
+
+    def parse_response(self, content: str) -> dict:
+        """Parse the raw model output into a command dict."""
+        with tracer.span("parse", chars=len(content)):
+            return self._parse_response(content)
+
+    def _parse_response(self, content: str) -> dict:
+        extracted_content = content
+        # The full text goes to the compressed archive; the log keeps a capped copy
+        archive_raw("response", content, model=self.backend.model)
+        try:
+            logger.debug("Raw response: %s", content)
+            with tracer.span("extract_json"):
                 extracted_content = self.extract_json(content)
-                logger.debug(f"Extracted content: {extracted_content}")
-                parsed_response = json.loads(extracted_content)
-                return parsed_response
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON response from AI: {content}")
-                logger.debug(f"Raw response: {content}")
-                logger.debug(f"Extracted content: {extracted_content}")
-                logger.exception(f"JSON decode error: {e}")
-                return {"command": "Error", "parameters": "Invalid response format"}
+            if extracted_content != content:
+                logger.debug("Extracted content: %s", extracted_content)
+            parsed_response = json.loads(extracted_content)
+            return parsed_response
+        except json.JSONDecodeError as e:
+            logger.error("Invalid JSON response from AI (%s): %s", e, content)
+            if extracted_content != content:
+                logger.debug("Extracted content: %s", extracted_content)
+            return {"command": "Error", "parameters": "Invalid response format"}
 
-        except requests.RequestException as e:
-            logger.error(f"API request failed: {e}")
-            return {"command": "Error", "parameters": "API request failed"}
-    
-    def execute_command(self, command_data: dict):
-        """Execute a single command or a workflow with multiple steps."""
+    def _stream_from_ai(self, messages: list, on_step, dispatched: list):
+        """Stream the model response, dispatching workflow steps as they complete.
+
+        Each step passed to on_step is also appended to dispatched. Returns the
+        parsed response and the raw text.
+        """
+        parser = WorkflowStreamParser()
+        blocked = False
+        for chunk in self.backend.stream_chat(messages):
+            for step in parser.feed(chunk):
+                if blocked:
+                    continue
+                step = self._checked_step(step)
+                if step is None:
+                    # Steps must run in order, so nothing after an invalid step runs early
+                    blocked = True
+                    continue
+                dispatched.append(step)
+                on_step(step)
+
+        return self.parse_response(parser.text), parser.text
+
+    def _finish_streamed(self, parsed_response, dispatched: list):
+        """Complete a streamed workflow whose first steps already ran, without asking the model again.
+
+        The dispatched steps are kept as they ran and the rest is repaired
+        locally, stopping at the first step that is still invalid. Returns the
+        workflow and whether it is the whole plan the model sent.
+        """
+        workflow = parsed_response.get("workflow") if isinstance(parsed_response, dict) else None
+        if not isinstance(workflow, list):
+            # The tail was malformed, but the steps already run are still the workflow
+            logger.warning("Streamed response was incomplete; keeping dispatched steps")
+            return {"workflow": list(dispatched)}, False
+        tail = []
+        for step in workflow[len(dispatched):]:
+            step = self._checked_step(step)
+            if step is None:
+                logger.warning("Dropping the rest of a streamed workflow after an invalid step")
+                return dict(parsed_response, workflow=dispatched + tail), False
+            tail.append(step)
+        return dict(parsed_response, workflow=dispatched + tail), True
+
+    def _checked_step(self, step: dict):
+        """Validate a streamed step, repairing it if possible; None if it must not run."""
+        if self.validate_step is None or not self.validate_step(step):
+            return step
+        repaired = repair_step(step, list(self.command_handlers))
+        if not self.validate_step(repaired):
+            return repaired
+        logger.warning("Not dispatching invalid streamed step early: %s", step)
+        return None
+
+    def is_valid_response(self, response: dict) -> bool:
+        """Return True if a response is a workflow the agent can execute."""
+        if self.validate_workflow is not None:
+            return not self.validate_workflow(response)
+        return is_replayable(response, self.command_handlers)
+
+    def _acceptable(self, content: str) -> bool:
+        """Return True if raw model output parses to a valid workflow, without repairing or logging it."""
+        try:
+            response = json.loads(self.extract_json(content))
+        except json.JSONDecodeError:
+            return False
+        return isinstance(response, dict) and self.is_valid_response(response)
+
+    def check_response(self, parsed_response, messages: list, content: str) -> dict:
+        """Validate a parsed response against the workflow schema and repair it if needed.
+
+        A local repair of common mistakes is tried first. If that is not enough,
+        and repair_with_model is set, the model gets one chance to correct its
+        output before the command fails.
+        """
+        if self.validate_workflow is None:
+            return parsed_response
+        errors = self.validate_workflow(parsed_response)
+        if not errors:
+            return parsed_response
+
+        commands = list(self.command_handlers)
+        repaired = repair_workflow(parsed_response, commands)
+        if not self.validate_workflow(repaired):
+            logger.info("Repaired invalid response locally: %s", errors)
+            return repaired
+
+        if self.repair_with_model:
+            logger.warning("Invalid response, asking the model to fix it: %s", errors)
+            retry_messages = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": "That response does not match the schema: " + "; ".join(errors[:5]) +
+                 ". Reply with only the corrected JSON object."}
+            ]
+            retried = repair_workflow(self.parse_response(self.backend.chat(retry_messages)), commands)
+            if not self.validate_workflow(retried):
+                logger.info("Model repaired its response")
+                return retried
+            errors = self.validate_workflow(retried)
+
+        logger.error("Response failed schema validation: %s", errors)
+        return {"command": "Error", "parameters": "Invalid response format"}
+
+    def execute_step(self, step: dict, idx: int, total: int = None, state: str = ""):
+        """Schedule one workflow step; it runs once earlier steps sharing its resources are ready.
+
+        Call executor.join() to wait for the whole workflow. state is the
+        session state signature from before the command was planned.
+        """
+        return self.executor.submit(step, idx, total, state)
+
+    def execute_command(self, command_data: dict, start: int = 0, state: str = ""):
+        """Execute a single command or a workflow with multiple steps.
+
+        start skips workflow steps that were already dispatched while streaming.
+        """
         # Prefer workflow array if present
         workflow = command_data.get("workflow")
         if isinstance(workflow, list) and len(workflow) > 0:
-            for idx, step in enumerate(workflow):
-                try:
-                    command = (step.get("command") or "").strip()
-                    parameters = step.get("parameters", "")
-                    delay_secs = step.get("delay")
-                    logger.info(f"Step {idx+1}/{len(workflow)}: {command} -> {parameters}")
-                    handler = self.command_handlers.get(command)
-                    if handler:
-                        handler(parameters)
-                    else:
-                        logger.warning(f"Unknown command in workflow: {command}")
-                except Exception as e:
-                    logger.error(f"Error executing step {idx+1}: {e}")
-                # Per-step delay: use provided delay if present, otherwise default to 10s
-                try:
-                    pause = float(delay_secs) if delay_secs is not None else 10.0
-                except Exception:
-                    pause = 10.0
-                time.sleep(pause)
+            self.executor.run_workflow(workflow, start, state)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Workflow timing report:\n%s", self.executor.report())
             return
 
         # Fallback: single command structure { command, parameters }
         command = (command_data.get("command") or "").strip()
         parameters = command_data.get("parameters", "")
-        logger.info(f"Executing single command: {command} -> {parameters}")
+        logger.info("Executing single command: %s -> %s", command, parameters)
         handler = self.command_handlers.get(command)
         if handler:
             try:
                 handler(parameters)
             except Exception as e:
-                logger.error(f"Error executing command '{command}': {e}")
+                logger.error("Error executing command '%s': %s", command, e)
         else:
             print(f"Unknown command: {command}")
-            logger.warning(f"Unknown command: {command}")
+            logger.warning("Unknown command: %s", command)
     
 
+    def get_input(self) -> str:
+        """Get the next command using the selected input method"""
+        if self.input_method == "voice":
+            return self.listen_for_voice()
+        return self.get_text_input()
+
+    def is_exit_command(self, text: str) -> bool:
+        """Return True if the input asks the agent to stop"""
+        return "exit" in text.lower() or "quit" in text.lower()
+
     def run(self):
         """Main loop for the AI agent"""
         if self.input_method == "voice":
@@ -233,33 +549,37 @@ class Agent:
             print("Type 'exit' to quit")
         
         logger.info("="*50)
-        logger.info(f"Agent started with {self.input_method} input method")
+        logger.info("Agent started with %s input method", self.input_method)
         print("-"*50)
-        
-        while True:
-            # Get input based on selected method
-            if self.input_method == "voice":
-                input_text = self.listen_for_voice()
-            else:
-                input_text = self.get_text_input()
-            
-            if not input_text:
-                continue
-            
-            # Check for exit command
-            if "exit" in input_text.lower() or "quit" in input_text.lower():
-                print("Goodbye!")
-                logger.info("Exited")
-                logger.info("="*50)
-                break
-            
-            # Send to AI for processing
-            command_data = self.send_to_ai(input_text)
-            
-            # Execute the command
-            self.execute_command(command_data)
-            
-            # Add response to memory after execution
-            self.memory.add_assistant_response(command_data)
-            
-            print("-" * 50)
\ No newline at end of file
+
+        if self.voice_pipeline is not None:
+            self.voice_pipeline.start()
+
+        # Input, inference and execution run as overlapping pipeline stages
+        try:
+            asyncio.run(AgentCore(self, **self.core_options).run())
+        except KeyboardInterrupt:
+            logger.info("Interrupted")
+        finally:
+            if self.voice_pipeline is not None:
+                self.voice_pipeline.stop()
+            print("Goodbye!")
+            self.close()
+
+    def close(self):
+        """Log the session stats and release the long-term memory and tracer."""
+        if self.cache is not None:
+            self.cache.close()
+            logger.info("Response cache stats: %s", self.cache.get_cache_stats())
+        if self.prefetcher is not None:
+            logger.info("Prefetch stats: %s", self.prefetcher.get_prefetch_stats())
+        if self.longterm is not None:
+            self.longterm.close()
+        self.backend.close()
+        self.executor.close()
+        if self.delay_model is not None:
+            self.delay_model.close()
+            logger.info("Learned step delays removed %.2fs of idle time", self.executor.idle_removed)
+        tracer.close()
+        logger.info("Exited")
+        logger.info("="*50)
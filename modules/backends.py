@@ -0,0 +1,334 @@
+import json
+import math
+from abc import ABC, abstractmethod
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from logger import logger
+from tracing import tracer
+from modules.prompt import estimate_tokens
+
+
+class CountingRetry(Retry):
+    """Retry policy that reports each retry to the tracer."""
+
+    def increment(self, *args, **kwargs):
+        tracer.count("http_retries")
+        return super().increment(*args, **kwargs)
+
+
+class Backend(ABC):
+    """Base class for a chat model provider that owns a pooled, keep-alive HTTP session."""
+
+    name = "backend"
+    base_url = ""
+    chat_path = ""
+
+    def __init__(self, model: str, timeout: float = 30, connect_timeout: float = 5,
+                 max_retries: int = 2, retry_backoff: float = 0.5, pool_size: int = 4):
+        """
+        Args:
+            model: Model identifier sent with every request
+            timeout: Seconds to wait for the model to respond (read timeout)
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            max_retries: Retries on connection errors and 429/5xx responses
+            retry_backoff: Exponential backoff factor between retries, in seconds
+            pool_size: Number of keep-alive connections kept per host
+        """
+        self.model = model
+        self.timeout = (connect_timeout, timeout)
+        # JSON schema the model output must follow, if structured output is enabled
+        self.response_schema = None
+        self.session = requests.Session()
+        self.session.headers.update(self.headers())
+
+        # Read errors are not retried: a timed-out generation should not be re-sent blindly
+        retry = CountingRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def headers(self) -> Dict[str, str]:
+        """Headers sent with every request on this backend's session."""
+        return {"Content-Type": "application/json"}
+
+    def build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> dict:
+        """Build the JSON request body for a chat call."""
+        payload = {"model": self.model, "messages": messages, "stream": stream}
+        if self.response_schema is not None:
+            self.add_response_format(payload, self.response_schema)
+        return payload
+
+    @abstractmethod
+    def add_response_format(self, payload: dict, schema: dict):
+        """Ask the provider to constrain its output to the schema."""
+        raise NotImplementedError
+
+    def post_chat(self, payload: dict, stream: bool = False) -> requests.Response:
+        """POST a prepared payload to the chat endpoint and return the raw response."""
+        response = self.session.post(
+            self.base_url + self.chat_path,
+            json=payload,
+            timeout=self.timeout,
+            stream=stream
+        )
+        response.raise_for_status()
+        return response
+
+    def chat(self, messages: List[Dict[str, str]]) -> str:
+        """Send messages and return the full response content."""
+        response = self.post_chat(self.build_payload(messages))
+        body = response.json()
+        self.record_usage(body)
+        return self.extract_content(body)
+
+    def stream_chat(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Send messages and yield response content chunks as they arrive."""
+        response = self.post_chat(self.build_payload(messages, stream=True), stream=True)
+        try:
+            yield from self.iter_chunks(response)
+        finally:
+            # Closing returns the connection to the pool even if the caller stops early
+            response.close()
+
+    @abstractmethod
+    def extract_content(self, body: dict) -> str:
+        raise NotImplementedError
+
+    def usage(self, body: dict) -> Dict[str, float]:
+        """Token counts (and cost, if the provider reports it) from a response body or final chunk."""
+        return {}
+
+    def record_usage(self, body: dict):
+        for key, amount in self.usage(body).items():
+            if amount:
+                tracer.count(key, amount)
+
+    @abstractmethod
+    def iter_chunks(self, response: requests.Response) -> Iterator[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def warm_up_request(self):
+        raise NotImplementedError
+
+    def warm_up(self, background: bool = True):
+        """Open a pooled connection ahead of the first command."""
+        def _warm():
+            try:
+                self.warm_up_request()
+                logger.info("%s backend warmed up", self.name)
+            except requests.RequestException as e:
+                logger.warning("%s warm-up failed: %s", self.name, e)
+
+        if background:
+            threading.Thread(target=_warm, name=f"{self.name}-warmup", daemon=True).start()
+        else:
+            _warm()
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+class OllamaBackend(Backend):
+    """Local Ollama server, keeping the model loaded and its context sized to the prompt."""
+
+    name = "ollama"
+    base_url = "http://localhost:11434"
+    chat_path = "/api/chat"
+    # Durations Ollama reports with the final response, in nanoseconds
+    TIMING_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+    def __init__(self, model: str, timeout: float = 120, keep_alive: Union[int, str, None] = -1,
+                 preload: bool = True, min_ctx: int = 2048, max_ctx: int = 8192, ctx_step: int = 1024,
+                 response_tokens: int = 512, unload_on_close: bool = True, **options):
+        """
+        Args:
+            keep_alive: How long Ollama keeps the model loaded after a request ("30m", seconds, -1 forever)
+            preload: Load the model during warm-up instead of on the first command
+            min_ctx / max_ctx: Bounds for the context window (num_ctx) requested
+            ctx_step: num_ctx is rounded up to a multiple of this
+            response_tokens: Room left in the context for the response
+            unload_on_close: Release the model's memory when the agent exits
+        """
+        # Longer default read timeout: the first call may have to load the model
+        super().__init__(model, timeout=timeout, **options)
+        self.keep_alive = keep_alive
+        self.preload = preload
+        self.min_ctx = min_ctx
+        self.max_ctx = max_ctx
+        self.ctx_step = ctx_step
+        self.response_tokens = response_tokens
+        self.unload_on_close = unload_on_close
+        self.num_ctx = min_ctx
+        # Seconds spent loading the model and evaluating the prompt and response, from the last call
+        self.last_timings: Dict[str, float] = {}
+
+    def context_size(self, messages: List[Dict[str, str]]) -> int:
+        """num_ctx that fits the prompt plus the response.
+
+        Only ever grows: Ollama reloads the model whenever num_ctx changes, so
+        shrinking it for a short prompt would cost far more than it saves.
+        """
+        return self.reserve_context(sum(estimate_tokens(m.get("content", "")) + 4 for m in messages))
+
+    def reserve_context(self, prompt_tokens: int) -> int:
+        """Grow num_ctx to fit a prompt of this many tokens plus the response, and return it."""
+        needed = math.ceil((prompt_tokens + self.response_tokens) / self.ctx_step) * self.ctx_step
+        self.num_ctx = min(max(self.num_ctx, needed), self.max_ctx)
+        return self.num_ctx
+
+    def build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> dict:
+        payload = super().build_payload(messages, stream)
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        payload["options"] = {"num_ctx": self.context_size(messages)}
+        return payload
+
+    def record_usage(self, body: dict):
+        super().record_usage(body)
+        timings = {
+            field.replace("duration", "seconds"): body[field] / 1e9
+            for field in self.TIMING_FIELDS if body.get(field)
+        }
+        if not timings:
+            return
+        if body.get("eval_count") and body.get("eval_duration"):
+            timings["eval_tokens_per_second"] = body["eval_count"] / (body["eval_duration"] / 1e9)
+        self.last_timings = timings
+        span = tracer.current()
+        for key, value in timings.items():
+            if key != "eval_tokens_per_second":
+                tracer.count(key, value)
+            if span is not None:
+                span.set(key, round(value, 4))
+        if timings.get("load_seconds", 0) > 0.5:
+            logger.info("Ollama loaded %s in %.2f s", self.model, timings["load_seconds"])
+
+    def add_response_format(self, payload: dict, schema: dict):
+        # Ollama compiles the schema into a grammar that constrains decoding
+        payload["format"] = schema
+
+    def extract_content(self, body: dict) -> str:
+        return body['message']['content']
+
+    def usage(self, body: dict) -> Dict[str, float]:
+        return {
+            "prompt_tokens": body.get("prompt_eval_count", 0),
+            "completion_tokens": body.get("eval_count", 0)
+        }
+
+    def iter_chunks(self, response: requests.Response) -> Iterator[str]:
+        # Ollama streams one JSON object per line
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            chunk = json.loads(line)
+            yield chunk.get("message", {}).get("content", "")
+            if chunk.get("done"):
+                # The final chunk carries the token counts
+                self.record_usage(chunk)
+                break
+
+    def warm_up_request(self):
+        if not self.preload:
+            self.session.get(self.base_url + "/api/tags", timeout=self.timeout).raise_for_status()
+            return
+        # A chat request without messages only loads the model, with the same num_ctx the first command will use
+        payload = {"model": self.model, "messages": [], "keep_alive": self.keep_alive,
+                   "options": {"num_ctx": self.num_ctx}}
+        body = self.post_chat(payload).json()
+        self.record_usage(body)
+
+    def close(self):
+        if self.unload_on_close and self.preload:
+            try:
+                # keep_alive 0 unloads the model now rather than when keep_alive runs out
+                self.session.post(self.base_url + self.chat_path, json={"model": self.model, "keep_alive": 0},
+                                  timeout=(self.timeout[0], 5))
+            except requests.RequestException as e:
+                logger.debug("Could not unload %s: %s", self.model, e)
+        super().close()
+
+
+class OpenRouterBackend(Backend):
+    """OpenRouter chat completions API."""
+
+    name = "openrouter"
+    base_url = "https://openrouter.ai/api/v1"
+    chat_path = "/chat/completions"
+
+    def __init__(self, model: str, api_key: str = None, http_referer: str = "https://nesarpy.github.io/", **options):
+        self.api_key = api_key
+        self.http_referer = http_referer
+        super().__init__(model, **options)
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": self.http_referer,
+            "X-Title": "AI Computer Agent"
+        }
+
+    def build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> dict:
+        payload = super().build_payload(messages, stream)
+        # Ask for token counts and cost in the response (the last chunk when streaming)
+        payload["usage"] = {"include": True}
+        return payload
+
+    def add_response_format(self, payload: dict, schema: dict):
+        payload["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "workflow", "strict": False, "schema": schema}
+        }
+
+    def extract_content(self, body: dict) -> str:
+        return body['choices'][0]['message']['content']
+
+    def usage(self, body: dict) -> Dict[str, float]:
+        usage = body.get("usage") or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cost_usd": usage.get("cost", 0)
+        }
+
+    def iter_chunks(self, response: requests.Response) -> Iterator[str]:
+        # Server-sent events; lines starting with ':' are keep-alive comments
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            if chunk.get("usage"):
+                self.record_usage(chunk)
+            choices = chunk.get("choices") or [{}]
+            yield choices[0].get("delta", {}).get("content") or ""
+
+    def warm_up_request(self):
+        # Only the TCP/TLS handshake matters here, so the status code is ignored
+        self.session.head(self.base_url + "/models", timeout=self.timeout)
+
+
+def create_backend(local: bool, local_model_name: str, cloud_model_name: str,
+                   openrouter_api: str = None, http_referer: str = "https://nesarpy.github.io/",
+                   local_options: Optional[dict] = None, **options) -> Backend:
+    """Create the backend for the configured provider; local_options only apply to Ollama."""
+    if local:
+        return OllamaBackend(local_model_name, **dict(options, **(local_options or {})))
+    return OpenRouterBackend(cloud_model_name, api_key=openrouter_api, http_referer=http_referer, **options)
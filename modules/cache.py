@@ -0,0 +1,290 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from logger import logger
+from tracing import tracer
+
+# Words that do not change what a command means
+FILLER_WORDS = {"please", "hey", "can", "could", "you", "would", "the", "a", "now", "for", "me"}
+
+# Verbs followed by a literal payload: text to type, a query, a site or URL
+PAYLOAD_VERBS = re.compile(r"\b(?:type|write|search|google|play|open|visit|go\s+to|navigate\s+to)\b")
+
+# Bumped whenever normalize_command changes, so entries stored under old keys are dropped
+KEY_VERSION = 2
+
+
+def normalize_command(command: str) -> str:
+    """Lowercase, strip punctuation and filler words so equivalent phrasings share a key.
+
+    Everything from a payload verb on ("type can you help me") is kept as
+    typed, only lowercased, so commands with different payloads never share a key.
+    """
+    text = command.lower()
+    found = PAYLOAD_VERBS.search(text)
+    head, payload = (text[:found.start()], text[found.start():]) if found else (text, "")
+    words = [w for w in re.sub(r"[^\w\s]", " ", head).split() if w not in FILLER_WORDS]
+    if payload:
+        words.append(" ".join(payload.split()))
+    return " ".join(words)
+
+
+def is_replayable(response: Dict[str, Any], commands) -> bool:
+    """Return True if a cached response is a non-empty workflow of known commands."""
+    workflow = response.get("workflow") if isinstance(response, dict) else None
+    if not isinstance(workflow, list) or not workflow:
+        return False
+    for step in workflow:
+        if not isinstance(step, dict) or step.get("command") not in commands:
+            return False
+        if "parameters" not in step:
+            return False
+    return True
+
+
+class InflightRequests:
+    """Lets concurrent callers asking for the same thing share one computation in progress."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return compute(), or the result of an identical call that is already running."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            tracer.count("coalesced_requests")
+            # Each caller gets its own copy to record and execute
+            return copy.deepcopy(future.result())
+
+        try:
+            result = compute()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class ResponseCache:
+    """Persistent LRU/TTL cache of model responses keyed on command text and session state."""
+
+    def __init__(self, path: str = "cache/responses.json", max_entries: int = 256,
+                 ttl: float = 7 * 24 * 3600, fuzzy_threshold: Optional[float] = None,
+                 validator: Callable[[Dict[str, Any]], bool] = None, save_delay: float = 2.0):
+        """
+        Args:
+            path: JSON file the cache is persisted to
+            max_entries: Entries kept before the least recently used one is evicted
+            ttl: Seconds an entry stays valid
+            fuzzy_threshold: Similarity ratio (0-1) for near-identical phrasings; None disables fuzzy hits
+            validator: Callable that must accept a cached response before it is replayed
+            save_delay: Seconds changes are gathered before the file is rewritten in the background
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.validator = validator
+        self.save_delay = save_delay
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while writing, so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._stats = {
+            "hits": 0,
+            "fuzzy_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+            "rejected": 0
+        }
+        self._load()
+
+    @staticmethod
+    def _key(normalized: str, state: str) -> str:
+        return f"{state}\x00{normalized}"
+
+    def get(self, command: str, state: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response for the command in this state, or None."""
+        normalized = normalize_command(command)
+        if not normalized:
+            return None
+
+        with self._lock:
+            key = self._key(normalized, state)
+            entry = self._entries.get(key)
+            fuzzy = False
+            # A near miss on a payload is a different payload, so those commands only hit exactly
+            if entry is None and self.fuzzy_threshold and not PAYLOAD_VERBS.search(normalized):
+                key, entry = self._fuzzy_lookup(normalized, state)
+                fuzzy = entry is not None
+
+            if entry is None:
+                self._stats["misses"] += 1
+                tracer.count("cache_misses")
+                return None
+
+            if time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                tracer.count("cache_misses")
+                return None
+
+            response = entry["response"]
+            if self.validator is not None and not self.validator(response):
+                del self._entries[key]
+                self._stats["rejected"] += 1
+                self._stats["misses"] += 1
+                tracer.count("cache_misses")
+                logger.warning("Dropped invalid cached response for '%s'", entry["command"])
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["fuzzy_hits" if fuzzy else "hits"] += 1
+            tracer.count("cache_hits")
+
+        logger.info("Cache %shit for '%s' (matched '%s')", "fuzzy " if fuzzy else "", command, entry["command"])
+        # Hand out a copy so the caller cannot mutate the cached workflow
+        return json.loads(json.dumps(response))
+
+    def _fuzzy_lookup(self, normalized: str, state: str):
+        """Find the most similar cached command recorded in the same state."""
+        # Numbers carry the meaning of "volume 30" vs "volume 40", so they must match exactly
+        digits = re.findall(r"\d+", normalized)
+        matcher = SequenceMatcher(None, normalized)
+        best_key, best_entry, best_ratio = None, None, self.fuzzy_threshold
+        for key, entry in self._entries.items():
+            if entry["state"] != state or re.findall(r"\d+", entry["command"]) != digits:
+                continue
+            matcher.set_seq1(entry["command"])
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best_key, best_entry, best_ratio = key, entry, ratio
+        return best_key, best_entry
+
+    def put(self, command: str, state: str, response: Dict[str, Any]) -> None:
+        """Store a response; the file is rewritten shortly after, off the caller's thread."""
+        normalized = normalize_command(command)
+        if not normalized:
+            return
+        if self.validator is not None and not self.validator(response):
+            return
+
+        with self._lock:
+            key = self._key(normalized, state)
+            self._entries[key] = {
+                "command": normalized,
+                "state": state,
+                "response": response,
+                "created": time.time(),
+                "version": KEY_VERSION
+            }
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._schedule_save()
+
+    def clear(self) -> None:
+        """Remove every entry from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+        logger.info("Response cache cleared")
+
+    def flush(self) -> None:
+        """Write changes not yet saved to disk now."""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = list(self._entries.values())
+            self._save(entries)
+
+    def close(self) -> None:
+        """Save pending changes; the cache stays usable."""
+        self.flush()
+
+    def _schedule_save(self) -> None:
+        """Mark the cache changed and start the save timer, if it is not already running. Called with _lock held."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["fuzzy_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["fuzzy_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Could not load response cache from %s: %s", self.path, e)
+            return
+
+        now = time.time()
+        skipped = 0
+        # Entries are stored oldest first, which restores the LRU order
+        for entry in entries:
+            try:
+                if now - entry.get("created", 0) <= self.ttl and entry.get("version") == KEY_VERSION:
+                    self._entries[self._key(entry["command"], entry["state"])] = entry
+            except (AttributeError, KeyError, TypeError):
+                skipped += 1
+        if skipped:
+            logger.warning("Skipped %d malformed entries in response cache %s", skipped, self.path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info("Loaded %d cached responses from %s", len(self._entries), self.path)
+
+    def _save(self, entries: List[Dict[str, Any]]) -> None:
+        """Write the cache atomically so a crash never leaves a half-written file."""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Could not save response cache to %s: %s", self.path, e)
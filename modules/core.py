@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Dict, Optional
+from logger import logger
+
+# Marks the end of a plan's step queue
+PLAN_DONE = object()
+
+
+class Plan:
+    """One command on its way through the pipeline.
+
+    Workflow steps are put on a thread-safe queue as soon as they are known, so
+    execution of a streamed response can start before inference has finished.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.steps: "queue.Queue" = queue.Queue()
+        self.result: Optional[Dict[str, Any]] = None
+        self.cancelled = False
+        # Session state before this command, used to look up learned step delays
+        self.state = ""
+
+
+class AgentCore:
+    """Runs input, inference and execution as asyncio stages joined by bounded queues.
+
+    Blocking work (microphone, HTTP, keyboard automation) runs in worker threads,
+    so the agent keeps listening and can plan the next command while a long
+    workflow is still executing.
+    """
+
+    def __init__(self, agent, queue_size: int = 2, cancel_on_new_command: bool = False):
+        """
+        Args:
+            agent: The Agent whose input, model and executor are used
+            queue_size: Commands that may wait for inference before input blocks
+            cancel_on_new_command: Abort the running workflow when a new command arrives
+        """
+        self.agent = agent
+        self.queue_size = queue_size
+        self.cancel_on_new_command = cancel_on_new_command
+        self.current_plan: Optional[Plan] = None
+
+    async def run(self):
+        """Run all stages until an exit command has passed through the pipeline."""
+        commands: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # A single slot keeps inference at most one plan ahead of execution
+        plans: asyncio.Queue = asyncio.Queue(maxsize=1)
+        stages = [
+            asyncio.create_task(self._input_stage(commands), name="input"),
+            asyncio.create_task(self._inference_stage(commands, plans), name="inference"),
+            asyncio.create_task(self._execution_stage(plans), name="execution")
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            self.agent.executor.cancel()
+            raise
+
+    async def _input_stage(self, commands: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        # input() and the microphone cannot be interrupted, so they run on a daemon thread:
+        # asyncio.run waits for executor threads on exit, which would keep Ctrl+C from stopping the agent
+        inputs: asyncio.Queue = asyncio.Queue(maxsize=1)
+        threading.Thread(target=self._read_inputs, args=(loop, inputs), name="input", daemon=True).start()
+        while True:
+            text = await inputs.get()
+            if self.agent.is_exit_command(text):
+                await commands.put(None)
+                return
+            if self.cancel_on_new_command and self.current_plan is not None:
+                logger.info("New command '%s' cancels '%s'", text, self.current_plan.command)
+                self.current_plan.cancelled = True
+                self.agent.executor.cancel()
+            # Waits here when inference is behind, which is the pipeline's backpressure
+            await commands.put(text)
+
+    def _read_inputs(self, loop: asyncio.AbstractEventLoop, inputs: asyncio.Queue):
+        """Read commands from the blocking input source and hand them to the input stage."""
+        while True:
+            text = self.agent.get_input()
+            if not text:
+                continue
+            try:
+                asyncio.run_coroutine_threadsafe(inputs.put(text), loop).result()
+            except Exception:
+                # The pipeline has stopped
+                return
+            if self.agent.is_exit_command(text):
+                return
+
+    async def _inference_stage(self, commands: asyncio.Queue, plans: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            command = await commands.get()
+            if command is None:
+                await plans.put(None)
+                return
+            plan = Plan(command)
+            await plans.put(plan)
+            await loop.run_in_executor(None, self._infer, plan)
+
+    def _infer(self, plan: Plan):
+        """Ask the model for a plan, feeding steps to the plan's queue as they arrive."""
+        streamed = []
+        plan.state = self.agent.memory.system_state.signature()
+
+        def on_step(step):
+            streamed.append(step)
+            plan.steps.put(step)
+
+        try:
+            result = self.agent.send_to_ai(plan.command, on_step=on_step if self.agent.stream else None)
+        except Exception as e:
+            logger.error("Inference failed for '%s': %s", plan.command, e)
+            # Steps already queued still run, so they are what gets recorded
+            result = {"workflow": list(streamed)} if streamed else {"command": "Error", "parameters": "Inference failed"}
+        plan.result = result
+
+        workflow = result.get("workflow")
+        if isinstance(workflow, list):
+            for step in workflow[len(streamed):]:
+                plan.steps.put(step)
+        # Record the plan now so the next command is planned against the state it will leave behind
+        self.agent.remember(plan.command, result)
+        plan.steps.put(PLAN_DONE)
+        # Hide the next command's model latency behind this workflow's execution
+        self.agent.start_prefetch(plan.command)
+
+    async def _execution_stage(self, plans: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            plan = await plans.get()
+            if plan is None:
+                return
+            self.current_plan = plan
+            self.agent.executor.reset_cancel()
+            await loop.run_in_executor(None, self._execute, plan)
+            self.current_plan = None
+            print("-" * 50)
+
+    def _execute(self, plan: Plan):
+        """Run a plan's steps in order as they become available."""
+        idx = 0
+        while True:
+            step = plan.steps.get()
+            if step is PLAN_DONE:
+                break
+            if not plan.cancelled:
+                # The total is only known up front when the response was not streamed
+                workflow = plan.result.get("workflow") if plan.result is not None else None
+                self.agent.execute_step(step, idx, len(workflow) if isinstance(workflow, list) else None, plan.state)
+            idx += 1
+        self.agent.executor.join()
+
+        if plan.cancelled:
+            logger.info("Workflow for '%s' was cancelled after %d steps", plan.command, len(self.agent.executor.timings))
+            return
+        if idx:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Workflow timing report:\n%s", self.agent.executor.report())
+        else:
+            # Not a workflow: fall back to the single-command path
+            self.agent.execute_command(plan.result, state=plan.state)
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+from logger import logger
+
+
+class DelayModel:
+    """Learns how long each kind of step takes to become ready, persisted between sessions.
+
+    Samples are kept per key (command, normalized parameters and session
+    state). Once a key has enough of them, a high percentile plus a margin is
+    used as the step's delay instead of the model's guess.
+    """
+
+    def __init__(self, path: Optional[str] = "cache/delays.json", quantile: float = 0.9, margin: float = 0.25,
+                 min_samples: int = 3, max_samples: int = 50, min_delay: float = 0.2, max_delay: float = 30.0,
+                 save_every: int = 10):
+        """
+        Args:
+            path: JSON file the samples are saved to; None keeps them in memory only
+            quantile: Percentile of the observed times used as the delay
+            margin: Fraction added on top of the percentile
+            min_samples: Samples a key needs before its learned delay is used
+            max_samples: Most recent samples kept per key
+            min_delay / max_delay: Bounds for learned delays, in seconds
+            save_every: Samples recorded between saves
+        """
+        self.path = path
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.save_every = save_every
+        self.samples: Dict[str, Deque[float]] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(command: str, detail: str, state: str) -> str:
+        return f"{command}\x00{detail}\x00{state}"
+
+    def delay_for(self, key: str) -> Optional[float]:
+        """Learned delay for a step, or None while there are too few samples."""
+        with self._lock:
+            samples = self.samples.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        value = ordered[min(int(self.quantile * len(ordered)), len(ordered) - 1)]
+        return min(max(value * (1 + self.margin), self.min_delay), self.max_delay)
+
+    def observe(self, key: str, seconds: float) -> None:
+        """Record how long a step took to become ready."""
+        with self._lock:
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = deque(maxlen=self.max_samples)
+            samples.append(round(seconds, 3))
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def close(self) -> None:
+        """Save any samples recorded since the last save."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Could not load step timings from %s: %s", self.path, e)
+            return
+        for key, samples in data.items():
+            self.samples[key] = deque(samples, maxlen=self.max_samples)
+        logger.info("Loaded step timings for %d kinds of step from %s", len(self.samples), self.path)
+
+    def _save(self) -> None:
+        """Write the samples atomically so a crash never leaves a half-written file."""
+        self._unsaved = 0
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({key: list(samples) for key, samples in self.samples.items()}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Could not save step timings to %s: %s", self.path, e)
@@ -0,0 +1,469 @@
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+from urllib.parse import urlparse
+from logger import logger
+from tracing import tracer
+
+# Apps the agent launches by typing their name into the start menu, mapped to
+# (process image, window title keyword) used to detect that the launch finished
+LAUNCHABLE_APPS = {
+    "brave": ("brave.exe", "brave"),
+    "cmd": ("cmd.exe", "cmd.exe"),
+}
+
+
+# What each command touches. Steps sharing a resource keep their workflow order;
+# steps with disjoint resources may run at the same time.
+FOCUS, AUDIO, BROWSER = "focus", "audio", "browser"
+STEP_RESOURCES: Dict[str, FrozenSet[str]] = {
+    "Volume": frozenset({AUDIO}),
+    "Type": frozenset({FOCUS}),
+    "Shortcut": frozenset({FOCUS}),
+    "Website": frozenset({FOCUS, BROWSER}),
+    "Play": frozenset({FOCUS, BROWSER}),
+}
+
+
+def step_resources(command: str) -> FrozenSet[str]:
+    """Resources a step uses; unknown commands are assumed to need keyboard focus."""
+    return STEP_RESOURCES.get(command, frozenset({FOCUS}))
+
+
+def site_name(url: str) -> str:
+    """Return the registrable name of a URL's host: "https://open.spotify.com/x" -> "spotify"."""
+    labels = (urlparse(url).hostname or "").split(".")
+    if len(labels) < 2:
+        return labels[0]
+    name = labels[-2]
+    if name in ("co", "com", "org", "net", "ac", "gov") and len(labels) >= 3:
+        name = labels[-3]
+    return name
+
+
+def grab_thumbnail(size=(64, 36)) -> bytes:
+    """Take a tiny grayscale screenshot used to detect on-screen changes."""
+    import pyautogui
+    return pyautogui.screenshot().convert("L").resize(size).tobytes()
+
+
+def frame_difference(a: bytes, b: bytes) -> float:
+    """Mean absolute per-pixel difference between two thumbnails."""
+    return sum(abs(x - y) for x, y in zip(a, b)) / max(len(a), 1)
+
+
+class ImmediateProbe:
+    """The step is done as soon as its handler returns (e.g. Volume)."""
+
+    name = "immediate"
+
+    def prepare(self):
+        pass
+
+    def ready(self) -> bool:
+        return True
+
+
+class ScreenSettledProbe:
+    """Ready once the screen has reacted to the step and then stopped changing."""
+
+    name = "settled"
+
+    def __init__(self, frames: int = 3, tolerance: float = 2.0, grace: float = 1.0):
+        self.frames = frames
+        self.tolerance = tolerance
+        self.grace = grace
+
+    def prepare(self):
+        # Captured before the handler runs so a change made by the step is noticed
+        self.baseline = grab_thumbnail()
+        self.previous = None
+        self.stable = 0
+        self.changed = False
+        self.started = time.monotonic()
+
+    def ready(self) -> bool:
+        frame = grab_thumbnail()
+        if not self.changed and frame_difference(frame, self.baseline) > self.tolerance:
+            self.changed = True
+        if self.previous is not None and frame_difference(frame, self.previous) <= self.tolerance:
+            self.stable += 1
+        else:
+            self.stable = 0
+        self.previous = frame
+        # Without a visible change, only trust a still screen once the grace period is over
+        return self.stable >= self.frames and (self.changed or time.monotonic() - self.started >= self.grace)
+
+
+class WindowTitleProbe:
+    """Ready once the active window title contains a keyword."""
+
+    name = "window"
+
+    def __init__(self, keyword: str):
+        self.keyword = keyword.lower()
+
+    def prepare(self):
+        import pyautogui
+        if not hasattr(pyautogui, "getActiveWindowTitle"):
+            raise RuntimeError("active window title is not available on this platform")
+
+    def ready(self) -> bool:
+        import pyautogui
+        title = pyautogui.getActiveWindowTitle() or ""
+        return self.keyword in title.lower()
+
+
+class ProcessProbe:
+    """Ready once a process with the given image name is running (Windows only)."""
+
+    name = "process"
+
+    def __init__(self, image: str):
+        self.image = image
+
+    def prepare(self):
+        if os.name != "nt":
+            raise RuntimeError("process probing needs tasklist")
+
+    def ready(self) -> bool:
+        result = subprocess.run(
+            ["tasklist", "/FI", f"IMAGENAME eq {self.image}", "/NH"],
+            capture_output=True, text=True, timeout=2
+        )
+        return self.image.lower() in result.stdout.lower()
+
+
+class AllProbes:
+    """Ready once every wrapped probe has reported ready (each is checked until it passes)."""
+
+    def __init__(self, *probes):
+        self.probes = list(probes)
+        self.name = "+".join(p.name for p in probes)
+
+    def prepare(self):
+        for probe in self.probes:
+            probe.prepare()
+        self.pending = list(self.probes)
+
+    def ready(self) -> bool:
+        while self.pending and self.pending[0].ready():
+            self.pending.pop(0)
+        return not self.pending
+
+
+class WorkflowExecutor:
+    """Run workflow steps, waiting on readiness signals and using the delay only as a ceiling."""
+
+    def __init__(self, command_handlers: Dict[str, Callable], smart_waits: bool = True,
+                 poll_interval: float = 0.1, settle_frames: int = 3, settle_tolerance: float = 2.0,
+                 default_delay: float = 10.0, parallel: bool = True, max_workers: int = 2, delay_model=None):
+        """
+        Args:
+            command_handlers: Map of workflow command name to handler
+            smart_waits: Wait on readiness probes; False restores plain sleeps
+            poll_interval: Seconds between readiness checks
+            settle_frames: Consecutive unchanged frames that count as a settled screen
+            settle_tolerance: Mean pixel difference below which two frames count as unchanged
+            default_delay: Ceiling used when a step has no delay
+            parallel: Run steps that use different resources (e.g. Volume next to browser steps) concurrently
+            max_workers: Threads available to concurrent steps
+            delay_model: DelayModel that learns step delays from observed readiness times
+        """
+        self.command_handlers = command_handlers
+        self.smart_waits = smart_waits
+        self.poll_interval = poll_interval
+        self.settle_frames = settle_frames
+        self.settle_tolerance = settle_tolerance
+        self.default_delay = default_delay
+        self.timings: List[Dict[str, Any]] = []
+        self._last_typed = ""
+        self._cancelled = threading.Event()
+        self.parallel = parallel
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="step") if parallel else None
+        # Futures of the current workflow, and the latest step holding each resource
+        self._futures: List[Future] = []
+        self._holders: Dict[str, Future] = {}
+        self._started = time.monotonic()
+        self.wall_time = 0.0
+        self.delay_model = delay_model
+        # Session state the current workflow started from, part of the learned delays' key
+        self.state = ""
+        # Seconds of waiting learned delays removed over the whole session
+        self.idle_removed = 0.0
+
+    def cancel(self):
+        """Abort the running workflow: the current wait ends and remaining steps are skipped."""
+        self._cancelled.set()
+
+    def close(self):
+        """Skip what is left of the current workflow and let the step threads exit once idle."""
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def reset_cancel(self):
+        """Allow steps to run again after a cancellation."""
+        self._cancelled.clear()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _settled(self, ceiling: float) -> ScreenSettledProbe:
+        return ScreenSettledProbe(self.settle_frames, self.settle_tolerance, grace=min(ceiling, 1.0))
+
+    def readiness_probe(self, command: str, parameters: Any, ceiling: float):
+        """Pick the signal that tells us a step has finished, or None to just sleep."""
+        if command == "Volume":
+            return ImmediateProbe()
+        if command == "Website" and isinstance(parameters, str):
+            site = site_name(parameters)
+            if site:
+                # Page titles usually carry the site name ("Spotify - Search")
+                return AllProbes(WindowTitleProbe(site), self._settled(ceiling))
+            return self._settled(ceiling)
+        if command == "Shortcut" and str(parameters).strip().lower() == "enter" and self._last_typed in LAUNCHABLE_APPS:
+            image, title = LAUNCHABLE_APPS[self._last_typed]
+            return AllProbes(ProcessProbe(image), WindowTitleProbe(title))
+        if command in ("Type", "Shortcut", "Play"):
+            return self._settled(ceiling)
+        return None
+
+    def _begin(self, state: str = ""):
+        """Start a new workflow, and with it a new timing report."""
+        self.state = state
+        self.timings = []
+        self._last_typed = ""
+        self._futures = []
+        self._holders = {}
+        self._started = time.monotonic()
+
+    def run_step(self, step: Dict[str, Any], idx: int, total: Optional[int] = None, state: str = "") -> Dict[str, Any]:
+        """Execute one workflow step now and wait until it is ready or its delay runs out."""
+        if idx == 0:
+            self._begin(state)
+        timing = self.perform_step(step, idx, total)
+        self.wall_time = time.monotonic() - self._started
+        return timing
+
+    def submit(self, step: Dict[str, Any], idx: int, total: Optional[int] = None, state: str = "") -> Future:
+        """Schedule a step to run once the earlier steps sharing its resources are done.
+
+        Steps are submitted in workflow order; call join() to wait for the workflow.
+        state (see SessionState.signature) is read with the first step only.
+        """
+        if idx == 0:
+            self.join()
+            self._begin(state)
+        return self._schedule(step, idx, total)
+
+    def _schedule(self, step: Dict[str, Any], idx: int, total: Optional[int]) -> Future:
+        resources = step_resources((step.get("command") or "").strip())
+        if self._pool is None:
+            future = Future()
+            future.set_result(self.perform_step(step, idx, total))
+            return future
+
+        # The step only reaches the pool once its predecessors are done, so a
+        # waiting step never holds a worker that an independent step could use
+        after = {self._holders[r] for r in resources if r in self._holders}
+        future = Future()
+        for resource in resources:
+            self._holders[resource] = future
+        self._futures.append(future)
+        self._after(after, lambda: self._start(future, step, idx, total))
+        return future
+
+    @staticmethod
+    def _after(futures, callback: Callable[[], None]):
+        """Call callback once every future is done, right away if there are none."""
+        if not futures:
+            callback()
+            return
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def _done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                callback()
+
+        for future in futures:
+            future.add_done_callback(_done)
+
+    def _start(self, future: Future, step: Dict[str, Any], idx: int, total: Optional[int]):
+        """Run a step on the pool and settle its workflow future with the outcome."""
+        def _settle(done: Future):
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+
+        try:
+            self._pool.submit(self.perform_step, step, idx, total).add_done_callback(_settle)
+        except RuntimeError as e:
+            # The pool was shut down while the step waited for its predecessors
+            future.set_exception(e)
+
+    def join(self) -> List[Dict[str, Any]]:
+        """Wait for every submitted step of the current workflow and return the timings."""
+        if self._futures:
+            wait(self._futures)
+            self._futures = []
+        self.wall_time = time.monotonic() - self._started
+        return self.timings
+
+    def perform_step(self, step: Dict[str, Any], idx: int, total: Optional[int] = None) -> Dict[str, Any]:
+        """Execute one step and wait for it, without starting a new workflow."""
+        with tracer.span("step", step=idx + 1, command=step.get("command")) as span:
+            timing = self._perform_step(step, idx, total)
+            span.set("signal", timing["signal"])
+            span.set("waited", round(timing["waited"], 3))
+            span.set("saved", round(timing["saved"], 3))
+            return timing
+
+    def _perform_step(self, step: Dict[str, Any], idx: int, total: Optional[int]) -> Dict[str, Any]:
+        command = (step.get("command") or "").strip()
+        parameters = step.get("parameters", "")
+        if self.cancelled:
+            logger.info("Skipping step %d (%s): workflow cancelled", idx + 1, command)
+            timing = {"step": idx + 1, "command": command, "ceiling": 0.0, "waited": 0.0, "signal": "cancelled",
+                      "saved": 0.0, "model_delay": 0.0, "removed": 0.0}
+            self.timings.append(timing)
+            return timing
+
+        try:
+            model_delay = float(step["delay"]) if step.get("delay") is not None else self.default_delay
+        except (TypeError, ValueError):
+            model_delay = self.default_delay
+        ceiling = model_delay
+        delay_key = None
+        if self.delay_model is not None:
+            delay_key = self.delay_model.key(command, self._delay_detail(command, parameters), self.state)
+            learned = self.delay_model.delay_for(delay_key)
+            if learned is not None:
+                ceiling = learned
+
+        probe = self.readiness_probe(command, parameters, ceiling) if self.smart_waits else None
+        if probe is not None:
+            try:
+                probe.prepare()
+            except Exception as e:
+                logger.debug("Readiness probe %s unavailable: %s", probe.name, e)
+                probe = None
+
+        try:
+            logger.info("Step %d/%s: %s -> %s", idx + 1, total if total is not None else "?", command, parameters)
+            handler = self.command_handlers.get(command)
+            if handler:
+                handler(parameters)
+            else:
+                logger.warning("Unknown command in workflow: %s", command)
+        except Exception as e:
+            logger.error("Error executing step %d: %s", idx + 1, e)
+
+        waited, signal = self._wait(probe, ceiling)
+        removed = 0.0
+        if delay_key is not None:
+            if signal not in ("delay", "timeout", "cancelled"):
+                self.delay_model.observe(delay_key, waited)
+            elif signal == "timeout":
+                # Not ready yet: the ceiling is a lower bound, which keeps the learned delay from shrinking
+                self.delay_model.observe(delay_key, ceiling)
+            if signal == "delay":
+                # Slept the whole ceiling, where the model's delay would have been slept instead
+                removed = model_delay - ceiling
+            elif signal == "timeout":
+                removed = min(model_delay - ceiling, 0.0)
+            self.idle_removed += removed
+        if FOCUS in step_resources(command):
+            # Only keyboard steps matter for "Type brave" then "enter"; a concurrent Volume must not reset it
+            self._last_typed = str(parameters).strip().lower() if command == "Type" else ""
+
+        timing = {
+            "step": idx + 1,
+            "command": command,
+            "ceiling": ceiling,
+            "waited": waited,
+            "signal": signal,
+            "saved": max(ceiling - waited, 0.0),
+            "model_delay": model_delay,
+            "removed": removed
+        }
+        self.timings.append(timing)
+        return timing
+
+    def _delay_detail(self, command: str, parameters: Any) -> str:
+        """The part of a step's parameters that affects how long it takes to become ready."""
+        if command == "Website" and isinstance(parameters, str):
+            return site_name(parameters)
+        if command == "Shortcut":
+            keys = str(parameters).strip().lower()
+            # "enter" after typing an app name launches that app
+            return f"{keys}<{self._last_typed}" if keys == "enter" and self._last_typed else keys
+        if command == "Type":
+            return str(parameters).strip().lower()[:32]
+        return ""
+
+    def _wait(self, probe, ceiling: float):
+        """Poll the probe until it reports ready or the ceiling is reached."""
+        # Waiting on the cancel event instead of sleeping lets cancel() end any wait early
+        start = time.monotonic()
+        if probe is None:
+            if self._cancelled.wait(ceiling):
+                return time.monotonic() - start, "cancelled"
+            return ceiling, "delay"
+
+        deadline = start + ceiling
+        try:
+            while True:
+                if probe.ready():
+                    return time.monotonic() - start, probe.name
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return ceiling, "timeout"
+                if self._cancelled.wait(min(self.poll_interval, remaining)):
+                    return time.monotonic() - start, "cancelled"
+        except Exception as e:
+            logger.warning("Readiness probe %s failed, falling back to delay: %s", probe.name, e)
+            remaining = deadline - time.monotonic()
+            if remaining > 0 and self._cancelled.wait(remaining):
+                return time.monotonic() - start, "cancelled"
+            return ceiling, "delay"
+
+    def run_workflow(self, workflow: List[Dict[str, Any]], start: int = 0, state: str = "") -> List[Dict[str, Any]]:
+        """Execute workflow steps from start onwards and return the timing report."""
+        if start == 0:
+            self.join()
+            self._begin(state)
+        for idx in range(start, len(workflow)):
+            self._schedule(workflow[idx], idx, len(workflow))
+        return self.join()
+
+    def report(self) -> str:
+        """Summarize how long each step waited compared to its delay."""
+        if not self.timings:
+            return "No steps executed"
+        # Concurrent steps may finish out of order
+        timings = sorted(self.timings, key=lambda t: t["step"])
+        lines = [
+            f"Step {t['step']} {t['command']}: waited {t['waited']:.2f}s of {t['ceiling']:.2f}s "
+            f"({t['signal']}), saved {t['saved']:.2f}s"
+            + (f", learned delay instead of {t['model_delay']:.2f}s" if t["ceiling"] != t["model_delay"] and t["signal"] != "cancelled" else "")
+            for t in timings
+        ]
+        waited = sum(t["waited"] for t in timings)
+        ceiling = sum(t["ceiling"] for t in timings)
+        lines.append(f"Total: waited {waited:.2f}s of {ceiling:.2f}s, saved {ceiling - waited:.2f}s "
+                     f"(workflow took {self.wall_time:.2f}s)")
+        if self.delay_model is not None:
+            removed = sum(t["removed"] for t in timings)
+            lines.append(f"Learned delays removed {removed:.2f}s of idle time "
+                         f"({self.idle_removed:.2f}s this session)")
+        return "\n".join(lines)
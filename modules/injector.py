@@ -0,0 +1,154 @@
+import sys
+import time
+from typing import Optional
+from logger import logger
+from tracing import tracer
+
+# Fastest first; a mode that fails falls back to the next one
+MODES = ("paste", "batch", "chars")
+
+
+class PyAutoGuiSink:
+    """Delivers keystrokes to the focused window; pyautogui is imported on first use."""
+
+    name = "pyautogui"
+
+    def write(self, text: str, interval: float):
+        """Type one character at a time, sleeping interval between them."""
+        import pyautogui
+        pyautogui.write(text, interval=interval)
+
+    def send_batch(self, text: str):
+        """Submit every keystroke at once."""
+        if sys.platform == "win32":
+            _send_unicode(text)
+        else:
+            import pyautogui
+            pyautogui.write(text, interval=0)
+
+    def paste(self, text: str, settle: float, restore: bool):
+        """Put text on the clipboard and press ctrl+v, then put the old clipboard back."""
+        import pyautogui
+        import pyperclip
+        previous = pyperclip.paste() if restore else None
+        pyperclip.copy(text)
+        pyautogui.hotkey("ctrl", "v")
+        if restore:
+            # The target window reads the clipboard asynchronously after ctrl+v
+            time.sleep(settle)
+            pyperclip.copy(previous or "")
+
+
+def _send_unicode(text: str):
+    """Send text through one SendInput call as Unicode key events (Windows only)."""
+    import ctypes
+    from ctypes import wintypes
+
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_UNICODE = 0x0004
+    INPUT_KEYBOARD = 1
+    VK_RETURN = 0x0D
+
+    class KEYBDINPUT(ctypes.Structure):
+        _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))]
+
+    class MOUSEINPUT(ctypes.Structure):
+        _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                    ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                    ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))]
+
+    class _INPUTUNION(ctypes.Union):
+        # The mouse variant is the largest member, so it fixes the structure size
+        _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+
+    class INPUT(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("union", _INPUTUNION)]
+
+    events = []
+    for char in text:
+        if char == "\n":
+            events.append((VK_RETURN, 0, 0))
+            events.append((VK_RETURN, 0, KEYEVENTF_KEYUP))
+            continue
+        data = char.encode("utf-16-le")
+        # Characters outside the BMP are sent as their two surrogate halves
+        for i in range(0, len(data), 2):
+            unit = int.from_bytes(data[i:i + 2], "little")
+            events.append((0, unit, KEYEVENTF_UNICODE))
+            events.append((0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+
+    inputs = (INPUT * len(events))()
+    for slot, (vk, scan, flags) in zip(inputs, events):
+        slot.type = INPUT_KEYBOARD
+        slot.union.ki = KEYBDINPUT(vk, scan, flags, 0, None)
+    sent = ctypes.windll.user32.SendInput(len(events), inputs, ctypes.sizeof(INPUT))
+    if sent != len(events):
+        raise OSError(f"SendInput delivered {sent} of {len(events)} key events")
+
+
+class KeyInjector:
+    """Types text into the focused window in bulk, with per-character typing as the fallback.
+
+    paste puts the text on the clipboard and presses ctrl+v, so its cost does
+    not grow with the length. batch submits all key events in one call
+    (SendInput on Windows). chars types one key at a time with a pause in
+    between, for windows that drop fast input.
+    """
+
+    def __init__(self, sink=None, mode: str = "auto", paste_min_chars: int = 64,
+                 char_interval: float = 0.05, paste_settle: float = 0.05, restore_clipboard: bool = True):
+        """
+        Args:
+            sink: Object delivering the input; PyAutoGuiSink by default
+            mode: "auto", "paste", "batch" or "chars"
+            paste_min_chars: In auto mode, shorter text is batched instead of pasted
+            char_interval: Seconds between keys in chars mode
+            paste_settle: Seconds allowed for a paste to land before the clipboard is restored
+            restore_clipboard: Put the user's clipboard back after pasting
+        """
+        self.configure(sink, mode, paste_min_chars, char_interval, paste_settle, restore_clipboard)
+
+    def configure(self, sink=None, mode: str = "auto", paste_min_chars: int = 64,
+                  char_interval: float = 0.05, paste_settle: float = 0.05, restore_clipboard: bool = True):
+        """Apply settings; safe to call again, e.g. once the config file has been read."""
+        if mode != "auto" and mode not in MODES:
+            raise ValueError(f"Unknown typing mode: {mode}")
+        self.sink = sink if sink is not None else PyAutoGuiSink()
+        self.mode = mode
+        self.paste_min_chars = paste_min_chars
+        self.char_interval = char_interval
+        self.paste_settle = paste_settle
+        self.restore_clipboard = restore_clipboard
+
+    def pick_mode(self, text: str) -> str:
+        if self.mode != "auto":
+            return self.mode
+        return "paste" if len(text) >= self.paste_min_chars else "batch"
+
+    def type(self, text: str, mode: Optional[str] = None) -> str:
+        """Type text and return the mode that delivered it."""
+        mode = mode or self.pick_mode(text)
+        with tracer.span("type", mode=mode, chars=len(text)) as span:
+            for candidate in MODES[MODES.index(mode):]:
+                try:
+                    self._deliver(candidate, text)
+                    span.set("delivered", candidate)
+                    tracer.count("keys_typed", len(text))
+                    return candidate
+                except Exception as e:
+                    if candidate == MODES[-1]:
+                        raise
+                    logger.warning("Typing with %s failed, falling back: %s", candidate, e)
+
+    def _deliver(self, mode: str, text: str):
+        if mode == "paste":
+            self.sink.paste(text, self.paste_settle, self.restore_clipboard)
+        elif mode == "batch":
+            self.sink.send_batch(text)
+        else:
+            self.sink.write(text, self.char_interval)
+
+
+# Shared by the tools; configured from the "keyboard" config section
+injector = KeyInjector()
@@ -0,0 +1,178 @@
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, quote_plus
+from logger import logger
+from modules.cache import FILLER_WORDS
+from modules.memory import SessionState
+
+# Sites that can be opened by name
+SITES = {
+    "youtube": "https://www.youtube.com",
+    "google": "https://www.google.com",
+    "github": "https://github.com",
+    "gmail": "https://mail.google.com",
+    "spotify": "https://open.spotify.com",
+    "netflix": "https://www.netflix.com",
+    "reddit": "https://www.reddit.com",
+    "wikipedia": "https://www.wikipedia.org",
+    "twitter": "https://twitter.com",
+    "chatgpt": "https://chatgpt.com",
+}
+
+# Process names for apps that can be closed with taskkill
+PROCESSES = {
+    "brave": "brave.exe",
+}
+
+# Anything that chains several actions is left to the model
+COMPOUND = re.compile(r"\b(and|then|after|before|also)\b|,")
+
+# Where the payload sits in the command as typed. Filler words are only dropped
+# for matching; a query keeps every word the user said.
+RAW_QUERIES = {
+    "search": re.compile(r"\b(?:search|google)(?:\s+for)?\s+(?P<query>.+)$"),
+    "play": re.compile(r"\bplay\s+(?P<query>.+?)\s+on\s+spotify$"),
+}
+TRAILING = re.compile(r"(?:[\s.!?]|\bplease\b)+$")
+
+
+def normalize_intent(command: str) -> str:
+    """Normalize like the response cache does, but keep the dots inside domain names."""
+    text = re.sub(r"[^\w\s.]", " ", command.lower())
+    text = re.sub(r"\.(?=\s|$)|(?:^|\s)\.", " ", text)
+    return " ".join(w for w in text.split() if w not in FILLER_WORDS)
+
+
+# Step templates with the delays from the canonical templates in systemprompt.txt
+OPEN_BRAVE = [
+    {"command": "Shortcut", "parameters": "win", "delay": 1.2},
+    {"command": "Type", "parameters": "brave", "delay": 0.8},
+    {"command": "Shortcut", "parameters": "enter", "delay": 3},
+]
+OPEN_CMD = [
+    {"command": "Shortcut", "parameters": "win+r", "delay": 1},
+    {"command": "Type", "parameters": "cmd", "delay": 0.8},
+    {"command": "Shortcut", "parameters": "enter", "delay": 3},
+]
+
+
+class IntentMatcher:
+    """Turn simple, unambiguous commands into workflows without calling the model."""
+
+    def __init__(self, commands):
+        """
+        Args:
+            commands: Command names the agent can execute; intents needing others are disabled
+        """
+        self.commands = set(commands)
+        site_names = "|".join(sorted(SITES, key=len, reverse=True))
+        process_names = "|".join(sorted(PROCESSES, key=len, reverse=True))
+        table = [
+            (r"(?:set |change |turn )?volume (?:to |at )?(?P<level>\d{1,3})(?: percent)?", self._volume, {"Volume"}),
+            (r"(?:turn )?volume (?P<direction>up|down)|(?:turn )?(?P<direction2>up|down) volume", self._volume_step, {"Volume"}),
+            (r"(?:open|launch|start) brave(?: browser)?", self._open_brave, {"Shortcut", "Type"}),
+            (r"(?:open|launch|start) (?:cmd|command prompt)", self._open_cmd, {"Shortcut", "Type"}),
+            (rf"(?:open|go to|visit|launch) (?P<site>{site_names})", self._open_site, {"Shortcut", "Type", "Website"}),
+            (r"(?:open|go to|visit) (?P<domain>[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,})", self._open_domain, {"Shortcut", "Type", "Website"}),
+            (rf"(?:close|kill) (?P<app>{process_names})(?: browser)?", self._close_app, {"Shortcut", "Type"}),
+            (r"play (?P<query>.+) on spotify", self._play_spotify, {"Shortcut", "Type", "Website", "Play"}),
+            (r"(?:search|google) (?P<query>.+)", self._search, {"Shortcut", "Type", "Website"}),
+        ]
+        # Entries whose commands are not all registered can never fire
+        self.patterns: List = [
+            (re.compile(pattern), builder)
+            for pattern, builder, needs in table
+            if needs <= self.commands
+        ]
+
+    def match(self, command: str, state: SessionState) -> Optional[Dict[str, Any]]:
+        """Return a workflow for the command, or None if it should go to the model."""
+        if COMPOUND.search(command.lower()):
+            return None
+        normalized = normalize_intent(command)
+        matches = []
+        for pattern, builder in self.patterns:
+            found = pattern.fullmatch(normalized)
+            if found:
+                matches.append((builder, found))
+        if len(matches) != 1:
+            return None
+
+        builder, found = matches[0]
+        workflow = builder(found, state, command)
+        if not workflow:
+            return None
+        logger.info("Fast path matched '%s' (%s)", command, builder.__name__.lstrip('_'))
+        return {"workflow": workflow}
+
+    @staticmethod
+    def _ensure_brave(state: SessionState) -> List[Dict[str, Any]]:
+        return [] if state.brave_open else [dict(step) for step in OPEN_BRAVE]
+
+    @staticmethod
+    def _ensure_cmd(state: SessionState) -> List[Dict[str, Any]]:
+        return [] if state.cmd_open else [dict(step) for step in OPEN_CMD]
+
+    def _volume(self, found, state, command):
+        level = int(found.group("level"))
+        if level > 100:
+            return None
+        return [{"command": "Volume", "parameters": level, "delay": 1}]
+
+    def _volume_step(self, found, state, command):
+        # Only deterministic when we know where the volume is now
+        last = state.last_volume
+        if last is None:
+            return None
+        direction = found.group("direction") or found.group("direction2")
+        level = min(last + 10, 100) if direction == "up" else max(last - 10, 0)
+        return [{"command": "Volume", "parameters": level, "delay": 1}]
+
+    def _open_brave(self, found, state, command):
+        return [dict(step) for step in OPEN_BRAVE]
+
+    def _open_cmd(self, found, state, command):
+        return [dict(step) for step in OPEN_CMD]
+
+    def _website(self, url, state):
+        return self._ensure_brave(state) + [{"command": "Website", "parameters": url, "delay": 3}]
+
+    def _open_site(self, found, state, command):
+        return self._website(SITES[found.group("site")], state)
+
+    def _open_domain(self, found, state, command):
+        return self._website(f"https://{found.group('domain')}", state)
+
+    def _close_app(self, found, state, command):
+        process = PROCESSES[found.group("app")]
+        return self._ensure_cmd(state) + [
+            {"command": "Type", "parameters": f"taskkill /IM {process} /F", "delay": 0.8},
+            {"command": "Shortcut", "parameters": "enter", "delay": 1.2},
+        ]
+
+    @staticmethod
+    def _raw_query(kind: str, command: str, found) -> Optional[str]:
+        """The query as the user typed it, lowercased and trimmed.
+
+        None unless it normalizes to the query that matched, so an unusual
+        phrasing goes to the model instead of searching for the wrong words.
+        """
+        raw = RAW_QUERIES[kind].search(TRAILING.sub("", command.lower().strip()))
+        if raw is None:
+            return None
+        query = raw.group("query").strip()
+        return query if normalize_intent(query) == found.group("query") else None
+
+    def _play_spotify(self, found, state, command):
+        query = self._raw_query("play", command, found)
+        if query is None:
+            return None
+        url = "https://open.spotify.com/search/" + quote(query)
+        return self._website(url, state) + [{"command": "Play", "parameters": "spotify", "delay": 2}]
+
+    def _search(self, found, state, command):
+        query = self._raw_query("search", command, found)
+        if query is None:
+            return None
+        url = "https://www.google.com/search?q=" + quote_plus(query)
+        return self._website(url, state)
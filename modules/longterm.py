@@ -0,0 +1,243 @@
+import dbm
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+from logger import logger
+from modules.cache import FILLER_WORDS
+
+# Postings kept per keyword; older occurrences of very common words are dropped
+MAX_POSTINGS = 1000
+# Index key recording how many bytes of the log have been indexed
+INDEXED_KEY = b"\x00indexed"
+
+
+def keywords(text: str) -> List[str]:
+    """Split a command into the distinct words worth indexing."""
+    seen = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 1 and word not in FILLER_WORDS and word not in seen:
+            seen.append(word)
+    return seen
+
+
+def summarize_workflow(response: Dict[str, Any], limit: int = 200) -> str:
+    """Render a workflow as a short one-line description of its steps."""
+    steps = response.get("workflow") if isinstance(response, dict) else None
+    if not isinstance(steps, list):
+        return ""
+    text = ", ".join(
+        f"{step.get('command')} {step.get('parameters')}" for step in steps if isinstance(step, dict)
+    )
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class LongTermStore:
+    """Append-only log of past commands with an on-disk inverted index.
+
+    Every planned command is appended to a JSON-lines log. A dbm file maps each
+    keyword to the byte offsets of the records containing it, so retrieval only
+    touches the postings of the query's words and the few records it returns.
+    The log is memory-mapped rather than parsed, so startup cost does not grow
+    with its length.
+    """
+
+    def __init__(self, path: str = "cache/longterm.log", top_k: int = 3):
+        """
+        Args:
+            path: Log file; the index is kept next to it with an .idx suffix
+            top_k: Past commands returned per query
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._log = open(path, "ab")
+        self._index = dbm.open(self.index_path, "c")
+        self._terminate_torn_record()
+        self._catch_up()
+
+    def _catch_up(self) -> None:
+        """Index records the index has not seen, e.g. after a crash between the two writes."""
+        size = os.path.getsize(self.path)
+        indexed = int(self._index.get(INDEXED_KEY, b"0"))
+        if indexed > size:
+            # The log was truncated or replaced; the index no longer matches it
+            logger.warning("Long-term index is ahead of %s, rebuilding it", self.path)
+            self._index.close()
+            self._index = dbm.open(self.index_path, "n")
+            indexed = 0
+        if indexed == size:
+            return
+
+        self._remap()
+        offset = indexed
+        while offset < size:
+            end = self._map.find(b"\n", offset)
+            if end == -1:
+                break
+            try:
+                record = json.loads(self._map[offset:end])
+                self._add_postings(keywords(record.get("command", "")), offset)
+            except ValueError:
+                logger.warning("Skipping unreadable long-term record at byte %d", offset)
+            offset = end + 1
+        self._mark_indexed(offset)
+        logger.info("Indexed %d bytes of long-term memory", offset - indexed)
+
+    def _terminate_torn_record(self) -> None:
+        """End a record cut short by a crash, so it cannot merge with the next one."""
+        size = self._log.tell()
+        if size == 0:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                self._log.write(b"\n")
+                self._log.flush()
+
+    def _remap(self) -> None:
+        """Map the log again so records appended since the last mapping are visible."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _add_postings(self, words: Iterable[str], offset: int) -> None:
+        for word in words:
+            key = word.encode()
+            postings = array("Q")
+            if key in self._index:
+                postings.frombytes(self._index[key])
+            if postings and postings[-1] >= offset:
+                # Already indexed before a crash that lost the INDEXED_KEY update
+                continue
+            postings.append(offset)
+            if len(postings) > MAX_POSTINGS:
+                postings = postings[-MAX_POSTINGS:]
+            self._index[key] = postings.tobytes()
+
+    def _mark_indexed(self, offset: int) -> None:
+        """Record that the log is indexed up to offset, once the postings for it are on disk.
+
+        dbm.dumb (the fallback on Windows) keeps its key directory in memory
+        until sync(), so without the first sync a crash could leave the mark
+        pointing past postings that were never written.
+        """
+        sync = getattr(self._index, "sync", None)
+        if sync is not None:
+            sync()
+        self._index[INDEXED_KEY] = str(offset).encode()
+        if sync is not None:
+            sync()
+
+    def append(self, command: str, response: Dict[str, Any]) -> None:
+        """Record a command and the workflow planned for it."""
+        summary = summarize_workflow(response)
+        if not summary:
+            return
+        record = json.dumps({"time": int(time.time()), "command": command, "workflow": summary})
+        with self._lock:
+            try:
+                offset = self._log.tell()
+                self._log.write(record.encode("utf-8") + b"\n")
+                self._log.flush()
+                self._add_postings(keywords(command), offset)
+                self._mark_indexed(self._log.tell())
+            except OSError as e:
+                logger.error("Could not append to long-term memory: %s", e)
+
+    def search(self, query: str, k: int = None, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Return up to k past records sharing the most keywords with query, newest first on ties."""
+        k = self.top_k if k is None else k
+        words = keywords(query)
+        if not words or k <= 0:
+            return []
+        skip = {c.strip().lower() for c in exclude}
+
+        with self._lock:
+            scores: Dict[int, int] = {}
+            for word in words:
+                raw = self._index.get(word.encode())
+                if raw is None:
+                    continue
+                postings = array("Q")
+                postings.frombytes(raw)
+                for offset in postings:
+                    scores[offset] = scores.get(offset, 0) + 1
+            if not scores:
+                return []
+
+            if self._map is None or max(scores) >= len(self._map):
+                self._remap()
+            results = []
+            seen = set()
+            for offset in sorted(scores, key=lambda o: (scores[o], o), reverse=True):
+                end = self._map.find(b"\n", offset)
+                try:
+                    record = json.loads(self._map[offset:end])
+                except ValueError:
+                    continue
+                command = record.get("command", "").strip().lower()
+                if command in skip or command in seen:
+                    continue
+                seen.add(command)
+                results.append(record)
+                if len(results) >= k:
+                    break
+            return results
+
+    def commands(self, limit: Optional[int] = None) -> List[str]:
+        """The last limit logged commands, or all of them if limit is None, oldest first.
+
+        Records are read backwards from the end of the log, so a small limit
+        stays cheap however long the log grows.
+        """
+        with self._lock:
+            self._remap()
+            if self._map is None:
+                return []
+            commands = []
+            end = len(self._map)
+            while end > 0 and (limit is None or len(commands) < limit):
+                start = self._map.rfind(b"\n", 0, end - 1) + 1
+                try:
+                    commands.append(json.loads(self._map[start:end]).get("command", ""))
+                except ValueError:
+                    pass
+                end = start
+            commands.reverse()
+            return commands
+
+    def context_for(self, command: str, history: Iterable[Dict[str, str]] = ()) -> str:
+        """Format the past commands relevant to command as a prompt section.
+
+        Commands still in the short-term history are skipped, since the model
+        already sees them.
+        """
+        recent = [m.get("content", "") for m in history if m.get("role") == "user"]
+        records = self.search(command, exclude=recent + [command])
+        if not records:
+            return ""
+        lines = [f"- \"{r['command']}\" -> {r['workflow']}" for r in records]
+        return "## Related Past Commands\n" + "\n".join(lines)
+
+    def close(self) -> None:
+        """Close the log, index and mapping."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._log.close()
+            self._index.close()
@@ -1,173 +1,262 @@
 import json
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import Callable, Deque, List, Dict, Any, Optional
 from logger import logger
 
+
+class SessionState:
+    """What the agent believes is open on the machine, updated incrementally.
+
+    Tabs and recent sites are bounded deques with a set alongside for O(1)
+    duplicate checks, so a long session keeps a fixed footprint. The summary
+    string is rebuilt only after something changed.
+    """
+
+    __slots__ = ("brave_open", "cmd_open", "spotify_active", "last_volume",
+                 "open_tabs", "recent_websites", "_tab_set", "_recent_set", "_summary")
+
+    def __init__(self, max_tabs: int = 20, max_recent: int = 10):
+        """
+        Args:
+            max_tabs: Open tabs remembered; the oldest is forgotten beyond this
+            max_recent: Recently visited sites remembered
+        """
+        self.brave_open = False
+        self.cmd_open = False
+        self.spotify_active = False
+        self.last_volume: Optional[int] = None
+        self.open_tabs: Deque[str] = deque(maxlen=max_tabs)
+        self.recent_websites: Deque[str] = deque(maxlen=max_recent)
+        self._tab_set = set()
+        self._recent_set = set()
+        self._summary: Optional[str] = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style read access, for callers that treat the state as a mapping."""
+        if key.startswith("_") or key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def reset(self) -> None:
+        """Forget everything; nothing is believed to be open."""
+        self.brave_open = False
+        self.cmd_open = False
+        self.spotify_active = False
+        self.last_volume = None
+        self.open_tabs.clear()
+        self.recent_websites.clear()
+        self._tab_set.clear()
+        self._recent_set.clear()
+        self._summary = None
+
+    def open_brave(self) -> None:
+        if not self.brave_open:
+            self.brave_open = True
+            self._summary = None
+
+    def close_brave(self) -> None:
+        if self.brave_open or self.open_tabs or self.spotify_active:
+            self.brave_open = False
+            self.spotify_active = False
+            self.open_tabs.clear()
+            self._tab_set.clear()
+            self._summary = None
+
+    def open_cmd(self) -> None:
+        if not self.cmd_open:
+            self.cmd_open = True
+            self._summary = None
+
+    def close_cmd(self) -> None:
+        if self.cmd_open:
+            self.cmd_open = False
+            self._summary = None
+
+    def set_volume(self, level: int) -> None:
+        if level != self.last_volume:
+            self.last_volume = level
+            self._summary = None
+
+    def visit(self, url: str) -> None:
+        """Record a website opened in a tab."""
+        self._push(self.open_tabs, self._tab_set, url)
+        self._push(self.recent_websites, self._recent_set, url)
+        if "spotify.com" in url.lower():
+            self.spotify_active = True
+        self._summary = None
+
+    @staticmethod
+    def _push(items: Deque[str], seen: set, url: str) -> None:
+        """Append url as the newest entry, keeping entries unique within the bound."""
+        if url in seen:
+            if items[-1] == url:
+                return
+            # Bounded by maxlen, so this stays cheap however long the session runs
+            items.remove(url)
+        elif len(items) == items.maxlen:
+            seen.discard(items.popleft())
+        items.append(url)
+        seen.add(url)
+
+    def summary(self) -> str:
+        """Return a human-readable summary, cached until the state changes."""
+        if self._summary is None:
+            self._summary = self._build_summary()
+        return self._summary
+
+    def _build_summary(self) -> str:
+        summary_parts = []
+
+        if self.brave_open:
+            summary_parts.append("Brave browser is currently open")
+
+        if self.cmd_open:
+            summary_parts.append("Command prompt (CMD) is currently open")
+
+        if self.spotify_active:
+            summary_parts.append("Spotify is currently active in browser")
+
+        if self.open_tabs:
+            summary_parts.append(f"Open browser tabs: {', '.join(self.open_tabs)}")
+
+        if self.last_volume is not None:
+            summary_parts.append(f"System volume is set to {self.last_volume}%")
+
+        if self.recent_websites:
+            recent = list(self.recent_websites)[-3:]  # Last 3 websites
+            summary_parts.append(f"Recently visited: {', '.join(recent)}")
+
+        if not summary_parts:
+            return "No applications or browser tabs are currently open."
+
+        return " | ".join(summary_parts)
+
+    def signature(self) -> str:
+        """Short key for what is open, which decides how long launches and page loads take."""
+        return f"brave={int(self.brave_open)},cmd={int(self.cmd_open)},spotify={int(self.spotify_active)}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return a plain snapshot of the state."""
+        return {
+            "brave_open": self.brave_open,
+            "cmd_open": self.cmd_open,
+            "spotify_active": self.spotify_active,
+            "open_tabs": list(self.open_tabs),
+            "last_volume": self.last_volume,
+            "recent_websites": list(self.recent_websites)
+        }
+
+
 class Memory:
     """Session memory manager for conversation history and system state tracking."""
-    
-    def __init__(self, max_interactions: int = 10):
+
+    def __init__(self, max_interactions: int = 10, max_tabs: int = 20, max_recent: int = 10):
         """
         Initialize memory with conversation history and system state.
-        
+
         Args:
             max_interactions: Maximum number of user-assistant exchanges to keep (default: 10)
+            max_tabs: Open tabs remembered in the system state
+            max_recent: Recently visited sites remembered in the system state
         """
         self.max_interactions = max_interactions
-        self.conversation_history: List[Dict[str, str]] = []
-        self.system_state: Dict[str, Any] = {
-            "brave_open": False,
-            "cmd_open": False,
-            "spotify_active": False,
-            "open_tabs": [],
-            "last_volume": None,
-            "recent_websites": []
+        # The deque drops the oldest message itself, so the window never needs re-slicing
+        self.conversation_history: Deque[Dict[str, str]] = deque(maxlen=max_interactions * 2)
+        self.system_state = SessionState(max_tabs, max_recent)
+        # Workflow command -> state update for one step
+        self._step_handlers: Dict[str, Callable[[Any], None]] = {
+            "Type": self._apply_type,
+            "Website": self._apply_website,
+            "Volume": self._apply_volume,
         }
-        
+        # Typed text (lowercased) -> state update; the Start menu or Run box opens these apps
+        self._typed_apps: Dict[str, Callable[[], None]] = {
+            "brave": self.system_state.open_brave,
+            "cmd": self.system_state.open_cmd,
+        }
+
     def add_user_message(self, command: str) -> None:
         """Add user command to conversation history."""
         self.conversation_history.append({
             "role": "user",
             "content": command
         })
-        logger.debug(f"Added user message to memory: {command}")
-        
+        logger.debug("Added user message to memory: %s", command)
+
     def add_assistant_response(self, response: Dict[str, Any]) -> None:
         """Add AI response to conversation history and extract state changes."""
-        # Add assistant response to history
+        # Add assistant response to history; the window is kept by the deque
         self.conversation_history.append({
-            "role": "assistant", 
+            "role": "assistant",
             "content": json.dumps(response)
         })
-        
+
         # Extract state changes from workflow
         workflow = response.get("workflow", [])
         if workflow:
             self.extract_state_from_workflow(workflow)
-            
-        # Maintain sliding window
-        self._maintain_sliding_window()
-        
-        logger.debug(f"Added assistant response to memory and updated state")
-        
+
+        logger.debug("Added assistant response to memory and updated state")
+
     def get_context_messages(self) -> List[Dict[str, str]]:
         """Return conversation history within the sliding window for API context."""
-        return self.conversation_history.copy()
-        
+        return list(self.conversation_history)
+
     def get_state_summary(self) -> str:
         """Return human-readable summary of current system state."""
-        summary_parts = []
-        
-        if self.system_state["brave_open"]:
-            summary_parts.append("Brave browser is currently open")
-            
-        if self.system_state["cmd_open"]:
-            summary_parts.append("Command prompt (CMD) is currently open")
-            
-        if self.system_state["spotify_active"]:
-            summary_parts.append("Spotify is currently active in browser")
-            
-        if self.system_state["open_tabs"]:
-            tabs_str = ", ".join(self.system_state["open_tabs"])
-            summary_parts.append(f"Open browser tabs: {tabs_str}")
-            
-        if self.system_state["last_volume"] is not None:
-            summary_parts.append(f"System volume is set to {self.system_state['last_volume']}%")
-            
-        if self.system_state["recent_websites"]:
-            recent_str = ", ".join(self.system_state["recent_websites"][-3:])  # Last 3 websites
-            summary_parts.append(f"Recently visited: {recent_str}")
-            
-        if not summary_parts:
-            return "No applications or browser tabs are currently open."
-            
-        return " | ".join(summary_parts)
-        
+        return self.system_state.summary()
+
     def extract_state_from_workflow(self, workflow: List[Dict[str, Any]]) -> None:
         """Parse workflow commands to update system state."""
-        try:
-            for step in workflow:
-                command = step.get("command", "").strip()
-                parameters = step.get("parameters", "")
-                
-                if command == "Shortcut" and parameters == "win":
-                    # Windows key pressed - might be opening something
-                    continue
-                    
-                elif command == "Type":
-                    if parameters.lower() == "brave":
-                        # Brave is being opened
-                        self.system_state["brave_open"] = True
-                        logger.debug("State updated: Brave browser opened")
-                        
-                    elif parameters.lower() == "cmd":
-                        # CMD is being opened
-                        self.system_state["cmd_open"] = True
-                        logger.debug("State updated: CMD opened")
-                        
-                elif command == "Shortcut" and parameters == "enter":
-                    # Enter pressed - confirm previous Type command
-                    continue
-                    
-                elif command == "Website":
-                    if isinstance(parameters, str) and parameters.startswith("https://"):
-                        # Track opened website
-                        self.system_state["open_tabs"].append(parameters)
-                        self.system_state["recent_websites"].append(parameters)
-                        
-                        # Check if it's Spotify
-                        if "spotify.com" in parameters.lower():
-                            self.system_state["spotify_active"] = True
-                            logger.debug("State updated: Spotify activated")
-                            
-                        logger.debug(f"State updated: Website opened - {parameters}")
-                        
-                elif command == "Volume":
-                    if isinstance(parameters, (int, float)):
-                        self.system_state["last_volume"] = int(parameters)
-                        logger.debug(f"State updated: Volume set to {parameters}%")
-                        
-                elif command == "Type" and "taskkill" in str(parameters).lower():
-                    # App is being closed
-                    if "brave" in str(parameters).lower():
-                        self.system_state["brave_open"] = False
-                        self.system_state["open_tabs"] = []
-                        self.system_state["spotify_active"] = False
-                        logger.debug("State updated: Brave browser closed")
-                        
-                    elif "cmd" in str(parameters).lower():
-                        self.system_state["cmd_open"] = False
-                        logger.debug("State updated: CMD closed")
-                        
-        except Exception as e:
-            logger.error(f"Error extracting state from workflow: {e}")
-            
-    def _maintain_sliding_window(self) -> None:
-        """Keep only the last max_interactions user-assistant exchanges."""
-        max_messages = self.max_interactions * 2  # user + assistant pairs
-        
-        if len(self.conversation_history) > max_messages:
-            # Remove oldest messages
-            messages_to_remove = len(self.conversation_history) - max_messages
-            self.conversation_history = self.conversation_history[messages_to_remove:]
-            logger.debug(f"Trimmed conversation history to last {self.max_interactions} interactions")
-            
+        handlers = self._step_handlers
+        for step in workflow:
+            if not isinstance(step, dict):
+                continue
+            handler = handlers.get(str(step.get("command", "")).strip())
+            if handler is None:
+                # Shortcuts and the rest do not change what is open
+                continue
+            try:
+                handler(step.get("parameters", ""))
+            except Exception as e:
+                logger.error("Error extracting state from workflow step %s: %s", step, e)
+
+    def _apply_type(self, parameters: Any) -> None:
+        text = str(parameters).strip().lower()
+        if "taskkill" in text:
+            # App is being closed
+            if "brave" in text:
+                self.system_state.close_brave()
+                logger.debug("State updated: Brave browser closed")
+            elif "cmd" in text:
+                self.system_state.close_cmd()
+                logger.debug("State updated: CMD closed")
+            return
+        opener = self._typed_apps.get(text)
+        if opener is not None:
+            opener()
+            logger.debug("State updated: %s opened", text)
+
+    def _apply_website(self, parameters: Any) -> None:
+        if isinstance(parameters, str) and parameters.startswith("https://"):
+            self.system_state.visit(parameters)
+            logger.debug("State updated: Website opened - %s", parameters)
+
+    def _apply_volume(self, parameters: Any) -> None:
+        if isinstance(parameters, (int, float)) and not isinstance(parameters, bool):
+            self.system_state.set_volume(int(parameters))
+            logger.debug("State updated: Volume set to %s%%", parameters)
+
     def clear_memory(self) -> None:
         """Clear all conversation history and reset system state."""
-        self.conversation_history = []
-        self.system_state = {
-            "brave_open": False,
-            "cmd_open": False,
-            "spotify_active": False,
-            "open_tabs": [],
-            "last_volume": None,
-            "recent_websites": []
-        }
+        self.conversation_history.clear()
+        self.system_state.reset()
         logger.info("Memory cleared")
-        
+
     def get_memory_stats(self) -> Dict[str, Any]:
         """Return statistics about current memory usage."""
         return {
             "conversation_messages": len(self.conversation_history),
             "max_interactions": self.max_interactions,
-            "system_state": self.system_state.copy()
+            "system_state": self.system_state.as_dict()
         }
@@ -0,0 +1,194 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from logger import logger
+from modules.cache import normalize_command
+
+
+class CommandPredictor:
+    """First-order Markov model over normalized commands, persisted between sessions."""
+
+    def __init__(self, path: Optional[str] = "cache/predictor.json",
+                 history: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Args:
+            path: File the transitions are saved to
+            history: Returns past commands, oldest first, to seed from on the first observe()
+        """
+        self.path = path
+        self.history = history
+        self.transitions: Dict[str, Counter] = defaultdict(Counter)
+        # Most recent raw phrasing of each normalized command, used when prefetching it
+        self.phrasings: Dict[str, str] = {}
+        self.last: Optional[str] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def seed(self, commands: Iterable[str]) -> None:
+        """Learn from past commands, oldest first, unless transitions were already loaded."""
+        if self.transitions:
+            return
+        for command in commands:
+            self.observe(command, save=False)
+        with self._lock:
+            # The session's first command does not follow the last logged one
+            self.last = None
+            if self.transitions:
+                self._save()
+
+    def observe(self, command: str, save: bool = True) -> None:
+        """Record that command followed the previous one."""
+        if self.history is not None:
+            history, self.history = self.history, None
+            self.seed(history())
+        key = normalize_command(command)
+        if not key:
+            return
+        with self._lock:
+            if self.last is not None:
+                self.transitions[self.last][key] += 1
+            self.phrasings[key] = command
+            self.last = key
+            if save:
+                self._save()
+
+    def predict(self, command: str, k: int = 1) -> List[Tuple[str, float]]:
+        """Return up to k likely next commands (raw phrasing) with their probabilities."""
+        key = normalize_command(command)
+        with self._lock:
+            followers = self.transitions.get(key)
+            if not followers:
+                return []
+            total = sum(followers.values())
+            return [(self.phrasings[nxt], count / total) for nxt, count in followers.most_common(k)]
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Could not load command predictor from %s: %s", self.path, e)
+            return
+        for key, followers in data.get("transitions", {}).items():
+            self.transitions[key].update(followers)
+        self.phrasings.update(data.get("phrasings", {}))
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"transitions": self.transitions, "phrasings": self.phrasings}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Could not save command predictor to %s: %s", self.path, e)
+
+
+class Prefetcher:
+    """Speculatively plans the likely next command while the current workflow executes.
+
+    Predictions are stored briefly, keyed on the command and the session state
+    they were planned for. The next command either confirms one, and gets its
+    plan instantly, or all pending predictions are discarded.
+    """
+
+    def __init__(self, fetch: Callable[[str, Any], Optional[Dict[str, Any]]], warm_up: Callable[[], None],
+                 predictor: CommandPredictor = None, min_probability: float = 0.5,
+                 max_predictions: int = 1, ttl: float = 60):
+        """
+        Args:
+            fetch: Plans a command against a Memory snapshot; returns None if it failed
+            warm_up: Keeps the backend warm when no prediction is confident enough
+            predictor: Source of next-command predictions
+            min_probability: Predictions below this only warm up the backend
+            max_predictions: Plans requested per command
+            ttl: Seconds a speculative plan stays usable
+        """
+        self.fetch = fetch
+        self.warm_up = warm_up
+        self.predictor = predictor or CommandPredictor()
+        self.min_probability = min_probability
+        self.max_predictions = max_predictions
+        self.ttl = ttl
+        self._plans: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"speculated": 0, "hits": 0, "misses": 0, "discarded": 0, "warm_ups": 0}
+
+    def take(self, command: str, state_summary: str) -> Optional[Dict[str, Any]]:
+        """Return the speculative plan for this command, and discard every other prediction."""
+        key = (normalize_command(command), state_summary)
+        with self._lock:
+            # Anything still in flight belongs to the previous turn and must not be stored
+            self._generation += 1
+            entry = self._plans.pop(key, None)
+            self._stats["discarded"] += len(self._plans)
+            self._plans.clear()
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._stats["hits"] += 1
+                logger.info("Prefetch hit for '%s'", command)
+                return entry[1]
+            self._stats["misses"] += 1
+            return None
+
+    def speculate(self, command: str, memory) -> None:
+        """Start planning the likely next commands in the background.
+
+        memory must already reflect the plan for command, since the next
+        command will be planned against that state.
+        """
+        self.predictor.observe(command)
+        predictions = [
+            (nxt, p) for nxt, p in self.predictor.predict(command, self.max_predictions)
+            if p >= self.min_probability
+        ]
+        with self._lock:
+            generation = self._generation
+
+        if not predictions:
+            self._stats["warm_ups"] += 1
+            threading.Thread(target=self._warm, name="prefetch-warmup", daemon=True).start()
+            return
+
+        snapshot = copy.deepcopy(memory)
+        for nxt, probability in predictions:
+            logger.debug("Prefetching '%s' after '%s' (p=%.2f)", nxt, command, probability)
+            threading.Thread(target=self._fetch, args=(nxt, snapshot, generation), name="prefetch", daemon=True).start()
+
+    def _warm(self):
+        try:
+            self.warm_up()
+        except Exception as e:
+            logger.debug("Prefetch warm-up failed: %s", e)
+
+    def _fetch(self, command: str, snapshot, generation: int):
+        try:
+            plan = self.fetch(command, snapshot)
+        except Exception as e:
+            logger.debug("Prefetch of '%s' failed: %s", command, e)
+            return
+        if plan is None:
+            return
+        key = (normalize_command(command), snapshot.get_state_summary())
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._plans[key] = (time.monotonic(), plan)
+            self._stats["speculated"] += 1
+
+    def get_prefetch_stats(self) -> Dict[str, Any]:
+        """Return counters for speculative plans."""
+        with self._lock:
+            return dict(self._stats)
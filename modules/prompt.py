@@ -0,0 +1,99 @@
+import math
+import os
+from typing import Dict, List, Sequence
+from logger import logger
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Rough token count; about four characters per token for English text and JSON."""
+    return math.ceil(len(text) / chars_per_token)
+
+
+class PromptBuilder:
+    """Assemble chat messages from a cached system prompt and a token-budgeted history.
+
+    The system prompt is the first message and is kept byte-identical between
+    calls, followed by history in chronological order, so providers that reuse
+    a cached prompt prefix (Ollama's KV cache, upstream prompt caching) can skip
+    re-processing it. Everything that changes per command goes in the last message.
+    """
+
+    # Per-message overhead of the chat template (role markers, separators)
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, path: str = "systemprompt.txt", history_token_budget: int = 1500,
+                 chars_per_token: float = 4.0):
+        """
+        Args:
+            path: File holding the system prompt
+            history_token_budget: Estimated tokens of conversation history sent with each command
+            chars_per_token: Characters per token used for estimates
+        """
+        self.path = path
+        self.history_token_budget = history_token_budget
+        self.chars_per_token = chars_per_token
+        self._system_prompt = ""
+        self._mtime = None
+        self._missing = False
+
+    def system_prompt(self) -> str:
+        """Return the system prompt, re-reading the file only when it has changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            # Keep using the last prompt we had, and only complain once
+            if not self._missing:
+                print(f"{self.path} not found")
+                logger.warning("%s not found", self.path)
+                self._missing = True
+            self._mtime = None
+            return self._system_prompt
+
+        if mtime != self._mtime:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._system_prompt = f.read().strip()
+            self._mtime = mtime
+            self._missing = False
+            logger.info("Loaded system prompt from %s (%d tokens)", self.path, estimate_tokens(self._system_prompt))
+        return self._system_prompt
+
+    def build(self, command: str, state_summary: str, history: Sequence[Dict[str, str]],
+              extra_context: str = "") -> List[Dict[str, str]]:
+        """Build the message list for a command.
+
+        history is the conversation as stored in Memory. If its last entry is the
+        command itself (Memory records it before the model is called), it is not
+        repeated.
+        """
+        messages = [{"role": "system", "content": self.system_prompt()}]
+        messages.extend(self.trim_history(history, command))
+
+        sections = [f"## Current Session State\n{state_summary}"]
+        if extra_context:
+            sections.append(extra_context)
+        sections.append(f"User command: {command}")
+        messages.append({"role": "user", "content": "\n\n".join(sections)})
+        return messages
+
+    def trim_history(self, history: Sequence[Dict[str, str]], command: str = None) -> List[Dict[str, str]]:
+        """Return the most recent history that fits the token budget, oldest first."""
+        kept = []
+        used = 0
+        skip_current = command is not None
+        # Walk newest to oldest without copying the whole history
+        for message in reversed(history):
+            if skip_current:
+                skip_current = False
+                if message.get("role") == "user" and message.get("content") == command:
+                    continue
+            cost = estimate_tokens(message.get("content", ""), self.chars_per_token) + self.MESSAGE_OVERHEAD
+            if used + cost > self.history_token_budget:
+                break
+            kept.append(message)
+            used += cost
+
+        kept.reverse()
+        # Start on a user turn so the model never sees an answer without its question
+        while kept and kept[0].get("role") != "user":
+            kept.pop(0)
+        return kept
@@ -0,0 +1,97 @@
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from logger import logger
+
+# Workflow command -> (handler, optional warm-up that initializes its heavy resources),
+# both as "module:attribute" so nothing is imported until first use
+TOOL_SPECS: Dict[str, Tuple[str, Optional[str]]] = {
+    "Volume": ("modules.tools:volume_control", "modules.tools:get_volume_interface"),
+    "Type": ("modules.tools:type_text", None),
+    "Shortcut": ("modules.tools:shortcut", None),
+    "Play": ("modules.tools:play", "modules.tools:prepare_play"),
+    "Website": ("modules.tools:Website", None),
+}
+
+
+def resolve(spec: str):
+    """Import "package.module:attribute" and return the attribute."""
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class ToolRegistry(Mapping):
+    """Command handlers that are imported on first use.
+
+    Behaves like the plain dict of handlers it replaces. Looking up a command
+    imports its module the first time; membership, iteration and len only
+    use the command names, so validation never triggers an import.
+    """
+
+    def __init__(self, specs: Dict[str, Tuple[str, Optional[str]]] = None):
+        """
+        Args:
+            specs: Command name -> (handler spec, warm-up spec or None)
+        """
+        self.specs = dict(TOOL_SPECS if specs is None else specs)
+        self._handlers: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+        # Seconds spent importing each handler, for startup diagnostics
+        self.load_times: Dict[str, float] = {}
+
+    def __getitem__(self, command: str) -> Callable:
+        handler = self._handlers.get(command)
+        if handler is not None:
+            return handler
+        if command not in self.specs:
+            raise KeyError(command)
+        with self._lock:
+            handler = self._handlers.get(command)
+            if handler is None:
+                started = time.perf_counter()
+                handler = resolve(self.specs[command][0])
+                self.load_times[command] = time.perf_counter() - started
+                self._handlers[command] = handler
+                logger.debug("Loaded %s handler in %.1f ms", command, self.load_times[command] * 1000)
+        return handler
+
+    def __contains__(self, command) -> bool:
+        return command in self.specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def get(self, command, default=None):
+        """Return the handler, or default if the command is unknown or its module cannot load."""
+        if command not in self.specs:
+            return default
+        try:
+            return self[command]
+        except Exception as e:
+            logger.error("Could not load handler for %s: %s", command, e)
+            return default
+
+    def preload(self, background: bool = True):
+        """Import every handler and run its warm-up, so first use is instant."""
+        def _preload():
+            started = time.perf_counter()
+            for command, (_, warm_spec) in self.specs.items():
+                handler = self.get(command)
+                if handler is None or warm_spec is None:
+                    continue
+                try:
+                    resolve(warm_spec)()
+                except Exception as e:
+                    # A missing audio device or OCR engine only affects its own command
+                    logger.warning("Warm-up for %s failed: %s", command, e)
+            logger.info("Preloaded tools in %.2f s", time.perf_counter() - started)
+
+        if background:
+            threading.Thread(target=_preload, name="tools-preload", daemon=True).start()
+        else:
+            _preload()
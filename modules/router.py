@@ -0,0 +1,312 @@
+import bisect
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import requests
+from logger import logger
+from tracing import tracer, DEFAULT_BUCKETS
+from modules.backends import Backend
+
+# Words that join several actions or apps into one request
+STEP_JOINERS = re.compile(r"\b(?:and|then|after|before|also|while|plus)\b|[,;&]", re.IGNORECASE)
+COMMAND_LINE = re.compile(r"User command: (.*)\s*$")
+
+
+def command_complexity(command: str) -> int:
+    """Rough number of extra actions a command asks for; 0 means one simple action."""
+    score = len(STEP_JOINERS.findall(command))
+    if len(command.split()) > 12:
+        score += 1
+    return score
+
+
+def command_from_messages(messages: List[Dict[str, str]]) -> str:
+    """The user command in the last message, as PromptBuilder formats it."""
+    content = messages[-1].get("content", "") if messages else ""
+    match = COMMAND_LINE.search(content)
+    return match.group(1).strip() if match else content
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with quantile estimates, safe across threads.
+
+    Requests abandoned before they finished are kept apart as censored
+    samples: their latency is only known to be longer than the time they ran.
+    Quantiles use the Kaplan-Meier estimate over the buckets, so losing a race
+    pushes a backend's quantiles up instead of being ignored.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the overflow beyond the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.censored = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.censored_total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def samples(self) -> int:
+        return self.total + self.censored_total
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+
+    def observe_censored(self, seconds: float) -> None:
+        """Record a request cancelled after seconds, which would have taken at least that long."""
+        with self._lock:
+            self.censored[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.censored_total += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-th quantile by interpolating within its bucket, or None without finished samples."""
+        with self._lock:
+            if not self.total:
+                return None
+            at_risk = self.samples
+            survival = 1.0
+            for idx, count in enumerate(self.counts):
+                if count:
+                    before = survival
+                    survival *= 1 - count / at_risk
+                    if 1 - survival >= q:
+                        if idx == len(self.buckets):
+                            # Overflow has no upper bound; report the largest one we know
+                            return self.buckets[-1]
+                        lower = self.buckets[idx - 1] if idx else 0.0
+                        return lower + (self.buckets[idx] - lower) * (q - (1 - before)) / (before - survival)
+                # Requests cancelled in this bucket drop out of the ones still waiting
+                at_risk -= count + self.censored[idx]
+            # Too many requests were cut short to place the quantile; all that is
+            # known is that it lies past the longest request seen, finished or not
+            longest = max(idx for idx in range(len(self.counts)) if self.counts[idx] or self.censored[idx])
+            return self.buckets[min(longest, len(self.buckets) - 1)]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.total,
+            "censored": self.censored_total,
+            "mean": self.sum / self.total if self.total else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9)
+        }
+
+
+class _Attempt:
+    """One streamed request to one backend, which can be abandoned mid-flight."""
+
+    def __init__(self, backend: Backend, messages: List[Dict[str, str]], results: "queue.SimpleQueue"):
+        self.backend = backend
+        self.messages = messages
+        self.results = results
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+        self._response: Optional[requests.Response] = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name=f"route-{backend.name}", daemon=True).start()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        outcome = None
+        try:
+            # Streamed so the request can be dropped part-way; closing the connection stops generation
+            response = self.backend.post_chat(self.backend.build_payload(self.messages, stream=True), stream=True)
+            with self._lock:
+                self._response = response
+            if self._cancelled.is_set():
+                response.close()
+                return
+            parts = []
+            for chunk in self.backend.iter_chunks(response):
+                if self._cancelled.is_set():
+                    return
+                parts.append(chunk)
+            outcome = "".join(parts)
+        except Exception as e:
+            outcome = e
+        finally:
+            if self._response is not None:
+                self._response.close()
+        if not self._cancelled.is_set():
+            self.results.put((self, outcome))
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            response = self._response
+        if response is not None:
+            response.close()
+
+
+class ModelRouter:
+    """Dispatches each request to the local or cloud backend, hedging with the other one.
+
+    Simple commands go to the local model and multi-step or multi-app commands
+    to the cloud model, unless the latency histograms show the local model is
+    the slower of the two. If the chosen backend has not produced a
+    schema-valid answer by its usual p90 latency, the same request is sent to
+    the other backend; whichever valid answer arrives first wins and the other
+    request is cancelled. Latency-critical (simple) commands can race both
+    backends from the start.
+
+    Exposes the parts of the Backend interface the agent uses, so it can stand
+    in for a single backend.
+    """
+
+    name = "router"
+
+    def __init__(self, local: Backend, cloud: Backend, complexity_threshold: int = 1,
+                 race_simple: bool = True, hedge: bool = True, hedge_quantile: float = 0.9,
+                 hedge_delay: float = 2.0, min_samples: int = 5,
+                 accept: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            local: Backend for simple commands (Ollama)
+            cloud: Backend for complex commands (OpenRouter)
+            complexity_threshold: Commands scoring at least this in command_complexity go to the cloud
+            race_simple: Send simple commands to both backends at once and keep the first valid answer
+            hedge: Send a request to the other backend when the first one is slower than usual
+            hedge_quantile: Latency quantile of the first backend after which the hedge is sent
+            hedge_delay: Hedge delay used until a backend has min_samples latencies recorded
+            min_samples: Latencies needed before a backend's histogram is trusted
+            accept: Returns True for response text that passes schema validation
+        """
+        self.local = local
+        self.cloud = cloud
+        self.complexity_threshold = complexity_threshold
+        self.race_simple = race_simple
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.accept = accept
+        self.latency: Dict[str, LatencyHistogram] = {local.name: LatencyHistogram(), cloud.name: LatencyHistogram()}
+        self.wins: Dict[str, int] = {local.name: 0, cloud.name: 0}
+        self.hedges = 0
+        self.last_backend = local
+
+    @property
+    def model(self) -> str:
+        """Model that produced the latest answer."""
+        return self.last_backend.model
+
+    @property
+    def response_schema(self):
+        return self.local.response_schema
+
+    @response_schema.setter
+    def response_schema(self, schema):
+        self.local.response_schema = schema
+        self.cloud.response_schema = schema
+
+    def _quantile(self, backend: Backend, q: float) -> Optional[float]:
+        histogram = self.latency[backend.name]
+        return histogram.quantile(q) if histogram.samples >= self.min_samples else None
+
+    def route(self, command: str) -> Tuple[Backend, Backend, Optional[float]]:
+        """Return the first backend, the hedge backend, and seconds before hedging (None: never)."""
+        simple = command_complexity(command) < self.complexity_threshold
+        first, second = (self.local, self.cloud) if simple else (self.cloud, self.local)
+        if simple:
+            local_p90 = self._quantile(self.local, 0.9)
+            cloud_p90 = self._quantile(self.cloud, 0.9)
+            if local_p90 is not None and cloud_p90 is not None and cloud_p90 < local_p90:
+                # The local model is overloaded or too big for this machine
+                first, second = second, first
+            if self.race_simple:
+                return first, second, 0.0
+        if not self.hedge:
+            return first, second, None
+        delay = self._quantile(first, self.hedge_quantile)
+        return first, second, self.hedge_delay if delay is None else delay
+
+    def chat(self, messages: List[Dict[str, str]]) -> str:
+        """Send messages to the routed backend(s) and return the first acceptable response."""
+        first, second, delay = self.route(command_from_messages(messages))
+        tracer.count(f"route_{first.name}")
+        results = queue.SimpleQueue()
+        pending = [_Attempt(first, messages, results)]
+        hedged = False
+        fallback = None
+        error = None
+        try:
+            while pending:
+                wait = delay if not hedged and delay is not None else None
+                if wait is not None:
+                    wait = max(wait - pending[0].elapsed, 0.0)
+                try:
+                    attempt, outcome = results.get(timeout=wait)
+                except queue.Empty:
+                    self._hedge(second, messages, results, pending)
+                    hedged = True
+                    continue
+                pending.remove(attempt)
+                if isinstance(outcome, Exception):
+                    logger.warning("%s request failed: %s", attempt.backend.name, outcome)
+                    error = outcome
+                elif self.accept is None or self.accept(outcome):
+                    self.latency[attempt.backend.name].observe(attempt.elapsed)
+                    self.wins[attempt.backend.name] += 1
+                    self.last_backend = attempt.backend
+                    if hedged:
+                        tracer.count(f"hedge_won_{attempt.backend.name}")
+                    return outcome
+                else:
+                    # Invalid answers still count as latency samples, but another backend may do better
+                    self.latency[attempt.backend.name].observe(attempt.elapsed)
+                    logger.info("%s response failed validation", attempt.backend.name)
+                    fallback = fallback or (attempt.backend, outcome)
+                if not hedged:
+                    # The first backend failed: ask the other one now instead of waiting
+                    self._hedge(second, messages, results, pending)
+                    hedged = True
+        finally:
+            for attempt in pending:
+                # The loser's latency is at least what it ran for; dropping it would make a slow backend look fast
+                self.latency[attempt.backend.name].observe_censored(attempt.elapsed)
+                attempt.cancel()
+                tracer.count("hedge_cancelled")
+
+        if fallback is not None:
+            # Neither answer was valid; let the caller's repair logic try the first one
+            self.last_backend = fallback[0]
+            return fallback[1]
+        raise error
+
+    def _hedge(self, backend: Backend, messages, results, pending: list):
+        self.hedges += 1
+        tracer.count("hedges")
+        logger.debug("Hedging request to %s", backend.name)
+        pending.append(_Attempt(backend, messages, results))
+
+    def stream_chat(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Stream from the routed backend; steps run as they arrive, so streamed requests are not hedged."""
+        first, _, _ = self.route(command_from_messages(messages))
+        tracer.count(f"route_{first.name}")
+        self.last_backend = first
+        yield from first.stream_chat(messages)
+
+    def warm_up(self, background: bool = True):
+        self.local.warm_up(background)
+        self.cloud.warm_up(background)
+
+    def close(self):
+        self.local.close()
+        self.cloud.close()
+
+    def stats(self) -> Dict[str, object]:
+        """Latency histograms, wins per backend and hedges sent."""
+        return {
+            "latency": {name: histogram.as_dict() for name, histogram in self.latency.items()},
+            "wins": dict(self.wins),
+            "hedges": self.hedges
+        }
@@ -0,0 +1,179 @@
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+from logger import logger
+
+# A validator returns a list of error messages; an empty list means the value is valid
+Validator = Callable[[Any], List[str]]
+
+JSON_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+# Fallback delays when a step has none, following the minima in systemprompt.txt
+DEFAULT_DELAYS = {"Website": 3, "Play": 2}
+
+
+def load_workflow_schema(system_prompt: str) -> Optional[Dict[str, Any]]:
+    """Extract the workflow JSON schema embedded in the system prompt."""
+    for block in re.findall(r"```json(.*?)```", system_prompt, re.DOTALL):
+        if '"$schema"' not in block:
+            continue
+        try:
+            return json.loads(block)
+        except json.JSONDecodeError as e:
+            logger.error("Workflow schema in system prompt is not valid JSON: %s", e)
+            return None
+    logger.warning("No workflow schema found in system prompt")
+    return None
+
+
+def provider_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Strip the draft metadata that model providers do not accept."""
+    return {k: v for k, v in schema.items() if k not in ("$schema", "$id")}
+
+
+def compile_schema(schema: Dict[str, Any], path: str = "$") -> Validator:
+    """Compile a JSON schema (the draft-07 subset used by the workflow schema) into a validator.
+
+    Each keyword is turned into a small check function once, so validating a
+    response is just a walk over prebuilt closures.
+    """
+    checks: List[Validator] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        tests = [JSON_TYPES[n] for n in names]
+        checks.append(lambda v: [] if any(t(v) for t in tests) else [f"{path}: expected {'/'.join(names)}"])
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda v: [] if v in allowed else [f"{path}: {v!r} is not one of {allowed}"])
+
+    if "const" in schema:
+        expected = schema["const"]
+        checks.append(lambda v: [] if v == expected else [f"{path}: expected {expected!r}"])
+
+    if "minimum" in schema or "maximum" in schema:
+        low, high = schema.get("minimum"), schema.get("maximum")
+
+        def check_range(v):
+            if not JSON_TYPES["number"](v):
+                return []
+            if low is not None and v < low:
+                return [f"{path}: {v} is below {low}"]
+            if high is not None and v > high:
+                return [f"{path}: {v} is above {high}"]
+            return []
+        checks.append(check_range)
+
+    if "minLength" in schema:
+        min_length = schema["minLength"]
+        checks.append(lambda v: [f"{path}: shorter than {min_length}"] if isinstance(v, str) and len(v) < min_length else [])
+
+    if "pattern" in schema:
+        regex = re.compile(schema["pattern"])
+        checks.append(lambda v: [f"{path}: does not match {regex.pattern}"] if isinstance(v, str) and not regex.search(v) else [])
+
+    if "required" in schema:
+        required = schema["required"]
+        checks.append(lambda v: [f"{path}: missing '{k}'" for k in required if k not in v] if isinstance(v, dict) else [])
+
+    properties = {k: compile_schema(s, f"{path}.{k}") for k, s in schema.get("properties", {}).items()}
+    if properties or schema.get("additionalProperties") is False:
+        closed = schema.get("additionalProperties") is False
+
+        def check_properties(v):
+            if not isinstance(v, dict):
+                return []
+            errors = []
+            for key, value in v.items():
+                if key in properties:
+                    errors.extend(properties[key](value))
+                elif closed:
+                    errors.append(f"{path}: unexpected property '{key}'")
+            return errors
+        checks.append(check_properties)
+
+    if "items" in schema or "minItems" in schema:
+        item_check = compile_schema(schema["items"], f"{path}[]") if "items" in schema else None
+        min_items = schema.get("minItems", 0)
+
+        def check_items(v):
+            if not isinstance(v, list):
+                return []
+            errors = [f"{path}: needs at least {min_items} items"] if len(v) < min_items else []
+            if item_check is not None:
+                for item in v:
+                    errors.extend(item_check(item))
+            return errors
+        checks.append(check_items)
+
+    for sub in schema.get("allOf", []):
+        checks.append(compile_schema(sub, path))
+
+    if "if" in schema:
+        condition = compile_schema(schema["if"], path)
+        then_check = compile_schema(schema["then"], path) if "then" in schema else None
+        else_check = compile_schema(schema["else"], path) if "else" in schema else None
+
+        def check_conditional(v):
+            branch = then_check if not condition(v) else else_check
+            return branch(v) if branch is not None else []
+        checks.append(check_conditional)
+
+    def validate(value) -> List[str]:
+        errors = []
+        for check in checks:
+            errors.extend(check(value))
+        return errors
+
+    return validate
+
+
+def repair_step(step: Any, commands: List[str]) -> Any:
+    """Fix the mistakes models commonly make in a single step, without guessing intent."""
+    if not isinstance(step, dict):
+        return step
+    repaired = {}
+    command = str(step.get("command", "")).strip()
+    # "volume" -> "Volume"
+    repaired["command"] = next((c for c in commands if c.lower() == command.lower()), command)
+
+    parameters = step.get("parameters", "")
+    if isinstance(parameters, str):
+        parameters = parameters.strip()
+        if repaired["command"] == "Volume" and re.fullmatch(r"\d{1,3}%?", parameters):
+            parameters = int(parameters.rstrip("%"))
+        elif repaired["command"] in ("Shortcut", "Play"):
+            parameters = parameters.lower()
+        elif repaired["command"] == "Website" and not parameters.startswith("https://"):
+            parameters = "https://" + re.sub(r"^http://", "", parameters)
+    elif repaired["command"] == "Volume" and isinstance(parameters, float) and parameters.is_integer():
+        parameters = int(parameters)
+    repaired["parameters"] = parameters
+
+    delay = step.get("delay")
+    try:
+        repaired["delay"] = float(delay) if delay is not None else DEFAULT_DELAYS.get(repaired["command"], 1)
+    except (TypeError, ValueError):
+        repaired["delay"] = DEFAULT_DELAYS.get(repaired["command"], 1)
+    return repaired
+
+
+def repair_workflow(response: Any, commands: List[str]) -> Any:
+    """Bring a near-miss response into the workflow shape; returns it unchanged if hopeless."""
+    if isinstance(response, list):
+        response = {"workflow": response}
+    elif isinstance(response, dict) and "workflow" not in response and "command" in response:
+        # A bare single step instead of a workflow
+        response = {"workflow": [response]}
+    if not isinstance(response, dict) or not isinstance(response.get("workflow"), list):
+        return response
+    return {"workflow": [repair_step(step, commands) for step in response["workflow"]]}
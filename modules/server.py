@@ -0,0 +1,252 @@
+import json
+import re
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Hashable, Optional
+from logger import logger
+from tracing import tracer
+from modules.cache import InflightRequests
+from modules.executor import FOCUS, step_resources
+
+SESSION_PATH = re.compile(r"^/sessions/([\w.-]{1,64})(/commands)?$")
+
+
+class FairLock:
+    """Mutex handed to waiting owners in turn, so one busy owner cannot starve the others.
+
+    Waiters are queued per owner, and on release the lock goes to the next
+    owner in rotation rather than to whichever thread asked first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holder: Optional[Hashable] = None
+        self._turns: Deque[Hashable] = deque()
+        self._waiters: Dict[Hashable, Deque[threading.Event]] = {}
+
+    def acquire(self, owner: Hashable) -> None:
+        with self._lock:
+            if self._holder is None and not self._turns:
+                self._holder = owner
+                return
+            waiters = self._waiters.setdefault(owner, deque())
+            if not waiters:
+                self._turns.append(owner)
+            granted = threading.Event()
+            waiters.append(granted)
+        granted.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._turns:
+                self._holder = None
+                return
+            owner = self._turns.popleft()
+            waiters = self._waiters[owner]
+            granted = waiters.popleft()
+            if waiters:
+                # Back of the rotation: everyone else waiting goes first
+                self._turns.append(owner)
+            else:
+                del self._waiters[owner]
+            self._holder = owner
+        granted.set()
+
+    @contextmanager
+    def holding(self, owner: Hashable):
+        self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class Session:
+    """One client's agent view and the lock keeping its commands in order."""
+
+    def __init__(self, session_id: str, agent):
+        self.id = session_id
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def close(self):
+        """Release the session's step threads; a command still running is cut short."""
+        self.agent.executor.close()
+
+
+class AgentServer:
+    """Serves many clients from one warm agent over a small JSON HTTP API.
+
+    Each session has its own memory and executor; the model backend, response
+    cache, long-term memory and loaded tools belong to the shared agent.
+    Identical model requests in flight at the same time are sent once, and
+    workflows that need the keyboard take turns across sessions.
+
+    POST   /sessions/<id>/commands  {"command": "...", "execute": true}
+    GET    /sessions/<id>           memory stats for the session
+    DELETE /sessions/<id>           forget the session
+    GET    /health                  sessions and coalescing stats
+    """
+
+    def __init__(self, agent, host: str = "127.0.0.1", port: int = 8765, max_sessions: int = 32):
+        """
+        Args:
+            agent: Fully constructed Agent whose backend, caches and tools are shared
+            host: Interface to bind; keep it on localhost unless the network is trusted
+            port: Port to bind; 0 picks a free one
+            max_sessions: Sessions kept before the least recently used one is dropped
+        """
+        self.agent = agent
+        self.max_sessions = max_sessions
+        if agent.inflight is None:
+            agent.inflight = InflightRequests()
+        self.keyboard = FairLock()
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def session(self, session_id: str, create: bool = True) -> Optional[Session]:
+        """Return the session with this id, creating it on first use."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None and create:
+                session = self.sessions[session_id] = Session(session_id, self.agent.new_session())
+                logger.info("Session %s started", session_id)
+                while len(self.sessions) > self.max_sessions:
+                    dropped_id, dropped = self.sessions.popitem(last=False)
+                    dropped.close()
+                    logger.info("Session %s dropped (max_sessions reached)", dropped_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def close_session(self, session_id: str) -> bool:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def handle_command(self, session: Session, command: str, execute: bool = True) -> Dict[str, Any]:
+        """Plan a command in a session and, unless told otherwise, run it."""
+        with session.lock, tracer.span("session_command", session=session.id):
+            agent = session.agent
+            state = agent.memory.system_state.signature()
+            response = agent.send_to_ai(command)
+            agent.remember(command, response)
+            session.commands += 1
+            result: Dict[str, Any] = {"session": session.id, "command": command, "response": response}
+            if execute and response.get("command") != "Error":
+                result["timings"] = self._execute(session, response, state)
+            return result
+
+    def _execute(self, session: Session, response: Dict[str, Any], state: str = ""):
+        workflow = response.get("workflow")
+        if isinstance(workflow, list):
+            commands = [(step.get("command") or "").strip() for step in workflow if isinstance(step, dict)]
+        else:
+            commands = [(response.get("command") or "").strip()]
+        if any(FOCUS in step_resources(command) for command in commands):
+            # Keystrokes from two sessions would interleave in whatever window has focus
+            with self.keyboard.holding(session.id):
+                session.agent.execute_command(response, state=state)
+        else:
+            session.agent.execute_command(response, state=state)
+        return list(session.agent.executor.timings) if isinstance(workflow, list) else []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = {s.id: s.commands for s in self.sessions.values()}
+        return {"sessions": sessions, "coalesced_requests": self.agent.inflight.coalesced}
+
+    def serve_forever(self):
+        logger.info("Agent server listening on %s", self.url)
+        print(f"Agent server listening on {self.url}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> "AgentServer":
+        """Serve on a background thread."""
+        threading.Thread(target=self._server.serve_forever, name="agent-server", daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            sessions, self.sessions = list(self.sessions.values()), OrderedDict()
+        for session in sessions:
+            session.close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug("server: " + format, *args)
+
+            def _send(self, body: Dict[str, Any], status: int = 200):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send(server.stats())
+                    return
+                match = SESSION_PATH.match(self.path)
+                session = server.session(match.group(1), create=False) if match and not match.group(2) else None
+                if session is None:
+                    self._send({"error": "unknown session"}, 404)
+                    return
+                self._send(dict(session.agent.memory.get_memory_stats(), commands=session.commands))
+
+            def do_DELETE(self):
+                match = SESSION_PATH.match(self.path)
+                if match and not match.group(2) and server.close_session(match.group(1)):
+                    self._send({"closed": match.group(1)})
+                else:
+                    self._send({"error": "unknown session"}, 404)
+
+            def do_POST(self):
+                match = SESSION_PATH.match(self.path)
+                if not match or not match.group(2):
+                    self._send({"error": "not found"}, 404)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    command = str(body.get("command", "")).strip()
+                except (ValueError, AttributeError):
+                    self._send({"error": "expected a JSON object"}, 400)
+                    return
+                if not command:
+                    self._send({"error": "missing command"}, 400)
+                    return
+                try:
+                    result = server.handle_command(server.session(match.group(1)), command,
+                                                   execute=bool(body.get("execute", True)))
+                except Exception as e:
+                    logger.error("Command '%s' failed in session %s: %s", command, match.group(1), e)
+                    self._send({"error": "command failed"}, 500)
+                    return
+                self._send(result)
+
+        return Handler
@@ -0,0 +1,77 @@
+import json
+import re
+from typing import List, Dict, Any
+from logger import logger
+
+WORKFLOW_HEADER = re.compile(r'"workflow"\s*:\s*\[')
+
+
+class WorkflowStreamParser:
+    """Incrementally parse a streamed model response and emit complete workflow steps."""
+
+    def __init__(self):
+        self.text = ""
+        self.steps: List[Dict[str, Any]] = []
+        self.finished = False
+        self._pos = -1          # scan position, -1 until the workflow array is found
+        self._depth = 0         # nesting depth inside the workflow array
+        self._step_start = -1
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Append a chunk of model output and return any steps completed by it."""
+        if not chunk or self.finished:
+            return []
+        self.text += chunk
+
+        if self._pos < 0:
+            match = WORKFLOW_HEADER.search(self.text)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        completed = []
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._step_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the workflow array itself
+                    self.finished = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._step_start != -1:
+                    step = self._parse_step(text[self._step_start:i + 1])
+                    if step is not None:
+                        completed.append(step)
+                    self._step_start = -1
+            i += 1
+        self._pos = i
+
+        self.steps.extend(completed)
+        return completed
+
+    def _parse_step(self, fragment: str):
+        """Decode a single step object, ignoring anything that is not a JSON object."""
+        try:
+            step = json.loads(fragment)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed streamed step: %s (%s)", fragment, e)
+            return None
+        return step if isinstance(step, dict) else None
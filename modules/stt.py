@@ -0,0 +1,116 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+import speech_recognition as sr
+from logger import logger
+
+try:
+    import vosk
+except ImportError:  # optional: only needed for the offline engine
+    vosk = None
+
+
+class SpeechEngine(ABC):
+    """Base class for speech-to-text engines used by the agent."""
+
+    name = "engine"
+    supports_streaming = False
+
+    @abstractmethod
+    def recognize(self, audio: sr.AudioData) -> str:
+        """Return the text spoken in audio; raises sr.UnknownValueError if there is none."""
+        raise NotImplementedError
+
+    def start_stream(self, sample_rate: int, sample_width: int):
+        """Begin a streaming session; only called on engines with supports_streaming set."""
+        raise NotImplementedError
+
+
+class GoogleEngine(SpeechEngine):
+    """Google Web Speech API through speech_recognition (needs network access)."""
+
+    name = "google"
+
+    def __init__(self, recognizer: sr.Recognizer, language: str = "en-US"):
+        self.recognizer = recognizer
+        self.language = language
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class VoskStream:
+    """Incremental recognition of one utterance, reporting partial text as audio arrives."""
+
+    def __init__(self, recognizer, on_partial: Optional[Callable[[str], None]] = None):
+        self.recognizer = recognizer
+        self.on_partial = on_partial
+        self._segments = []
+
+    def accept(self, frame: bytes) -> str:
+        """Feed raw 16-bit mono audio and return the text recognized so far."""
+        if self.recognizer.AcceptWaveform(frame):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self._segments.append(text)
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        current = " ".join(self._segments + ([partial] if partial else []))
+        if self.on_partial is not None and current:
+            self.on_partial(current)
+        return current
+
+    def finish(self) -> str:
+        """Flush the recognizer and return the final text of the utterance."""
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        if text:
+            self._segments.append(text)
+        return " ".join(self._segments)
+
+
+class VoskEngine(SpeechEngine):
+    """Offline, CPU-only recognition with a Vosk model kept loaded for the whole session."""
+
+    name = "vosk"
+    supports_streaming = True
+
+    def __init__(self, model_path: str = "models/vosk-model-small-en-us-0.15",
+                 on_partial: Optional[Callable[[str], None]] = None):
+        if vosk is None:
+            raise RuntimeError("The vosk package is not installed (pip install vosk)")
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"Vosk model not found at {model_path}")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+        self.on_partial = on_partial
+        logger.info("Loaded Vosk model from %s", model_path)
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        stream = self.start_stream(audio.sample_rate, 2)
+        stream.recognizer.AcceptWaveform(audio.get_raw_data(convert_width=2))
+        text = stream.finish()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    def start_stream(self, sample_rate: int, sample_width: int) -> VoskStream:
+        if sample_width != 2:
+            raise ValueError("Vosk expects 16-bit audio")
+        return VoskStream(vosk.KaldiRecognizer(self.model, sample_rate), self.on_partial)
+
+
+def create_engine(recognizer: sr.Recognizer, engine: str = "google", language: str = "en-US",
+                  model_path: str = "models/vosk-model-small-en-us-0.15",
+                  on_partial: Optional[Callable[[str], None]] = None) -> SpeechEngine:
+    """Create the configured speech-to-text engine, falling back to Google if it cannot load."""
+    if engine == "vosk":
+        try:
+            return VoskEngine(model_path, on_partial=on_partial)
+        except Exception as e:
+            print(f"Offline speech recognition unavailable: {e}")
+            logger.error("Could not load Vosk engine, falling back to Google: %s", e)
+    elif engine != "google":
+        logger.warning("Unknown speech engine '%s', using Google", engine)
+    return GoogleEngine(recognizer, language=language)
@@ -1,22 +1,62 @@
-import re
 import os
+import threading
 import time
 import webbrowser
-from ctypes import cast, POINTER
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
 import pyautogui
 from logger import logger
-import pytesseract
-from PIL import Image  # noqa: F401 (imported for completeness in case of future use)
-import cv2  # noqa: F401 (imported for completeness in case of future use)
+from tracing import tracer
+from modules.injector import injector
 
-# Initialize pycaw interface for volume control
-devices = AudioUtilities.GetSpeakers()
-interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-volume = cast(interface, POINTER(IAudioEndpointVolume))
+TESSERACT_CMD = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
 
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+IMGREC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgrec")
+PLAYBUTTON_POLL_INTERVAL = 0.05
+ARTISTCARD_POLL_INTERVAL = 0.2
+
+# Built on first use so the reference images are decoded only once per session
+_playbutton_matcher = None
+_artistcard_locator = None
+# Audio endpoint for volume control, activated on first use
+_volume = None
+_volume_lock = threading.Lock()
+
+def get_volume_interface():
+    """Return the speakers' volume interface, activating it through pycaw on first use."""
+    global _volume
+    if _volume is None:
+        with _volume_lock:
+            if _volume is None:
+                from ctypes import cast, POINTER
+                from comtypes import CLSCTX_ALL
+                from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+                devices = AudioUtilities.GetSpeakers()
+                interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+                _volume = cast(interface, POINTER(IAudioEndpointVolume))
+    return _volume
+
+def get_playbutton_matcher():
+    """Return the shared play button matcher, loading the reference images on first use."""
+    global _playbutton_matcher
+    if _playbutton_matcher is None:
+        from modules.vision import TemplateMatcher
+        refs = [os.path.join(IMGREC_DIR, f"ref{i}.png") for i in range(1, 5)]
+        _playbutton_matcher = TemplateMatcher(refs, threshold=0.9)
+    return _playbutton_matcher
+
+def get_artistcard_locator():
+    """Return the shared OCR locator for Spotify's "Top result" card."""
+    global _artistcard_locator
+    if _artistcard_locator is None:
+        import pytesseract
+        from modules.vision import OcrLocator
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        _artistcard_locator = OcrLocator(("top", "result"), offset=(100, 200))
+    return _artistcard_locator
+
+def prepare_play():
+    """Load the template images and OCR engine used by play()."""
+    get_playbutton_matcher()
+    get_artistcard_locator()
 
 def click(location):
     """Move mouse to location and click."""
@@ -27,44 +67,22 @@ def click(location):
         time.sleep(0.1)
         pyautogui.mouseUp(*location)
     except Exception as e:
-        logger.error(f"Error clicking at {location}: {e}")
+        logger.error("Error clicking at %s: %s", location, e)
 
 def locate(component: str):
     """Locate component on screen using OCR or image matching."""
     try:
-        if component == "artistcard":
-            screenshot = pyautogui.screenshot()
-            data = pytesseract.image_to_data(screenshot, output_type=pytesseract.Output.DICT)
-            for i, word in enumerate(data.get("text", [])):
-                if word and word.strip().lower() == "top":
-                    if i + 1 < len(data["text"]) and str(data["text"][i + 1]).strip().lower() == "result":
-                        x = data["left"][i]
-                        y = data["top"][i]
-                        target_x = x + 100
-                        target_y = y + 200
-                        return target_x, target_y
-            return None
-        elif component == "playbutton":
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            imgrec_dir = os.path.join(os.path.dirname(base_dir), "imgrec")
-            for i in range(1, 5):
-                ref_path = os.path.join(imgrec_dir, f"ref{i}.png")
-                if not os.path.exists(ref_path):
-                    continue
-                try:
-                    location = pyautogui.locateOnScreen(ref_path, confidence=0.9, grayscale=True)
-                except TypeError:
-                    location = pyautogui.locateOnScreen(ref_path)
-                except Exception as e:
-                    logger.error(f"locate playbutton error for {ref_path}: {e}")
-                    continue
-                if location is not None:
-                    return pyautogui.center(location)
-            return None
-        else:
-            return None
+        with tracer.span("locate", component=component) as span:
+            if component == "artistcard":
+                found = get_artistcard_locator().locate()
+            elif component == "playbutton":
+                found = get_playbutton_matcher().locate()
+            else:
+                found = None
+            span.set("found", found is not None)
+            return found
     except Exception as e:
-        logger.error(f"Error in locate('{component}'): {e}")
+        logger.error("Error in locate('%s'): %s", component, e)
         return None
 
 def volume_control(target: int):
@@ -75,24 +93,20 @@ def volume_control(target: int):
             return
 
         if 0 <= target <= 100:
-            volume.SetMasterVolumeLevelScalar(target / 100, None)
+            get_volume_interface().SetMasterVolumeLevelScalar(target / 100, None)
             print(f"Volume set to {target}%")
         else:
             print("Volume must be between 0 and 100")
     except Exception as e:
-        logger.error(f"Error controlling volume: {e}")
-        print("Error, check logs")
-
-    except Exception as e:
-        logger.error(f"Error controlling volume: {e}")
+        logger.error("Error controlling volume: %s", e)
         print("Error, check logs")
 
 def type_text(text: str):
-    """Type the given text with a small delay between characters."""
+    """Type the given text, pasting or batching it unless the keyboard mode says otherwise."""
     try:
-        pyautogui.write(text, interval=0.05)
+        injector.type(text)
     except Exception as e:
-        logger.error(f"Error typing text: {e}")
+        logger.error("Error typing text: %s", e)
 
 def shortcut(keys: str):
     """Execute a keyboard shortcut or single key press.
@@ -111,7 +125,7 @@ def shortcut(keys: str):
         else:
             pyautogui.press(normalized)
     except Exception as e:
-        logger.error(f"Error executing shortcut '{keys}': {e}")
+        logger.error("Error executing shortcut '%s': %s", keys, e)
 
 def Website(url: str):
     """Open a specific website in Brave via keyboard automation."""
@@ -122,19 +136,21 @@ def Website(url: str):
         # Focus address bar and navigate to target URL
         pyautogui.hotkey("ctrl", "l")
         time.sleep(0.1)
-        pyautogui.write(url)
+        injector.type(url)
         pyautogui.press("enter")
     except Exception as e:
-        logger.error(f"Website error for '{url}': {e}")
+        logger.error("Website error for '%s': %s", url, e)
 
 def play(app: str):
     """In Spotify, click the artist card then the play button. Assumes Spotify is open."""
     try:
         start_time = time.time()
         location_point = None
-        while location_point is None and time.time() - start_time < 15:
+        while time.time() - start_time < 15:
             location_point = locate("artistcard")
-            time.sleep(0.5)
+            if location_point is not None:
+                break
+            time.sleep(ARTISTCARD_POLL_INTERVAL)
         if location_point is not None:
             click(location_point)
         else:
@@ -144,13 +160,15 @@ def play(app: str):
 
         start_time = time.time()
         location_point = None
-        while location_point is None and time.time() - start_time < 20:
+        while time.time() - start_time < 20:
             location_point = locate("playbutton")
-            time.sleep(0.5)
+            if location_point is not None:
+                break
+            time.sleep(PLAYBUTTON_POLL_INTERVAL)
         if location_point is not None:
             click(location_point)
         else:
             logger.warning("Play button not found on screen within timeout")
             return
     except Exception as e:
-        logger.error(f"Error in Spotify play function: {e}")
\ No newline at end of file
+        logger.error("Error in Spotify play function: %s", e)
\ No newline at end of file
@@ -0,0 +1,385 @@
+import ctypes
+import ctypes.util
+import glob
+import hashlib
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+import pyautogui
+import pytesseract
+from PIL import Image
+from logger import logger
+from tracing import tracer
+
+try:
+    import tesserocr
+except ImportError:  # optional: keeps one Tesseract engine loaded instead of a process per call
+    tesserocr = None
+
+
+def to_gray(screenshot) -> np.ndarray:
+    """Convert a PIL screenshot to a grayscale array for OpenCV."""
+    return cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2GRAY)
+
+
+class TemplateMatcher:
+    """Find reference images on screen with templates decoded, grayscaled and rescaled only once.
+
+    Until the first match every template is tried at every scale. After that
+    only the scale that matched is tried, since the display's DPI does not
+    change, and the area around the last match is searched before the whole
+    screen. The whole screen is searched at reduced resolution, and a candidate
+    is confirmed at full resolution.
+    """
+
+    def __init__(self, paths: Sequence[str], threshold: float = 0.9,
+                 scales: Sequence[float] = (1.0, 1.25, 1.5, 0.8), region_margin: int = 100,
+                 coarse: float = 0.5, coarse_slack: float = 0.15):
+        """
+        Args:
+            paths: Reference image files; missing files are skipped
+            threshold: Minimum normalized correlation for a match
+            scales: Template scale factors to try, covering common Windows DPI settings
+            region_margin: Pixels around the last match that are searched first
+            coarse: Resolution factor for searching the whole screen; 1.0 searches at full resolution
+            coarse_slack: How far below threshold a reduced-resolution candidate may score
+        """
+        self.threshold = threshold
+        self.region_margin = region_margin
+        self.coarse = coarse
+        self.coarse_slack = coarse_slack
+        # (path, scale, template, template at coarse resolution)
+        self.templates: List[Tuple[str, float, np.ndarray, np.ndarray]] = []
+        # Scale of the first match; the others are skipped from then on
+        self.scale: Optional[float] = None
+        self.matches = 0
+        self._last_region = None  # (x0, y0, x1, y1) in screen pixels
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                logger.error("Could not decode template %s", path)
+                continue
+            for scale in scales:
+                self.templates.append((path, scale, self._resize(image, scale), self._resize(image, scale * coarse)))
+        logger.debug("Loaded %d prescaled templates from %d references", len(self.templates), len(paths))
+
+    @staticmethod
+    def _resize(image: np.ndarray, factor: float) -> np.ndarray:
+        if factor == 1.0:
+            return image
+        interpolation = cv2.INTER_AREA if factor < 1.0 else cv2.INTER_LINEAR
+        return cv2.resize(image, None, fx=factor, fy=factor, interpolation=interpolation)
+
+    def locate(self, screenshot=None) -> Optional[Tuple[int, int]]:
+        """Return the center of the first template found on screen, or None.
+
+        One screenshot is taken per call and shared by every template and scale.
+        """
+        if not self.templates:
+            return None
+        started = time.perf_counter()
+        if screenshot is None:
+            screenshot = pyautogui.screenshot()
+        gray = to_gray(screenshot)
+
+        location = None
+        if self._last_region is not None:
+            location = self._search_region(gray, self._last_region)
+        if location is None:
+            location = self._search_screen(gray)
+
+        logger.debug("Template poll took %.1f ms", (time.perf_counter() - started) * 1000)
+        return location
+
+    def _candidates(self):
+        for idx, entry in enumerate(self.templates):
+            if self.scale is None or entry[1] == self.scale:
+                yield idx, entry
+
+    def _best(self, image: np.ndarray, template: np.ndarray):
+        """Best correlation of template in image and its top-left corner, or None if it does not fit."""
+        if template.shape[0] > image.shape[0] or template.shape[1] > image.shape[1]:
+            return None
+        self.matches += 1
+        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return max_val, max_loc
+
+    def _search_region(self, gray: np.ndarray, region) -> Optional[Tuple[int, int]]:
+        x0, y0, x1, y1 = region
+        for idx, (path, scale, template, _) in self._candidates():
+            found = self._best(gray[y0:y1, x0:x1], template)
+            if found is not None and found[0] >= self.threshold:
+                return self._found(idx, gray, x0 + found[1][0], y0 + found[1][1], found[0])
+        return None
+
+    def _search_screen(self, gray: np.ndarray) -> Optional[Tuple[int, int]]:
+        if self.coarse == 1.0:
+            return self._search_region(gray, (0, 0, gray.shape[1], gray.shape[0]))
+        small = self._resize(gray, self.coarse)
+        for idx, (path, scale, template, small_template) in self._candidates():
+            found = self._best(small, small_template)
+            if found is None or found[0] < self.threshold - self.coarse_slack:
+                continue
+            # Confirm at full resolution in a window a few pixels around the candidate
+            h, w = template.shape[:2]
+            pad = int(2 / self.coarse) + 1
+            x = max(int(found[1][0] / self.coarse) - pad, 0)
+            y = max(int(found[1][1] / self.coarse) - pad, 0)
+            confirmed = self._best(gray[y:y + h + 2 * pad, x:x + w + 2 * pad], template)
+            if confirmed is not None and confirmed[0] >= self.threshold:
+                return self._found(idx, gray, x + confirmed[1][0], y + confirmed[1][1], confirmed[0])
+        return None
+
+    def _found(self, idx: int, gray: np.ndarray, x: int, y: int, score: float) -> Tuple[int, int]:
+        """Remember a match at (x, y) and return the template's center on screen."""
+        path, scale, template, _ = self.templates[idx]
+        h, w = template.shape[:2]
+        m = self.region_margin
+        self._last_region = (max(x - m, 0), max(y - m, 0), min(x + w + m, gray.shape[1]), min(y + h + m, gray.shape[0]))
+        if self.scale is None:
+            logger.debug("Templates locked to scale %s", scale)
+            self.scale = scale
+        # The template that matched last time is the most likely to match next time
+        if idx:
+            self.templates.insert(0, self.templates.pop(idx))
+        logger.debug("Matched %s at scale %s (%.2f)", os.path.basename(path), scale, score)
+        return x + w // 2, y + h // 2
+
+
+class LibTesseract:
+    """Tesseract engine loaded in-process from the libtesseract shipped with the Tesseract install.
+
+    Talks to Tesseract's C API through ctypes, so the engine and its language
+    data are loaded once instead of by a new tesseract process per call.
+    """
+
+    # Columns of a Tesseract TSV row, as in pytesseract's image_to_data
+    COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+
+    def __init__(self, tesseract_cmd: str, tessdata: Optional[str], lang: str = "eng"):
+        """
+        Args:
+            tesseract_cmd: Path of tesseract(.exe); the library is looked up next to it first
+            tessdata: Directory holding the .traineddata files, or None for Tesseract's default
+            lang: Language to load
+        """
+        self._lib = self._load(os.path.dirname(tesseract_cmd))
+        lib = self._lib
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit3.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p)
+        lib.TessBaseAPISetImage.argtypes = (ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int)
+        lib.TessBaseAPISetSourceResolution.argtypes = (ctypes.c_void_p, ctypes.c_int)
+        lib.TessBaseAPIRecognize.argtypes = (ctypes.c_void_p, ctypes.c_void_p)
+        lib.TessBaseAPIGetTsvText.argtypes = (ctypes.c_void_p, ctypes.c_int)
+        lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+        lib.TessDeleteText.argtypes = (ctypes.c_void_p,)
+        lib.TessBaseAPIEnd.argtypes = (ctypes.c_void_p,)
+        lib.TessBaseAPIDelete.argtypes = (ctypes.c_void_p,)
+
+        self._handle = lib.TessBaseAPICreate()
+        datapath = tessdata.encode() if tessdata else None
+        if lib.TessBaseAPIInit3(self._handle, datapath, lang.encode()) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+            raise RuntimeError(f"Tesseract could not load language '{lang}'")
+
+    @staticmethod
+    def _load(install_dir: str):
+        if sys.platform == "win32":
+            candidates = sorted(glob.glob(os.path.join(install_dir, "libtesseract*.dll")))
+            if install_dir and os.path.isdir(install_dir):
+                # The library's own dependencies (leptonica, ...) live in the same folder
+                os.add_dll_directory(install_dir)
+        else:
+            found = ctypes.util.find_library("tesseract")
+            candidates = [found] if found else []
+        if not candidates:
+            raise OSError("libtesseract not found")
+        return ctypes.CDLL(candidates[-1])
+
+    def image_to_data(self, image: np.ndarray) -> Dict[str, List[Any]]:
+        """OCR a grayscale image and return its TSV rows as columns."""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        lib = self._lib
+        lib.TessBaseAPISetImage(self._handle, image.ctypes.data, width, height, 1, image.strides[0])
+        # Screenshots carry no resolution; without one Tesseract warns and guesses
+        lib.TessBaseAPISetSourceResolution(self._handle, 70)
+        if lib.TessBaseAPIRecognize(self._handle, None) != 0:
+            raise RuntimeError("Tesseract recognition failed")
+        text = lib.TessBaseAPIGetTsvText(self._handle, 0)
+        try:
+            tsv = ctypes.string_at(text).decode("utf-8", errors="replace") if text else ""
+        finally:
+            if text:
+                lib.TessDeleteText(text)
+
+        data: Dict[str, List[Any]] = {column: [] for column in self.COLUMNS}
+        for line in tsv.splitlines():
+            fields = line.split("\t", len(self.COLUMNS) - 1)
+            if len(fields) < len(self.COLUMNS) - 1:
+                continue
+            fields += [""] * (len(self.COLUMNS) - len(fields))
+            for column, value in zip(self.COLUMNS, fields):
+                data[column].append(value if column in ("text", "conf") else int(value))
+        return data
+
+    def close(self):
+        if self._handle is not None:
+            self._lib.TessBaseAPIEnd(self._handle)
+            self._lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+
+class TesseractWorker:
+    """OCR engine that stays loaded for the whole session.
+
+    Uses tesserocr if it is installed, otherwise the libtesseract library that
+    comes with the Tesseract install. Only if neither loads does every call go
+    through pytesseract, which starts a new Tesseract process each time.
+    """
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+        self._api = None
+        self._lib: Optional[LibTesseract] = None
+        self._lock = threading.Lock()
+        tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
+        tessdata = os.path.join(os.path.dirname(tesseract_cmd), "tessdata")
+        if not os.path.isdir(tessdata):
+            tessdata = None
+        if tesserocr is not None:
+            try:
+                if tessdata:
+                    self._api = tesserocr.PyTessBaseAPI(path=tessdata, lang=lang)
+                else:
+                    self._api = tesserocr.PyTessBaseAPI(lang=lang)
+                logger.info("Using persistent tesserocr engine for OCR")
+                return
+            except Exception as e:
+                logger.warning("tesserocr unavailable, trying libtesseract: %s", e)
+                self._api = None
+        try:
+            self._lib = LibTesseract(tesseract_cmd, tessdata, lang)
+            logger.info("Using persistent libtesseract engine for OCR")
+        except Exception as e:
+            logger.warning("libtesseract unavailable, each OCR call starts a tesseract process: %s", e)
+
+    def image_to_data(self, image: np.ndarray) -> Dict[str, List[Any]]:
+        """Return word boxes in pytesseract's image_to_data dict layout."""
+        if self._lib is not None:
+            with self._lock:
+                return self._lib.image_to_data(image)
+        if self._api is None:
+            return pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+
+        data = {"text": [], "left": [], "top": [], "width": [], "height": []}
+        with self._lock:
+            self._api.SetImage(Image.fromarray(image))
+            self._api.Recognize()
+            for word in tesserocr.iterate_level(self._api.GetIterator(), tesserocr.RIL.WORD):
+                box = word.BoundingBox(tesserocr.RIL.WORD)
+                if box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                data["text"].append(word.GetUTF8Text(tesserocr.RIL.WORD))
+                data["left"].append(x1)
+                data["top"].append(y1)
+                data["width"].append(x2 - x1)
+                data["height"].append(y2 - y1)
+        return data
+
+    def close(self):
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+        if self._lib is not None:
+            self._lib.close()
+            self._lib = None
+
+
+class OcrLocator:
+    """Find a phrase on screen with OCR, checking the last hit region before the whole screen."""
+
+    def __init__(self, phrase: Sequence[str], offset: Tuple[int, int] = (0, 0), downscale: float = 0.6,
+                 region_margin: int = 150, worker: TesseractWorker = None):
+        """
+        Args:
+            phrase: Consecutive words to look for, compared case-insensitively
+            offset: Added to the phrase's top-left corner to get the returned point
+            downscale: Factor applied to the full screenshot before OCR
+            region_margin: Pixels around the last hit that are searched first
+            worker: OCR engine; a new TesseractWorker by default
+        """
+        self.phrase = [w.lower() for w in phrase]
+        self.offset = offset
+        self.downscale = downscale
+        self.region_margin = region_margin
+        self.worker = worker or TesseractWorker()
+        self.ocr_calls = 0
+        self._last_region = None  # (x0, y0, x1, y1) in screen pixels
+        self._last_hash = None
+        self._last_result = None
+
+    def locate(self, screenshot=None) -> Optional[Tuple[int, int]]:
+        """Return the phrase's position plus offset, or None if it is not on screen."""
+        started = time.perf_counter()
+        if screenshot is None:
+            screenshot = pyautogui.screenshot()
+        gray = to_gray(screenshot)
+
+        # An identical frame cannot give a different answer, so skip OCR entirely
+        frame_hash = hashlib.blake2b(gray.tobytes(), digest_size=16).digest()
+        if frame_hash == self._last_hash:
+            return self._last_result
+        self._last_hash = frame_hash
+
+        box = None
+        if self._last_region is not None:
+            x0, y0, x1, y1 = self._last_region
+            box = self._search(gray[y0:y1, x0:x1], (x0, y0), 1.0)
+        if box is None:
+            if self.downscale != 1.0:
+                small = cv2.resize(gray, None, fx=self.downscale, fy=self.downscale, interpolation=cv2.INTER_AREA)
+            else:
+                small = gray
+            box = self._search(small, (0, 0), self.downscale)
+
+        result = None
+        if box is not None:
+            x, y, w, h = box
+            screen_h, screen_w = gray.shape[:2]
+            m = self.region_margin
+            self._last_region = (max(x - m, 0), max(y - m, 0), min(x + w + m, screen_w), min(y + h + m, screen_h))
+            result = (x + self.offset[0], y + self.offset[1])
+        self._last_result = result
+
+        logger.debug("OCR poll took %.1f ms (%d OCR calls so far)", (time.perf_counter() - started) * 1000, self.ocr_calls)
+        return result
+
+    def _search(self, image: np.ndarray, origin: Tuple[int, int], scale: float):
+        """Run OCR on an image and return the phrase's (x, y, w, h) in screen pixels."""
+        if image.size == 0:
+            return None
+        self.ocr_calls += 1
+        tracer.count("ocr_calls")
+        data = self.worker.image_to_data(image)
+        words = [str(w).strip().lower() for w in data.get("text", [])]
+        n = len(self.phrase)
+        for i in range(len(words) - n + 1):
+            if words[i:i + n] == self.phrase:
+                x = origin[0] + int(data["left"][i] / scale)
+                y = origin[1] + int(data["top"][i] / scale)
+                w = int(data["width"][i] / scale)
+                h = int(data["height"][i] / scale)
+                return x, y, w, h
+        return None
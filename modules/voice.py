@@ -0,0 +1,236 @@
+import audioop
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+import speech_recognition as sr
+from logger import logger
+from tracing import tracer
+from modules.stt import SpeechEngine, GoogleEngine
+
+# Queued for the deliver thread when capture gives up, behind the utterances still being recognized
+CAPTURE_STOPPED = object()
+
+
+class VoicePipeline:
+    """Always-on microphone capture with energy-based voice activity detection.
+
+    A capture thread keeps the microphone open, holds a short ring buffer of
+    audio so the start of a phrase is not clipped, and cuts utterances on
+    silence. Each utterance is recognized on a worker pool, or incrementally
+    while it is spoken when the engine supports streaming, and the transcripts
+    are delivered, in the order they were spoken, to a queue.
+    """
+
+    def __init__(self, recognizer: sr.Recognizer, microphone: sr.Microphone,
+                 engine: SpeechEngine = None, workers: int = 2,
+                 pre_roll: float = 0.3, silence_timeout: float = 0.8, min_phrase: float = 0.3,
+                 max_phrase: float = 15.0, calibration: float = 1.0, max_restarts: int = 3,
+                 restart_delay: float = 1.0):
+        """
+        Args:
+            recognizer: Recognizer whose energy threshold settings are used for VAD
+            microphone: Microphone to capture from
+            engine: Speech-to-text engine; defaults to Google
+            workers: Number of utterances recognized in parallel
+            pre_roll: Seconds of audio kept from before speech was detected
+            silence_timeout: Seconds of silence that end an utterance
+            min_phrase: Utterances shorter than this many seconds are dropped as noise
+            max_phrase: Utterances are cut after this many seconds
+            calibration: Seconds of ambient noise sampled once at startup
+            max_restarts: Times the microphone is reopened after read errors before capture gives up
+            restart_delay: Seconds to wait before reopening the microphone
+        """
+        self.recognizer = recognizer
+        self.microphone = microphone
+        self.engine = engine or GoogleEngine(recognizer)
+        self.pre_roll = pre_roll
+        self.silence_timeout = silence_timeout
+        self.min_phrase = min_phrase
+        self.max_phrase = max_phrase
+        self.calibration = calibration
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        # Why capture stopped for good, if it did
+        self.failure: Optional[Exception] = None
+        self.transcripts: "queue.Queue[str]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+        self._pending: "queue.Queue" = queue.Queue()
+        self._running = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Calibrate once against ambient noise and start capturing in the background."""
+        if self._running.is_set():
+            return
+        source = self.microphone.__enter__()
+        self.recognizer.adjust_for_ambient_noise(source, duration=self.calibration)
+        logger.info("Voice pipeline calibrated, energy threshold %.0f", self.recognizer.energy_threshold)
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, args=(source,), name="voice-capture", daemon=True),
+            threading.Thread(target=self._deliver_loop, name="voice-deliver", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop capturing and release the microphone."""
+        if not self._running.is_set():
+            return
+        self._running.clear()
+        self._pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._pool.shutdown(wait=False)
+        try:
+            self.microphone.__exit__(None, None, None)
+        except Exception as e:
+            # Already closed when capture gave up
+            logger.debug("Closing the microphone failed: %s", e)
+
+    def get_transcript(self, timeout: Optional[float] = None) -> str:
+        """Block until the next transcript is available; returns "" on timeout.
+
+        Raises RuntimeError once capture has stopped for good, instead of blocking forever.
+        """
+        try:
+            text = self.transcripts.get(timeout=timeout)
+        except queue.Empty:
+            return ""
+        if text is None:
+            # Leave the marker for the next caller too
+            self.transcripts.put(None)
+            raise RuntimeError(f"voice capture stopped: {self.failure}")
+        return text
+
+    def _reopen(self, error: Exception):
+        """Reopen the microphone after a read error; returns the new source, or None after giving up."""
+        for attempt in range(1, self.max_restarts + 1):
+            logger.error("Microphone read failed (%s), reopening it (%d/%d)", error, attempt, self.max_restarts)
+            time.sleep(self.restart_delay)
+            if not self._running.is_set():
+                return None
+            try:
+                self.microphone.__exit__(None, None, None)
+            except Exception:
+                pass
+            try:
+                return self.microphone.__enter__()
+            except Exception as e:
+                error = e
+        logger.error("Voice capture stopped: %s", error)
+        self.failure = error
+        self._pending.put(CAPTURE_STOPPED)
+        return None
+
+    def _capture_loop(self, source):
+        seconds_per_buffer = source.CHUNK / source.SAMPLE_RATE
+        ring = deque(maxlen=max(int(self.pre_roll / seconds_per_buffer), 1))
+        frames = []
+        speaking = False
+        silence = 0.0
+        stream = None
+
+        while self._running.is_set():
+            try:
+                buffer = source.stream.read(source.CHUNK)
+            except Exception as e:
+                source = self._reopen(e)
+                if source is None:
+                    break
+                # Whatever was being said when the read failed is lost
+                ring.clear()
+                frames = []
+                speaking = False
+                stream = None
+                continue
+            energy = audioop.rms(buffer, source.SAMPLE_WIDTH)
+
+            if not speaking:
+                ring.append(buffer)
+                if energy > self.recognizer.energy_threshold:
+                    speaking = True
+                    frames = list(ring)
+                    silence = 0.0
+                    stream = self._start_stream(source, frames)
+                elif self.recognizer.dynamic_energy_threshold:
+                    # Follow slow changes in background noise, as Recognizer.listen does
+                    damping = self.recognizer.dynamic_energy_adjustment_damping ** seconds_per_buffer
+                    target = energy * self.recognizer.dynamic_energy_ratio
+                    self.recognizer.energy_threshold = self.recognizer.energy_threshold * damping + target * (1 - damping)
+                continue
+
+            frames.append(buffer)
+            if stream is not None:
+                try:
+                    stream.accept(buffer)
+                except Exception as e:
+                    # The frames are kept, so the whole utterance is recognized in one go instead
+                    logger.error("Streaming recognition failed, recognizing the utterance at once: %s", e)
+                    stream = None
+            silence = silence + seconds_per_buffer if energy <= self.recognizer.energy_threshold else 0.0
+            duration = len(frames) * seconds_per_buffer
+            if silence >= self.silence_timeout or duration >= self.max_phrase:
+                speaking = False
+                ring.clear()
+                if duration - silence < self.min_phrase:
+                    stream = None
+                elif stream is not None:
+                    # Streaming engines have already processed the audio; only the tail is left
+                    done = Future()
+                    try:
+                        done.set_result(stream.finish())
+                    except Exception as e:
+                        logger.error("Finishing streaming recognition failed: %s", e)
+                        done.set_result("")
+                    self._pending.put(done)
+                    stream = None
+                else:
+                    audio = sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                    self._pending.put(self._pool.submit(self._recognize, audio))
+
+    def _start_stream(self, source, frames):
+        """Open a streaming session and feed it the pre-roll, if the engine supports it."""
+        if not self.engine.supports_streaming:
+            return None
+        try:
+            stream = self.engine.start_stream(source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+            for frame in frames:
+                stream.accept(frame)
+            return stream
+        except Exception as e:
+            logger.error("Could not start streaming recognition: %s", e)
+            return None
+
+    def _recognize(self, audio: sr.AudioData) -> str:
+        try:
+            with tracer.span("recognize", engine=self.engine.name):
+                return self.engine.recognize(audio)
+        except sr.UnknownValueError:
+            logger.debug("Could not understand audio")
+        except sr.RequestError as e:
+            logger.error("Could not request results; %s", e)
+        except Exception as e:
+            logger.error("Speech recognition with %s failed: %s", self.engine.name, e)
+        return ""
+
+    def _deliver_loop(self):
+        # Futures are queued in capture order, so transcripts come out in the order spoken
+        while True:
+            future = self._pending.get()
+            if future is None:
+                break
+            if future is CAPTURE_STOPPED:
+                # Wakes get_transcript so the caller finds out
+                self.transcripts.put(None)
+                break
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.error("Speech recognition failed: %s", e)
+                continue
+            if text:
+                self.transcripts.put(text)
@@ -0,0 +1,41 @@
+from modules.cache import ResponseCache, normalize_command
+
+
+def _plan(text):
+    return {"workflow": [{"command": "Type", "parameters": text, "delay": 0.5}]}
+
+
+def test_filler_words_in_a_payload_are_kept():
+    assert normalize_command("type can you help me") != normalize_command("type help")
+    assert normalize_command("search for the who") != normalize_command("search who")
+    assert normalize_command("Please, open YouTube") == normalize_command("open youtube")
+
+
+def test_payloads_do_not_collide(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.json"), fuzzy_threshold=0.8)
+    cache.put("type can you help me", "", _plan("can you help me"))
+    assert cache.get("type help", "") is None
+    assert cache.get("type can you help mee", "") is None
+    assert cache.get("type can you help me", "")["workflow"][0]["parameters"] == "can you help me"
+
+
+def test_entries_stored_under_old_keys_are_dropped(tmp_path):
+    path = tmp_path / "responses.json"
+    path.write_text('[{"command": "type help", "state": "", "response": {"workflow": []}, "created": 9e12}]')
+    assert ResponseCache(path=str(path)).get_cache_stats()["entries"] == 0
+
+
+def test_malformed_entries_are_skipped(tmp_path):
+    path = tmp_path / "responses.json"
+    path.write_text('[{"command": "mute", "state": "", "response": {"workflow": []}, "created": 9e12, "version": 2},'
+                    ' {"state": "", "created": 9e12, "version": 2}, "mute", null]')
+    assert ResponseCache(path=str(path)).get_cache_stats()["entries"] == 1
+
+
+def test_puts_are_saved_in_the_background(tmp_path):
+    path = tmp_path / "responses.json"
+    cache = ResponseCache(path=str(path), save_delay=60)
+    cache.put("type hello", "", _plan("hello"))
+    assert not path.exists()
+    cache.close()
+    assert ResponseCache(path=str(path)).get("type hello", "")["workflow"][0]["parameters"] == "hello"
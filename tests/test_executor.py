@@ -0,0 +1,46 @@
+import threading
+import time
+from modules.executor import WorkflowExecutor
+
+
+def _recording_executor(max_workers: int = 2):
+    started = {}
+    lock = threading.Lock()
+
+    def handler(name):
+        def _run(parameters):
+            with lock:
+                started[name] = time.monotonic()
+        return _run
+
+    handlers = {command: handler(command) for command in ("Website", "Shortcut", "Volume")}
+    executor = WorkflowExecutor(handlers, smart_waits=False, parallel=True, max_workers=max_workers)
+    return executor, started
+
+
+def test_independent_step_does_not_wait_for_a_free_worker():
+    # Shortcut waits behind Website for focus; it must not take the second worker while it waits
+    executor, started = _recording_executor(max_workers=2)
+    workflow = [
+        {"command": "Website", "parameters": "https://open.spotify.com", "delay": 0.5},
+        {"command": "Shortcut", "parameters": "enter", "delay": 0.1},
+        {"command": "Volume", "parameters": 30, "delay": 0},
+    ]
+    begin = time.monotonic()
+    timings = executor.run_workflow(workflow)
+
+    website_done = started["Website"] + 0.5
+    assert started["Volume"] < website_done
+    assert started["Volume"] - begin < 0.25
+    assert started["Shortcut"] >= website_done - 0.01
+    assert [t["step"] for t in sorted(timings, key=lambda t: t["step"])] == [1, 2, 3]
+
+
+def test_steps_sharing_a_resource_keep_their_order():
+    executor, started = _recording_executor(max_workers=4)
+    workflow = [
+        {"command": "Shortcut", "parameters": "win", "delay": 0.2},
+        {"command": "Website", "parameters": "https://youtube.com", "delay": 0},
+    ]
+    executor.run_workflow(workflow)
+    assert started["Website"] - started["Shortcut"] >= 0.19
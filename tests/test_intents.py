@@ -0,0 +1,21 @@
+from modules.intents import IntentMatcher
+from modules.memory import SessionState
+
+COMMANDS = ["Shortcut", "Type", "Website", "Play", "Volume"]
+
+
+def _website(command):
+    state = SessionState()
+    state.brave_open = True
+    response = IntentMatcher(COMMANDS).match(command, state)
+    assert response is not None
+    return response["workflow"][0]["parameters"]
+
+
+def test_search_keeps_filler_words_in_the_query():
+    assert _website("search for you are my sunshine") == "https://www.google.com/search?q=you+are+my+sunshine"
+    assert _website("Search what can you do for me?") == "https://www.google.com/search?q=what+can+you+do+for+me"
+
+
+def test_spotify_query_keeps_the_words_as_typed():
+    assert _website("play can't hold us on spotify") == "https://open.spotify.com/search/can%27t%20hold%20us"
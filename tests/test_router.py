@@ -0,0 +1,31 @@
+from modules.router import LatencyHistogram
+
+
+def test_cancelled_requests_raise_the_quantiles():
+    finished = [0.3, 0.4, 0.6, 0.7, 0.8, 1.5, 3, 4, 6, 8]
+    plain, censored = LatencyHistogram(), LatencyHistogram()
+    for seconds in finished:
+        plain.observe(seconds)
+        censored.observe(seconds)
+    for _ in range(10):
+        # Lost the race after 1.2s; it would have finished later
+        censored.observe_censored(1.2)
+
+    assert plain.quantile(0.5) == 1.0
+    assert censored.quantile(0.5) > plain.quantile(0.5)
+    assert censored.quantile(0.9) > plain.quantile(0.9)
+    assert censored.as_dict()["count"] == 10 and censored.samples == 20
+
+
+def test_only_cancelled_requests_give_no_quantile():
+    histogram = LatencyHistogram()
+    histogram.observe_censored(2.0)
+    assert histogram.quantile(0.9) is None
+
+
+def test_quantile_past_the_censored_tail_is_the_longest_bound_seen():
+    histogram = LatencyHistogram()
+    histogram.observe(0.2)
+    for _ in range(4):
+        histogram.observe_censored(0.4)
+    assert histogram.quantile(0.9) == 0.5
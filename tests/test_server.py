@@ -0,0 +1,29 @@
+from modules.executor import WorkflowExecutor
+from modules.server import AgentServer
+
+
+class FakeAgent:
+    """Just enough of an Agent for session bookkeeping."""
+
+    def __init__(self):
+        self.inflight = None
+        self.executor = WorkflowExecutor({}, smart_waits=False)
+
+    def new_session(self):
+        return FakeAgent()
+
+
+def test_dropped_sessions_release_their_step_threads():
+    server = AgentServer(FakeAgent(), port=0, max_sessions=1)
+    try:
+        first = server.session("first")
+        second = server.session("second")
+        assert list(server.sessions) == ["second"]
+        assert first.agent.executor._pool._shutdown
+        assert not second.agent.executor._pool._shutdown
+
+        assert server.close_session("second")
+        assert second.agent.executor._pool._shutdown
+        assert not server.close_session("second")
+    finally:
+        server._server.server_close()
@@ -0,0 +1,26 @@
+import json
+from logger import logger, setup_logger
+from tracing import tracer
+
+
+def test_trace_spans_stay_out_of_the_log_file(tmp_path):
+    log_path = tmp_path / "log.txt"
+    trace_path = tmp_path / "trace.jsonl"
+    setup_logger(level="INFO", path=str(log_path))
+    try:
+        tracer.configure(jsonl_path=str(trace_path))
+        for i in range(3):
+            with tracer.span("command", i=i):
+                with tracer.span("step"):
+                    tracer.count("keys_typed", 4)
+        logger.info("after the spans")
+        # Hands the remaining spans to the listener and waits until they are written
+        tracer.close()
+        tracer.configure(enabled=False)
+    finally:
+        setup_logger()
+
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1 and lines[0].endswith("| INFO | after the spans")
+    spans = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines()]
+    assert [s["name"] for s in spans] == ["step", "command"] * 3
@@ -0,0 +1,93 @@
+import threading
+import speech_recognition as sr
+from modules.voice import VoicePipeline
+
+CHUNK = 1024
+LOUD = b"\xff\x7f" * CHUNK
+QUIET = b"\x00\x00" * CHUNK
+
+
+class FakeStream:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self, size):
+        if not self.frames:
+            raise OSError("device unplugged")
+        return self.frames.pop(0)
+
+
+class FakeSource:
+    CHUNK = CHUNK
+    SAMPLE_RATE = 16000
+    SAMPLE_WIDTH = 2
+
+    def __init__(self, frames):
+        self.stream = FakeStream(frames)
+
+
+class FakeMicrophone:
+    """Hands out one scripted source per open; opening fails once the scripts run out."""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+
+    def __enter__(self):
+        if not self.scripts:
+            raise OSError("no microphone")
+        return FakeSource(self.scripts.pop(0))
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FailingEngine:
+    name = "failing"
+    supports_streaming = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def recognize(self, audio):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionResetError("socket closed")
+        return "open youtube"
+
+
+def _utterance():
+    return [LOUD] * 10 + [QUIET] * 20
+
+
+def _pipeline(microphone, engine):
+    recognizer = sr.Recognizer()
+    recognizer.energy_threshold = 300
+    recognizer.dynamic_energy_threshold = False
+    pipeline = VoicePipeline(recognizer, microphone, engine=engine, calibration=0, max_restarts=1, restart_delay=0)
+    # Skip calibration, which needs a real microphone
+    recognizer.adjust_for_ambient_noise = lambda source, duration: None
+    return pipeline
+
+
+def test_engine_errors_and_dead_microphone_reach_the_caller():
+    # First utterance hits an engine error, the second is recognized after the microphone is reopened
+    engine = FailingEngine()
+    pipeline = _pipeline(FakeMicrophone(_utterance(), _utterance()), engine)
+    pipeline.start()
+    try:
+        assert pipeline.get_transcript(timeout=5) == "open youtube"
+        failed = threading.Event()
+
+        def _wait():
+            try:
+                pipeline.get_transcript(timeout=5)
+            except RuntimeError:
+                failed.set()
+
+        waiter = threading.Thread(target=_wait)
+        waiter.start()
+        waiter.join(6)
+        assert failed.is_set()
+        assert engine.calls == 2
+    finally:
+        pipeline.stop()
@@ -0,0 +1,241 @@
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from logger import TRACE_LOGGER, add_json_lines_output, enqueue, logger, remove_output
+
+# Upper bounds (seconds) of the latency histogram buckets exported per span name
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Span:
+    """One timed unit of work, with attributes and counters attached to it."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attrs", "counters", "start", "duration")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attrs = attrs
+        self.counters: Dict[str, float] = {}
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def count(self, key: str, amount: float = 1) -> None:
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def __enter__(self) -> "Span":
+        self.tracer._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._pop(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "time": time.time() - self.duration,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attrs": dict(self.attrs),
+            "counters": dict(self.counters)
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so instrumented code costs almost nothing."""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def count(self, key, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects spans and counters, and exports them as JSON lines and Prometheus text."""
+
+    def __init__(self):
+        self.enabled = False
+        self.buckets = DEFAULT_BUCKETS
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        # span name -> [bucket counts..., +Inf count], sum
+        self._histograms: Dict[str, List[float]] = {}
+        self._sums: Dict[str, float] = {}
+        # Handler writing finished spans from the log listener thread, and the spans not yet handed to it
+        self._output = None
+        self._pending: List[Dict[str, Any]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def configure(self, enabled: bool = True, jsonl_path: Optional[str] = "logs/trace.jsonl",
+                  metrics_port: Optional[int] = None, buckets=DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            enabled: Record spans; when False every span is a no-op
+            jsonl_path: File finished spans are appended to as JSON lines, by the log writer
+                thread; None keeps them in memory only
+            metrics_port: Local port serving Prometheus text at /metrics; None disables it
+            buckets: Upper bounds in seconds of the span latency histograms
+        """
+        self.close()
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        if not enabled:
+            return
+        if jsonl_path:
+            self._output = add_json_lines_output(jsonl_path, TRACE_LOGGER, "spans")
+        if metrics_port is not None:
+            self.serve_metrics(metrics_port)
+
+    def span(self, name: str, **attrs) -> Span:
+        """Start a span; use as a context manager. Nested spans on the same thread become children."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, self.current(), attrs)
+
+    def current(self) -> Optional[Span]:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def count(self, name: str, amount: float = 1) -> None:
+        """Add to a process-wide counter and to the counters of the current span."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+        span = self.current()
+        if span is not None:
+            span.count(name, amount)
+
+    def _push(self, span: Span) -> None:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+
+    def _pop(self, span: Span) -> None:
+        stack = self._local.stack
+        if stack and stack[-1] is span:
+            stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            # Counters roll up so a root span shows everything that happened under it
+            for key, amount in span.counters.items():
+                parent.count(key, amount)
+        self._finish(span, root=parent is None)
+
+    def _finish(self, span: Span, root: bool) -> None:
+        with self._lock:
+            counts = self._histograms.get(span.name)
+            if counts is None:
+                counts = self._histograms[span.name] = [0] * (len(self.buckets) + 1)
+                self._sums[span.name] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[span.name] += span.duration
+            if self._output is None:
+                return
+            self._pending.append(span.to_dict())
+            if not root:
+                return
+            batch, self._pending = self._pending, []
+        # A trace is handed over when its root span ends; the log listener thread serializes and writes it
+        enqueue(TRACE_LOGGER, spans=batch)
+
+    def metrics_text(self) -> str:
+        """Render counters and span latency histograms in the Prometheus text format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: list(counts) for name, counts in self._histograms.items()}
+            sums = dict(self._sums)
+
+        lines = []
+        for name in sorted(counters):
+            metric = f"agent_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {counters[name]:g}")
+        if histograms:
+            lines.append("# TYPE agent_span_seconds histogram")
+        for name in sorted(histograms):
+            counts = histograms[name]
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'agent_span_seconds_bucket{{span="{name}",le="{bound:g}"}} {count}')
+            lines.append(f'agent_span_seconds_bucket{{span="{name}",le="+Inf"}} {counts[-1]}')
+            lines.append(f'agent_span_seconds_sum{{span="{name}"}} {sums[name]:.6f}')
+            lines.append(f'agent_span_seconds_count{{span="{name}"}} {counts[-1]}')
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port: int, host: str = "127.0.0.1") -> None:
+        """Serve metrics_text() at http://host:port/metrics from a background thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.metrics_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            logger.error("Could not serve metrics on port %s: %s", port, e)
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("Serving metrics at http://%s:%s/metrics", host, port)
+
+    def close(self) -> None:
+        """Write out the queued spans and stop the metrics endpoint."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            output, self._output = self._output, None
+            batch, self._pending = self._pending, []
+        if output is not None:
+            if batch:
+                enqueue(TRACE_LOGGER, spans=batch)
+            remove_output(output)
+
+
+# Expose a global tracer instance
+tracer = Tracer()